@@ -1,7 +1,31 @@
+import importlib.util
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
 from ultralytics import YOLO, SAM
+import cv2
+import numpy as np
 import torch
+import yaml
 from config.settings import settings
 from services.logger_service import logger
+from torch_init import allow_unsafe_load
+
+TENSORRT_AVAILABLE = importlib.util.find_spec("tensorrt") is not None
+
+# Weights file of each selectable detection model
+MODEL_FILES = {
+    "yolov8n": "yolov8n.pt",
+    "yolov8s": "yolov8s.pt",
+    "yolov8m": "yolov8m.pt",
+    "yolov8l": "yolov8l.pt",
+    "yolov11n": "yolo11n.pt",
+}
 
 class ObjectDetector:
     """
@@ -10,33 +34,234 @@ class ObjectDetector:
     def __init__(self, model_path=None):
         self.model_path = model_path or settings.YOLO_MODEL_PATH
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.imgsz = settings.INFERENCE_IMGSZ
         self.model = None
+        self.name_to_id = {}  # Reverse of model.names: {class_name: class_id}
         self.sam_model = None
         self.sam_path = None
+        # Loaded models kept resident so set_model/set_segmenter toggles are free
+        self._model_cache = OrderedDict()
+        self._sam_cache = OrderedDict()
+        # Ultralytics models are not thread-safe: one inference at a time
+        self._predict_lock = threading.Lock()
+        # Per-thread state: letterbox canvases per batch slot, last SAM2 masks per source
+        self._local = threading.local()
         self._load_model()
 
     def _load_model(self):
+        cache_key = str(self.model_path)
+        if cache_key in self._model_cache:
+            self._model_cache.move_to_end(cache_key)
+            self.model = self._model_cache[cache_key]
+            self.name_to_id = {name: cls_id for cls_id, name in self.model.names.items()}
+            logger.info(f"Reusing loaded YOLO model {self.model_path}")
+            return
+        
         try:
             logger.info(f"Loading YOLO model from {self.model_path} on {self.device}...")
-            self.model = YOLO(self.model_path)
-            self.model.to(self.device)
+            model = None
+            if settings.TENSORRT_EXPORT and self.device == 'cuda' and TENSORRT_AVAILABLE:
+                try:
+                    model = self._load_tensorrt()
+                except Exception as e:
+                    logger.warning(f"TensorRT export failed, trying TorchScript: {e}")
+            if model is None and settings.TORCHSCRIPT_EXPORT:
+                try:
+                    model = self._load_torchscript()
+                except Exception as e:
+                    logger.warning(f"TorchScript export failed, using eager model: {e}")
+            if model is None:
+                with allow_unsafe_load():
+                    model = YOLO(self.model_path)
+                model.to(self.device)
+                if self.device == 'cuda':
+                    # NHWC weights let cuDNN pick faster conv kernels on Tensor Core GPUs
+                    model.model.to(memory_format=torch.channels_last)
+            self.model = model
+            self.name_to_id = {name: cls_id for cls_id, name in model.names.items()}
+            self._warmup()
+            self._cache_put(self._model_cache, cache_key, model)
             logger.success("Model loaded successfully.")
         except Exception as e:
             logger.critical(f"Failed to load YOLO model: {e}")
             raise e
 
+    @property
+    def _letterbox_buffers(self):
+        """Letterbox canvases of the calling thread ({slot: (canvas, layout)})."""
+        buffers = getattr(self._local, "letterbox_buffers", None)
+        if buffers is None:
+            buffers = self._local.letterbox_buffers = {}
+        return buffers
+
+    def _cache_put(self, cache, key, model):
+        """Insert a model into an LRU cache, releasing the least recently used one."""
+        cache[key] = model
+        cache.move_to_end(key)
+        while len(cache) > settings.MODEL_CACHE_SIZE:
+            _, evicted = cache.popitem(last=False)
+            del evicted
+            if self.device == 'cuda':
+                torch.cuda.empty_cache()
+
+    def _load_torchscript(self):
+        """
+        Export the model to TorchScript (FP16 on CUDA) and load the scripted copy.
+        """
+        half = self.device == 'cuda'
+        return self._load_exported("torchscript", "fp16" if half else "fp32", half=half)
+
+    def _load_tensorrt(self):
+        """
+        Build a TensorRT engine with NMS fused into the graph, so preprocess
+        output goes straight to boxes in one engine execution.
+        The batch dimension stays dynamic (up to INFERENCE_MAX_BATCH) so
+        multi-camera batches can run on the same engine.
+        INT8 engines are only built by calibrate(); until one exists, FP16 is used.
+        """
+        if settings.INFERENCE_PRECISION == "int8":
+            int8_engine = self._exported_path("engine", "int8")
+            if int8_engine.exists():
+                with allow_unsafe_load():
+                    return YOLO(str(int8_engine), task="detect")
+            logger.warning("No calibrated INT8 engine found, using FP16. Run ObjectDetector.calibrate() first.")
+        half = settings.INFERENCE_PRECISION != "fp32"
+        return self._load_exported("engine", "fp16" if half else "fp32", half=half, **self._engine_args())
+
+    def _engine_args(self):
+        return dict(dynamic=True, batch=settings.INFERENCE_MAX_BATCH, simplify=True, nms=True)
+
+    def calibrate(self, frames_iter, n=200):
+        """
+        Build an INT8 TensorRT engine (post-training quantization) calibrated
+        on up to `n` frames taken from `frames_iter`, and switch to it.
+        Calibration images and the TensorRT calibration cache are kept under
+        MODELS_DIR/calibration/<weights>_<imgsz>, so rebuilding is cheap.
+        """
+        if self.device != 'cuda' or not TENSORRT_AVAILABLE:
+            raise RuntimeError("INT8 calibration requires CUDA and TensorRT")
+
+        calib_dir = settings.MODELS_DIR / "calibration" / f"{Path(str(self.model_path)).stem}_{self.imgsz}"
+        images_dir = calib_dir / "images"
+        images_dir.mkdir(parents=True, exist_ok=True)
+        count = 0
+        for frame in itertools.islice(frames_iter, n):
+            cv2.imwrite(str(images_dir / f"{count:04d}.jpg"), frame)
+            count += 1
+        if count == 0:
+            raise ValueError("No calibration frames provided")
+
+        data_yaml = calib_dir / "calib.yaml"
+        data_yaml.write_text(yaml.safe_dump({
+            "path": str(calib_dir),
+            "train": "images",
+            "val": "images",
+            "names": dict(self.model.names),
+        }, allow_unicode=True))
+
+        logger.info(f"Calibrating INT8 engine for {self.model_path} on {count} frames...")
+        self._exported_path("engine", "int8").unlink(missing_ok=True)
+        model = self._load_exported("engine", "int8", int8=True, data=str(data_yaml), **self._engine_args())
+
+        self.model = model
+        self.name_to_id = {name: cls_id for cls_id, name in model.names.items()}
+        self._cache_put(self._model_cache, str(self.model_path), model)
+        logger.success(f"INT8 engine ready for {self.model_path}")
+        return model
+
+    def _exported_path(self, fmt, precision):
+        return settings.MODELS_DIR / f"{Path(str(self.model_path)).stem}_{self.imgsz}_{precision}.{fmt}"
+
+    def _load_exported(self, fmt, precision, **export_args):
+        """
+        Export the weights to `fmt` and load the exported model.
+        Exports are cached on disk per (weights, imgsz, precision) so they only
+        run once; later loads and set_model() switches reuse the file.
+        """
+        cached = self._exported_path(fmt, precision)
+        if not cached.exists():
+            logger.info(f"Exporting {self.model_path} to {fmt} ({precision}, imgsz={self.imgsz})...")
+            with allow_unsafe_load():
+                exported = YOLO(self.model_path).export(format=fmt, imgsz=self.imgsz, device=self.device, **export_args)
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            Path(exported).replace(cached)
+        with allow_unsafe_load():
+            return YOLO(str(cached), task="detect")
+
+    def _warmup(self, runs=3):
+        """
+        Run a few dummy forwards at the fixed inference shape.
+        Lets the TorchScript profiling executor specialize/fuse the graph and
+        cuDNN pick its fastest kernels once, instead of on the first live frames.
+        """
+        if self.device == 'cuda':
+            torch.backends.cudnn.benchmark = True  # Input shape is fixed by imgsz
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.model.predict(source=dummy, imgsz=self.imgsz, device=self.device, verbose=False)
+
+    def _letterbox(self, frame, slot=0):
+        """
+        Resize and pad `frame` to imgsz x imgsz into a canvas reused across calls.
+        The resize writes straight into the canvas, so no per-frame image is
+        allocated and YOLO's own letterbox becomes a no-op.
+        Returns (canvas, gain, (pad_x, pad_y)).
+        """
+        h, w = frame.shape[:2]
+        gain = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * gain)), int(round(h * gain))
+        pad_x, pad_y = (self.imgsz - new_w) // 2, (self.imgsz - new_h) // 2
+        layout = (new_w, new_h, pad_x, pad_y)
+
+        canvas, last_layout = self._letterbox_buffers.get(slot, (None, None))
+        if canvas is None:
+            canvas = np.empty((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        if layout != last_layout:
+            canvas.fill(114)  # Borders only need resetting when the layout changes
+        self._letterbox_buffers[slot] = (canvas, layout)
+
+        cv2.resize(frame, (new_w, new_h), dst=canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+                   interpolation=cv2.INTER_LINEAR)
+        return canvas, gain, (pad_x, pad_y)
+
+    @staticmethod
+    def _restore_result(result, frame, gain, pad):
+        """Map a letterboxed result back onto the original frame."""
+        data = result.boxes.data.clone()
+        data[:, [0, 2]] -= pad[0]
+        data[:, [1, 3]] -= pad[1]
+        data[:, :4] /= gain
+        result.orig_img = frame
+        result.orig_shape = frame.shape[:2]
+        result.update(boxes=data)
+
+    def _segment(self, source, frame, boxes):
+        """
+        Run SAM2 with the YOLO boxes as prompts, reusing the previous masks of
+        this source (camera) when the boxes (quantized to a 4px grid) have not
+        moved. Adjacent frames of a static shelf usually give the same box set.
+        Frames of an unnamed source (None) are always segmented.
+        """
+        memo = getattr(self._local, "sam_memo", None)
+        if memo is None:
+            memo = self._local.sam_memo = {}  # {source: (boxes_key, masks)}
+        key = None
+        if source is not None:
+            key = (self.sam_path, frame.shape[:2], (boxes.cpu().numpy() // 4).astype(np.int16).tobytes())
+            last = memo.get(source)
+            if last is not None and last[0] == key:
+                return last[1]
+
+        sam_results = self.sam_model(frame, bboxes=boxes, device=self.device, verbose=False)
+        masks = sam_results[0].masks if sam_results and len(sam_results) > 0 else None
+        if source is not None:
+            memo[source] = (key, masks)
+        return masks
+
     def set_model(self, model_id):
         """Update detection model dynamically"""
-        model_map = {
-            "yolov8n": "yolov8n.pt",
-            "yolov8s": "yolov8s.pt",
-            "yolov8m": "yolov8m.pt",
-            "yolov8l": "yolov8l.pt",
-            "yolov11n": "yolo11n.pt",
-        }
-        
-        if model_id in model_map:
-            self.model_path = model_map[model_id]
+        if model_id in MODEL_FILES:
+            self.model_path = MODEL_FILES[model_id]
             self._load_model()
             return True
         return False
@@ -52,10 +277,17 @@ class ObjectDetector:
         
         if model_id in sam_map:
             self.sam_path = sam_map[model_id]
+            if self.sam_path in self._sam_cache:
+                self._sam_cache.move_to_end(self.sam_path)
+                self.sam_model = self._sam_cache[self.sam_path]
+                logger.info(f"Reusing loaded SAM2 model {model_id}")
+                return True
             try:
                 logger.info(f"Loading SAM2 model from {self.sam_path}...")
-                self.sam_model = SAM(self.sam_path)
+                with allow_unsafe_load():
+                    self.sam_model = SAM(self.sam_path)
                 self.sam_model.to(self.device)
+                self._cache_put(self._sam_cache, self.sam_path, self.sam_model)
                 logger.success(f"SAM2 model {model_id} loaded.")
                 return True
             except Exception as e:
@@ -66,41 +298,262 @@ class ObjectDetector:
             return True
         return False
 
-    def predict(self, frame, conf=0.5, classes=None, tracker=None, segment=False):
+    def predict(self, frames, conf=0.5, classes=None, tracker=None, segment=False, source_ids=None):
         """
         Run inference. Supports detection, tracking and segmentation.
+
+        `frames` is either a single image or a list of images (e.g. one frame
+        per camera). A list is sent to YOLO in a single batched call and one
+        result is returned per input frame, in the same order.
+        `source_ids` optionally names the stream (camera id) of each frame: SAM2
+        masks are only reused between frames of the same source.
         """
         if self.model is None:
             return []
-        
-        # 1. Detection/Tracking
-        if tracker:
-            results = self.model.track(
-                source=frame,
-                persist=True,
-                tracker=tracker,
-                conf=conf,
-                classes=classes,
-                device=self.device,
-                verbose=False
-            )
-        else:
-            results = self.model.predict(
-                source=frame,
-                conf=conf,
-                classes=classes,
-                device=self.device,
-                verbose=False
-            )
-            
-        # 2. Segmentation (SAM2) - if requested and model loaded
-        if segment and self.sam_model and results and len(results) > 0:
-            boxes = results[0].boxes.xyxy
-            if len(boxes) > 0:
-                # Use YOLO boxes as prompts for SAM2
-                sam_results = self.sam_model(frame, bboxes=boxes, device=self.device, verbose=False)
-                # Merge masks into original results for overlay
-                if sam_results and len(sam_results) > 0:
-                    results[0].update(masks=sam_results[0].masks)
+
+        batched = isinstance(frames, (list, tuple))
+        if batched and tracker and len(frames) > 1:
+            # Trackers keep per-stream state: never mix streams in one track() call
+            results = []
+            for i, frame in enumerate(frames):
+                results.extend(self.predict(frame, conf, classes, tracker, segment,
+                                            source_ids[i:i + 1] if source_ids else None))
+            return results
+
+        # inference_mode skips autograd view/version tracking for every tensor
+        with self._predict_lock, torch.inference_mode():
+            # 1. Detection/Tracking
+            if tracker:
+                results = self.model.track(
+                    source=frames,
+                    persist=True,
+                    tracker=tracker,
+                    conf=conf,
+                    imgsz=self.imgsz,
+                    classes=classes,
+                    device=self.device,
+                    verbose=False
+                )
+            else:
+                sources = frames if batched else [frames]
+                letterboxed = [self._letterbox(frame, slot) for slot, frame in enumerate(sources)]
+                results = self.model.predict(
+                    source=[canvas for canvas, _, _ in letterboxed],
+                    conf=conf,
+                    imgsz=self.imgsz,
+                    classes=classes,
+                    device=self.device,
+                    verbose=False
+                )
+                for result, frame, (_, gain, pad) in zip(results, sources, letterboxed):
+                    self._restore_result(result, frame, gain, pad)
+                
+            # 2. Segmentation (SAM2) - if requested and model loaded
+            if segment and self.sam_model and results and len(results) > 0:
+                sources = frames if batched else [frames]
+                for slot, (result, frame) in enumerate(zip(results, sources)):
+                    boxes = result.boxes.xyxy
+                    if len(boxes) > 0:
+                        result_masks = self._segment(source_ids[slot] if source_ids else None, frame, boxes)
+                        # Merge masks into original results for overlay
+                        if result_masks is not None:
+                            result.update(masks=result_masks)
                     
         return results
+
+    def replica(self):
+        """Independent detector (own model instances) with the same models, for another inference thread"""
+        clone = ObjectDetector(self.model_path)
+        if self.sam_model is not None:
+            with allow_unsafe_load():
+                clone.sam_model = SAM(self.sam_path)
+            clone.sam_model.to(clone.device)
+            clone.sam_path = self.sam_path
+        return clone
+
+
+def _physical_cores():
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+    except ImportError:
+        cores = None
+    return cores or os.cpu_count() or 1
+
+
+def configure_torch_threads():
+    """
+    Split torch intra-op threads between the inference workers to avoid
+    oversubscription. Process-wide: call once at startup, before inference.
+    """
+    n_workers = 1 if torch.cuda.is_available() else max(1, settings.INFERENCE_WORKERS)
+    num_threads = settings.TORCH_NUM_THREADS or max(1, _physical_cores() // n_workers)
+    if torch.get_num_threads() != num_threads:
+        torch.set_num_threads(num_threads)
+        logger.info(f"torch intra-op threads: {num_threads} ({n_workers} inference worker(s))")
+
+
+class AsyncDetector:
+    """
+    Pipelined front-end for ObjectDetector (ping-pong inference).
+
+    Requests run on dedicated inference threads with up to `max_in_flight`
+    of them queued, so the caller can decode and prepare the next frame
+    while the current one is being inferred (PyTorch releases the GIL
+    during inference).
+
+    On CUDA there is always a single worker per GPU; `n_workers` only
+    applies to CPU deployments. Each extra worker runs its own replica of
+    the detector (Ultralytics models are not thread-safe); direct
+    detector.predict() calls share the first one, serialized by its lock.
+    """
+    def __init__(self, detector, max_in_flight=2, n_workers=None):
+        self.detector = detector
+        if detector.device == 'cuda':
+            n_workers = 1
+        else:
+            n_workers = max(1, n_workers or settings.INFERENCE_WORKERS)
+        self.n_workers = n_workers
+        # Idle detectors, taken by a worker for the duration of one predict()
+        self._detectors = queue.SimpleQueue()
+        self._detectors.put(detector)
+        for _ in range(n_workers - 1):
+            self._detectors.put(detector.replica())
+        self._executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="inference")
+        self._slots = threading.BoundedSemaphore(max(max_in_flight, n_workers))
+        self._pending = {}  # {camera_id: Future}
+
+    def _predict(self, frames, **kwargs):
+        detector = self._detectors.get()
+        try:
+            return detector.predict(frames, **kwargs)
+        finally:
+            self._detectors.put(detector)
+
+    def submit(self, frames, camera_id=None, **kwargs):
+        """
+        Queue a predict() call and return its Future.
+        Blocks only when `max_in_flight` requests are already queued.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._predict, frames, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        if camera_id is not None:
+            self._pending[camera_id] = future
+        return future
+
+    def poll(self, camera_id):
+        """True if the last request submitted for this camera has completed."""
+        future = self._pending.get(camera_id)
+        return future is not None and future.done()
+
+    def get_result(self, camera_id, timeout=None):
+        """Wait for and return the last result submitted for this camera."""
+        future = self._pending.pop(camera_id, None)
+        if future is None:
+            return None
+        return future.result(timeout)
+
+    def predict(self, frames, **kwargs):
+        """Synchronous wrapper with the same signature as ObjectDetector.predict."""
+        return self.submit(frames, **kwargs).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+class BatchedDetectionScheduler:
+    """
+    Cross-camera micro-batching front-end for ObjectDetector.
+
+    Each camera submits its own frame; a collector thread gathers the frames
+    arriving within `window_ms` (stopping early once every registered source
+    has sent one, or at INFERENCE_MAX_BATCH) and runs them through a single
+    batched predict() call. With one camera there is no waiting.
+    Only for untracked detection: trackers keep per-stream state.
+    """
+    def __init__(self, detector, window_ms=None, max_batch=None):
+        self.detector = detector
+        self.window = (settings.BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or settings.INFERENCE_MAX_BATCH
+        self.n_sources = 0
+        self._lock = threading.Lock()
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def register(self):
+        """Declare one more source (camera) feeding this scheduler."""
+        with self._lock:
+            self.n_sources += 1
+
+    def unregister(self):
+        with self._lock:
+            self.n_sources = max(0, self.n_sources - 1)
+
+    def submit(self, frame, source_id=None, **kwargs):
+        """Queue one frame; the Future resolves to predict()'s result list for it."""
+        future = Future()
+        self._requests.put((source_id, frame, kwargs, future))
+        return future
+
+    def predict(self, frame, source_id=None, **kwargs):
+        """Synchronous wrapper with the same return value as ObjectDetector.predict(frame)."""
+        return self.submit(frame, source_id, **kwargs).result()
+
+    def shutdown(self):
+        self._requests.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        target = min(self.max_batch, max(1, self.n_sources))
+        deadline = time.monotonic() + self.window
+        while len(batch) < target:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._requests.put(None)  # handled on the next loop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # One predict() per distinct set of options (e.g. segment on/off)
+            groups = {}
+            for source_id, frame, kwargs, future in batch:
+                try:
+                    groups.setdefault(tuple(sorted(kwargs.items())), []).append((source_id, frame, future))
+                except Exception as e:  # e.g. an unhashable option: fail this request only
+                    future.set_exception(e)
+
+            for options, items in groups.items():
+                # Stable camera -> slot order keeps per-slot buffers per camera
+                items.sort(key=lambda item: str(item[0]))
+                try:
+                    results = self.detector.predict([frame for _, frame, _ in items],
+                                                    source_ids=[source_id for source_id, _, _ in items],
+                                                    **dict(options))
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for i, (_, _, future) in enumerate(items):
+                    future.set_result(results[i:i + 1])
@@ -7,15 +7,46 @@ Supports automatic quantity tracking for inventory management.
 
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Deque
+from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass
+from itertools import islice
 from datetime import datetime
 import logging
+import time
 
-from ai.detector import ObjectDetector
+from ai.detector import ObjectDetector, AsyncDetector
+from ai.roi_filter import NO_TARGET_IDS, filter_boxes, warm_filter_boxes
+from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Draw through OpenCL (cv2.UMat) when enabled and a device is available
+USE_OPENCL = settings.USE_OPENCL and cv2.ocl.haveOpenCL()
+if USE_OPENCL:
+    cv2.ocl.setUseOpenCL(True)
+
+# Offset turning time.monotonic_ns() ticks into wall-clock epoch nanoseconds
+_WALL_CLOCK_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def _drawing_canvas(frame: np.ndarray, inplace: bool):
+    """
+    Surface to draw annotations on. Uploading to a cv2.UMat replaces the
+    host-side frame.copy() when OpenCL is enabled.
+    """
+    if inplace:
+        return frame
+    if USE_OPENCL:
+        return cv2.UMat(frame)
+    return frame.copy()
+
+
+def _to_ndarray(canvas) -> np.ndarray:
+    """Download a UMat canvas back to host memory (no-op for ndarrays)."""
+    return canvas.get() if isinstance(canvas, cv2.UMat) else canvas
+
 
 @dataclass
 class CountResult:
@@ -23,8 +54,18 @@ class CountResult:
     class_name: str
     count: int
     confidence: float
-    timestamp: datetime
-    detections: List[Tuple[float, float, float, float]]  # [(x1, y1, x2, y2), ...]
+    timestamp_ns: int  # time.monotonic_ns() tick, formatted only on demand
+    detections: np.ndarray  # (N, 4) float32 array of x1, y1, x2, y2
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Wall-clock time of the count, converted lazily from the monotonic tick"""
+        return datetime.fromtimestamp((self.timestamp_ns + _WALL_CLOCK_OFFSET_NS) / 1e9)
+    
+    @property
+    def detection_tuples(self) -> List[Tuple[float, float, float, float]]:
+        """Detections as [(x1, y1, x2, y2), ...] for callers expecting tuples"""
+        return [tuple(box) for box in self.detections.tolist()]
 
 
 class ObjectCounter:
@@ -46,7 +87,12 @@ class ObjectCounter:
             model_path: Path to YOLO model
         """
         self.detector = ObjectDetector(model_path)
-        self.class_history: Dict[str, List[int]] = {}  # Track counts over time
+        self.async_detector = AsyncDetector(self.detector)
+        self.class_history: Dict[str, Deque[int]] = {}  # Track counts over time (ring buffers)
+        self._history_totals: Dict[str, int] = {}  # Running sum of each ring buffer
+        self._roi_cache: Dict[Tuple, np.ndarray] = {}  # ROI coords -> contour points
+        self._target_ids_cache: Dict[Tuple, np.ndarray] = {}  # (model, class names) -> class ids
+        warm_filter_boxes()
         logger.info(f"ObjectCounter initialized with model: {model_path}")
     
     def count_in_roi(
@@ -68,56 +114,141 @@ class ObjectCounter:
         Returns:
             CountResult with detected objects and count
         """
-        # Run YOLO detection
-        results = self.detector.predict(frame, conf=conf_threshold)
+        # Run YOLO detection on the inference thread
+        results = self.async_detector.predict(frame, conf=conf_threshold)
+        result = results[0] if results else None
+        return self._count_result_in_roi(result, roi_coords, target_classes)
+    
+    def submit_count_in_roi(
+        self,
+        frame: np.ndarray,
+        roi_coords: List[List[int]],
+        target_classes: Optional[List[str]] = None,
+        conf_threshold: float = 0.5
+    ) -> Future:
+        """
+        Asynchronous count_in_roi: queue the frame for inference and return
+        immediately with a Future resolving to the CountResult.
         
-        if not results or len(results) == 0:
+        Lets the caller prepare the next frame while this one is inferred.
+        """
+        count_future = Future()
+        
+        def _on_done(predict_future):
+            try:
+                results = predict_future.result()
+                result = results[0] if results else None
+                count_future.set_result(self._count_result_in_roi(result, roi_coords, target_classes))
+            except Exception as e:
+                count_future.set_exception(e)
+        
+        self.async_detector.submit(frame, conf=conf_threshold).add_done_callback(_on_done)
+        return count_future
+    
+    def count_in_roi_batch(
+        self,
+        frames: List[np.ndarray],
+        roi_coords_list: List[List[List[int]]],
+        target_classes: Optional[List[str]] = None,
+        conf_threshold: float = 0.5
+    ) -> List[CountResult]:
+        """
+        Count objects in the ROI of several frames with a single YOLO call.
+        
+        Used to micro-batch frames collected from multiple cameras so the
+        detector amortizes its per-call overhead across the whole batch.
+        
+        Args:
+            frames: Input frames (typically one per camera)
+            roi_coords_list: ROI polygon for each frame, same order as frames
+            target_classes: List of class names to count (None = all)
+            conf_threshold: Minimum confidence threshold
+            
+        Returns:
+            One CountResult per input frame, in the same order
+        """
+        if not frames:
+            return []
+        
+        results = self.detector.predict(list(frames), conf=conf_threshold)
+        if not results:
+            results = [None] * len(frames)
+        
+        return [
+            self._count_result_in_roi(result, roi_coords, target_classes)
+            for result, roi_coords in zip(results, roi_coords_list)
+        ]
+    
+    def _count_result_in_roi(
+        self,
+        result,
+        roi_coords: List[List[int]],
+        target_classes: Optional[List[str]] = None
+    ) -> CountResult:
+        """Filter a single YOLO result by ROI and target classes."""
+        if result is None:
             return CountResult(
                 class_name="all" if not target_classes else target_classes[0],
                 count=0,
                 confidence=0.0,
-                timestamp=datetime.now(),
-                detections=[]
+                timestamp_ns=time.monotonic_ns(),
+                detections=np.empty((0, 4), dtype=np.float32)
             )
         
-        # Create ROI mask
-        roi_mask = np.zeros(frame.shape[:2], dtype=np.uint8)
-        roi_points = np.array(roi_coords, dtype=np.int32)
-        cv2.fillPoly(roi_mask, [roi_points], 255)
-        
-        # Filter detections by ROI
-        detections_in_roi = []
-        total_confidence = 0.0
-        
-        boxes = results[0].boxes
-        for box in boxes:
-            # Get box center point
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-            center_x = int((x1 + x2) / 2)
-            center_y = int((y1 + y2) / 2)
-            
-            # Check if center is in ROI
-            if roi_mask[center_y, center_x] > 0:
-                cls_id = int(box.cls[0])
-                cls_name = results[0].names[cls_id]
-                
-                # Filter by target classes if specified
-                if target_classes is None or cls_name in target_classes:
-                    confidence = float(box.conf[0])
-                    detections_in_roi.append((x1, y1, x2, y2))
-                    total_confidence += confidence
+        roi_points = self._get_roi_points(roi_coords)
+        
+        # Pull all boxes to host memory once, then filter with array ops
+        boxes = result.boxes
+        xyxy = boxes.xyxy.cpu().numpy()
+        cls_ids = boxes.cls.cpu().numpy().astype(np.int32)
+        confidences = boxes.conf.cpu().numpy()
+        
+        # Keep boxes whose center lies in the ROI and whose class is targeted
+        filter_classes = target_classes is not None
+        target_ids = self._get_target_ids(target_classes) if filter_classes else NO_TARGET_IDS
+        keep, confidence_sum = filter_boxes(
+            xyxy,
+            cls_ids,
+            confidences,
+            roi_points.reshape(-1, 2).astype(np.float64),
+            target_ids,
+            filter_classes
+        )
         
+        detections_in_roi = xyxy[keep].astype(np.float32, copy=False)
         count = len(detections_in_roi)
-        avg_confidence = total_confidence / count if count > 0 else 0.0
+        avg_confidence = confidence_sum / count if count > 0 else 0.0
         
         return CountResult(
             class_name="all" if not target_classes else target_classes[0],
             count=count,
             confidence=avg_confidence,
-            timestamp=datetime.now(),
+            timestamp_ns=time.monotonic_ns(),
             detections=detections_in_roi
         )
     
+    def _get_target_ids(self, target_classes: List[str]) -> np.ndarray:
+        """Class ids for the given class names, resolved once per (model, class set)."""
+        key = (str(self.detector.model_path), frozenset(target_classes))
+        target_ids = self._target_ids_cache.get(key)
+        if target_ids is None:
+            name_to_id = self.detector.name_to_id
+            target_ids = np.array(
+                sorted(name_to_id[name] for name in target_classes if name in name_to_id),
+                dtype=np.int32
+            )
+            self._target_ids_cache[key] = target_ids
+        return target_ids
+    
+    def _get_roi_points(self, roi_coords: List[List[int]]) -> np.ndarray:
+        """Return the ROI polygon as an OpenCV contour, converted once per ROI."""
+        key = tuple(tuple(point) for point in roi_coords)
+        roi_points = self._roi_cache.get(key)
+        if roi_points is None:
+            roi_points = np.array(roi_coords, dtype=np.int32).reshape(-1, 1, 2)
+            self._roi_cache[key] = roi_points
+        return roi_points
+    
     def count_objects(
         self,
         frame: np.ndarray,
@@ -140,15 +271,8 @@ class ObjectCounter:
         if not results or len(results) == 0:
             return 0
         
-        count = 0
-        boxes = results[0].boxes
-        for box in boxes:
-            cls_id = int(box.cls[0])
-            cls_name = results[0].names[cls_id]
-            if cls_name == target_class:
-                count += 1
-        
-        return count
+        cls_ids = results[0].boxes.cls.cpu().numpy().astype(np.int32)
+        return int(np.isin(cls_ids, self._get_target_ids([target_class])).sum())
     
     def detect_quantity_change(
         self,
@@ -217,14 +341,17 @@ class ObjectCounter:
             count: Current count
             max_history: Maximum history length
         """
-        if class_name not in self.class_history:
-            self.class_history[class_name] = []
-        
-        self.class_history[class_name].append(count)
+        history = self.class_history.get(class_name)
+        if history is None or history.maxlen != max_history:
+            # deque(maxlen=...) trims the oldest count on append, no list re-slicing
+            history = deque(history or (), maxlen=max_history)
+            self.class_history[class_name] = history
+            self._history_totals[class_name] = sum(history)
         
-        # Keep only recent history
-        if len(self.class_history[class_name]) > max_history:
-            self.class_history[class_name] = self.class_history[class_name][-max_history:]
+        if len(history) == max_history:
+            self._history_totals[class_name] -= history[0]
+        history.append(count)
+        self._history_totals[class_name] += count
     
     def get_average_count(self, class_name: str, window: int = 10) -> float:
         """
@@ -237,18 +364,24 @@ class ObjectCounter:
         Returns:
             Average count
         """
-        if class_name not in self.class_history:
+        history = self.class_history.get(class_name)
+        if not history:
             return 0.0
         
-        recent = self.class_history[class_name][-window:]
-        return sum(recent) / len(recent) if recent else 0.0
+        size = len(history)
+        if window <= 0 or window >= size:
+            # Whole buffer: use the running total
+            return self._history_totals[class_name] / size
+        
+        return sum(islice(reversed(history), window)) / window
     
     def draw_roi(
         self,
         frame: np.ndarray,
         roi_coords: List[List[int]],
         color: Tuple[int, int, int] = (0, 255, 0),
-        thickness: int = 2
+        thickness: int = 2,
+        inplace: bool = False
     ) -> np.ndarray:
         """
         Draw ROI polygon on frame for visualization.
@@ -258,20 +391,22 @@ class ObjectCounter:
             roi_coords: ROI coordinates
             color: Line color (BGR)
             thickness: Line thickness
+            inplace: Draw directly on `frame` instead of a copy
             
         Returns:
             Frame with ROI drawn
         """
-        frame_copy = frame.copy()
-        roi_points = np.array(roi_coords, dtype=np.int32)
+        frame_copy = _drawing_canvas(frame, inplace)
+        roi_points = self._get_roi_points(roi_coords)
         cv2.polylines(frame_copy, [roi_points], isClosed=True, color=color, thickness=thickness)
-        return frame_copy
+        return _to_ndarray(frame_copy)
     
     def annotate_count(
         self,
         frame: np.ndarray,
         count_result: CountResult,
-        position: Tuple[int, int] = (50, 50)
+        position: Tuple[int, int] = (50, 50),
+        inplace: bool = False
     ) -> np.ndarray:
         """
         Annotate frame with count information.
@@ -280,11 +415,12 @@ class ObjectCounter:
             frame: Input frame
             count_result: Result from count_in_roi
             position: Text position (x, y)
+            inplace: Draw directly on `frame` instead of a copy
             
         Returns:
             Annotated frame
         """
-        frame_copy = frame.copy()
+        frame_copy = _drawing_canvas(frame, inplace)
         
         text = f"{count_result.class_name}: {count_result.count} (conf: {count_result.confidence:.2f})"
         cv2.putText(
@@ -297,17 +433,17 @@ class ObjectCounter:
             2
         )
         
-        # Draw bounding boxes for detections
-        for (x1, y1, x2, y2) in count_result.detections:
+        # Draw bounding boxes for detections (one int conversion for all boxes)
+        for x1, y1, x2, y2 in count_result.detections.astype(np.int32).tolist():
             cv2.rectangle(
                 frame_copy,
-                (int(x1), int(y1)),
-                (int(x2), int(y2)),
+                (x1, y1),
+                (x2, y2),
                 (0, 255, 0),
                 2
             )
         
-        return frame_copy
+        return _to_ndarray(frame_copy)
 
 
 # Singleton instance
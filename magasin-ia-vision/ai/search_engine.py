@@ -3,12 +3,29 @@ Object Search Engine for ASECNA Stock Management
 Handles searching for specific items across all cameras and generating tracking links.
 """
 
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
 from typing import List, Dict, Optional
+import heapq
 import logging
 from ai.temporal_detection import get_temporal_engine
 
 logger = logging.getLogger(__name__)
 
+# Lightweight match record; result dicts are only built for the top hits
+_SearchHit = namedtuple("_SearchHit", ["avg_confidence", "duration_minutes", "camera_id", "tracking"])
+# Ranking of the hits: confidence, then duration
+_hit_rank = attrgetter("avg_confidence", "duration_minutes")
+
+
+@lru_cache(maxsize=1024)
+def _format_second(ts: datetime) -> str:
+    """strftime once per distinct second; search hits mostly share last_seen seconds"""
+    return ts.strftime("%Y-%m-%d %H:%M:%S")
+
+
 class ObjectSearchEngine:
     """
     Search engine to locate objects across the camera network.
@@ -17,39 +34,47 @@ class ObjectSearchEngine:
     def __init__(self):
         self.temporal_engine = get_temporal_engine()
 
-    def search_by_name(self, query: str) -> List[Dict]:
+    def search_by_name(self, query: str, limit: Optional[int] = None) -> List[Dict]:
         """
         Search for objects matching the query string.
+        Returns every match (or only the `limit` best) by confidence, then duration.
         """
-        results = []
-        trackings = self.temporal_engine.active_trackings
-        
-        for (obj_type, cam_id), tracking in trackings.items():
-            if query.lower() in obj_type.lower():
-                results.append({
-                    "object_type": obj_type,
-                    "camera_id": cam_id,
-                    "status": tracking.status.value,
-                    "duration_minutes": tracking.get_duration_minutes(),
-                    "avg_confidence": tracking.avg_confidence,
-                    "last_seen": tracking.last_seen.strftime("%Y-%m-%d %H:%M:%S"),
-                    "tracking_id": tracking.detection_events[-1].tracking_id if tracking.detection_events else None,
-                    "bbox": tracking.detection_events[-1].bbox_coords if tracking.detection_events else None
-                })
+        # Locked snapshot of the matches (the engine scans distinct type names only)
+        hits = (
+            _SearchHit(tracking.avg_confidence, tracking.get_duration_minutes(), tracking.camera_id, tracking)
+            for tracking in self.temporal_engine.search_trackings(query)
+        )
+        if limit is None:
+            top_hits = sorted(hits, key=_hit_rank, reverse=True)
+        else:
+            top_hits = heapq.nlargest(limit, hits, key=_hit_rank)
         
-        # Sort by confidence and duration
-        results.sort(key=lambda x: (x['avg_confidence'], x['duration_minutes']), reverse=True)
+        results = []
+        for hit in top_hits:
+            tracking = hit.tracking
+            last_event = tracking.detection_events[-1] if tracking.detection_events else None
+            results.append({
+                "object_type": tracking.object_type,
+                "camera_id": hit.camera_id,
+                "status": tracking.status.value,
+                "duration_minutes": hit.duration_minutes,
+                "avg_confidence": hit.avg_confidence,
+                "last_seen": _format_second(tracking.last_seen.replace(microsecond=0)),
+                "tracking_id": last_event.tracking_id if last_event else None,
+                "bbox": last_event.bbox_coords if last_event else None
+            })
         return results
 
     def get_object_locations(self, object_type: str) -> List[str]:
         """
         Get all camera IDs where a specific object type is currently tracked.
         """
-        locations = []
-        for (obj_type, cam_id) in self.temporal_engine.active_trackings.keys():
-            if obj_type.lower() == object_type.lower():
-                locations.append(cam_id)
-        return list(set(locations))
+        engine = self.temporal_engine
+        # The detection thread mutates the index: read it under the engine lock
+        with engine._lock:
+            trackings = engine.active_trackings_by_type.get(object_type.lower(), {})
+            # Keyed by (camera_id, object_type): a camera may track several spellings
+            return list(dict.fromkeys(cam_id for cam_id, _ in trackings))
 
 # Singleton instance
 _search_engine = None
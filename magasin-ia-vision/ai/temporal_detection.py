@@ -6,11 +6,15 @@ when objects remain stable for a configured duration.
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 import logging
+import queue
+import threading
+import time
 from enum import Enum
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +28,13 @@ class TrackingStatus(Enum):
     REJECTED = "rejected"  # Admin rejected
 
 
+# Statuses whose detections count towards stock
+_STABLE_OR_PENDING = frozenset({TrackingStatus.STABLE, TrackingStatus.PENDING_VALIDATION})
+
+# Trackings no longer involved in a validation, prunable once unseen for a while
+_PRUNABLE = frozenset({TrackingStatus.TRACKING, TrackingStatus.VALIDATED, TrackingStatus.REJECTED})
+
+
 @dataclass
 class DetectionEvent:
     """Single detection event"""
@@ -33,6 +44,118 @@ class DetectionEvent:
     timestamp: datetime
     bbox_coords: Tuple[float, float, float, float]  # (x1, y1, x2, y2)
     tracking_id: Optional[str] = None
+    ts_epoch: float = 0.0  # timestamp.timestamp(), computed once
+    
+    def __post_init__(self):
+        if not self.ts_epoch:
+            self.ts_epoch = self.timestamp.timestamp()
+
+
+class DetectionEventLog:
+    """
+    Columnar, append-only log of the detection events of one tracking.
+    
+    Timestamps are stored as float32 offsets from `base_epoch` (base-delta),
+    confidences and boxes as float32 arrays growing by doubling: a few bytes
+    per event instead of a DetectionEvent + datetime object.
+    Each event also carries the number of detections it stands for
+    (`add_hit()` folds a throttled detection into the last event), so
+    `hit_count()` does not depend on the recording rate.
+    Old events are evicted from the front with a binary search.
+    Indexing / iteration rebuild DetectionEvent objects on demand.
+    """
+    _INITIAL_CAPACITY = 64
+    
+    def __init__(self, object_type: str, camera_id: str):
+        self.object_type = object_type
+        self.camera_id = camera_id
+        self.base_epoch = 0.0
+        self._ts = np.empty(self._INITIAL_CAPACITY, dtype=np.float32)
+        self._conf = np.empty(self._INITIAL_CAPACITY, dtype=np.float32)
+        self._bbox = np.empty((self._INITIAL_CAPACITY, 4), dtype=np.float32)
+        self._hits = np.empty(self._INITIAL_CAPACITY, dtype=np.int32)
+        self._tracking_ids: List[Optional[str]] = []  # live events only
+        self._start = 0
+        self._end = 0
+    
+    def __len__(self) -> int:
+        return self._end - self._start
+    
+    def __getitem__(self, index: int) -> DetectionEvent:
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("detection event index out of range")
+        i = self._start + index
+        ts_epoch = self.base_epoch + float(self._ts[i])
+        return DetectionEvent(
+            object_type=self.object_type,
+            camera_id=self.camera_id,
+            confidence=float(self._conf[i]),
+            timestamp=datetime.fromtimestamp(ts_epoch),
+            bbox_coords=tuple(self._bbox[i].tolist()),
+            tracking_id=self._tracking_ids[index],
+            ts_epoch=ts_epoch
+        )
+    
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+    
+    def append(self, ts_epoch: float, confidence: float, bbox_coords, tracking_id: Optional[str] = None):
+        if self._start == self._end:
+            self._start = self._end = 0
+            self.base_epoch = ts_epoch
+        elif self._end == len(self._ts):
+            self._compact()
+        i = self._end
+        self._ts[i] = ts_epoch - self.base_epoch
+        self._conf[i] = confidence
+        self._bbox[i] = bbox_coords
+        self._hits[i] = 1
+        self._tracking_ids.append(tracking_id)
+        self._end += 1
+    
+    def add_hit(self):
+        """Count one more detection in the last event (no-op when empty)"""
+        if self._end > self._start:
+            self._hits[self._end - 1] += 1
+    
+    def hit_count(self) -> int:
+        """Number of detections behind the live events"""
+        return int(self._hits[self._start:self._end].sum())
+    
+    def evict_before(self, oldest_epoch: float):
+        """Drop the events older than `oldest_epoch` (timestamps are appended in order)"""
+        live = self._ts[self._start:self._end]
+        drop = int(np.searchsorted(live, np.float32(oldest_epoch - self.base_epoch), side='left'))
+        if drop:
+            self._start += drop
+            del self._tracking_ids[:drop]
+    
+    def clear(self):
+        self._start = self._end = 0
+        self._tracking_ids.clear()
+    
+    def _compact(self):
+        """Move live events to the front (rebasing offsets), doubling capacity if still over half full"""
+        n = len(self)
+        capacity = len(self._ts)
+        if n > capacity // 2:
+            capacity *= 2
+        start, end = self._start, self._end
+        rebase = float(self._ts[start]) if n else 0.0
+        ts = np.empty(capacity, dtype=np.float32)
+        ts[:n] = self._ts[start:end] - np.float32(rebase)
+        conf = np.empty(capacity, dtype=np.float32)
+        conf[:n] = self._conf[start:end]
+        bbox = np.empty((capacity, 4), dtype=np.float32)
+        bbox[:n] = self._bbox[start:end]
+        hits = np.empty(capacity, dtype=np.int32)
+        hits[:n] = self._hits[start:end]
+        self._ts, self._conf, self._bbox, self._hits = ts, conf, bbox, hits
+        self.base_epoch += rebase
+        self._start, self._end = 0, n
 
 
 @dataclass
@@ -48,7 +171,39 @@ class TemporalTracking:
     status: TrackingStatus = TrackingStatus.TRACKING
     stability_threshold_minutes: int = 60
     detected_quantity: int = 0
-    detection_events: List[DetectionEvent] = field(default_factory=list)
+    # Events within the last stability window only (older ones are evicted on append)
+    detection_events: DetectionEventLog = field(init=False, repr=False)
+    # Epoch seconds mirrors of first_seen / last_seen (float arithmetic on the hot path)
+    first_seen_epoch: float = 0.0
+    last_seen_epoch: float = 0.0
+    stability_threshold_sec: float = field(init=False)
+    
+    def __post_init__(self):
+        self.detection_events = DetectionEventLog(self.object_type, self.camera_id)
+        self.stability_threshold_sec = self.stability_threshold_minutes * 60.0
+        if not self.first_seen_epoch:
+            self.first_seen_epoch = self.first_seen.timestamp()
+        if not self.last_seen_epoch:
+            self.last_seen_epoch = self.last_seen.timestamp()
+    
+    def reset_window(self, timestamp: datetime):
+        """Restart the tracking window at `timestamp`"""
+        self.first_seen = self.last_seen = timestamp
+        self.first_seen_epoch = self.last_seen_epoch = timestamp.timestamp()
+    
+    def add_detection(
+        self,
+        timestamp: datetime,
+        ts_epoch: float,
+        confidence: float,
+        bbox_coords: Tuple[float, float, float, float],
+        tracking_id: Optional[str] = None
+    ):
+        """Record a detection and drop events older than the stability window"""
+        self.last_seen = timestamp
+        self.last_seen_epoch = ts_epoch
+        self.detection_events.append(ts_epoch, confidence, bbox_coords, tracking_id)
+        self.detection_events.evict_before(ts_epoch - self.stability_threshold_sec)
     
     def update_confidence(self, confidence: float):
         """Update average confidence with new detection"""
@@ -56,14 +211,17 @@ class TemporalTracking:
         self.detection_count += 1
         self.avg_confidence = self.total_confidence / self.detection_count
     
+    def get_duration_sec(self) -> float:
+        """Get tracking duration in seconds"""
+        return self.last_seen_epoch - self.first_seen_epoch
+    
     def get_duration_minutes(self) -> float:
-        """Get tracking duration in minutes"""
-        delta = self.last_seen - self.first_seen
-        return delta.total_seconds() / 60
+        """Get tracking duration in minutes (display/API only)"""
+        return (self.last_seen_epoch - self.first_seen_epoch) / 60
     
     def is_stable(self) -> bool:
         """Check if tracking is stable (duration >= threshold)"""
-        return self.get_duration_minutes() >= self.stability_threshold_minutes
+        return (self.last_seen_epoch - self.first_seen_epoch) >= self.stability_threshold_sec
 
 
 class TemporalDetectionEngine:
@@ -81,7 +239,10 @@ class TemporalDetectionEngine:
         self,
         stability_duration_minutes: int = 60,
         confidence_threshold: float = 0.60,
-        alert_delay_hours: int = 3
+        alert_delay_hours: int = 3,
+        min_interval_sec: float = 1.0,
+        max_trackings: int = 10_000,
+        retention_hours: int = 24
     ):
         """
         Initialize temporal detection engine.
@@ -90,13 +251,39 @@ class TemporalDetectionEngine:
             stability_duration_minutes: Time object must be stable before validation
             confidence_threshold: Minimum confidence to accept detection
             alert_delay_hours: Hours to wait before sending alert to admin
+            min_interval_sec: Minimum time between two recorded detections of the
+                same (object, camera); detections in between only refresh last_seen
+                and are added to the last event's hit count (stock counts are
+                unaffected)
+            max_trackings: Maximum number of trackings kept (least recently seen evicted)
+            retention_hours: Unseen trackings / processed validations older than this are pruned
         """
         self.stability_duration_minutes = stability_duration_minutes
+        self.stability_threshold_sec = stability_duration_minutes * 60.0
         self.confidence_threshold = confidence_threshold
         self.alert_delay_hours = alert_delay_hours
+        self.min_interval_sec = min_interval_sec
+        self._max_trackings = max_trackings
+        self._retention_sec = retention_hours * 3600.0
+        self._last_prune_epoch = 0.0
+        self._now = datetime.now  # bound once, avoids the module lookup per call
+        # Guards the trackings, their indices and the validations: pipelines of
+        # several cameras, the alert checker and the API threads all use them
+        # (reentrant: _prune runs inside process_detection)
+        self._lock = threading.RLock()
         
         # Active trackings: {(object_type, camera_id): TemporalTracking}
-        self.active_trackings: Dict[Tuple[str, str], TemporalTracking] = {}
+        # Ordered least -> most recently recorded (LRU)
+        self.active_trackings: Dict[Tuple[str, str], TemporalTracking] = OrderedDict()
+        
+        # Epoch of the last recorded detection per (object_type, camera_id)
+        self._last_processed: Dict[Tuple[str, str], float] = {}
+        
+        # Secondary indices: {object_type: {camera_id: TemporalTracking}}
+        self._by_object_type: Dict[str, Dict[str, TemporalTracking]] = defaultdict(dict)
+        # Same for case-insensitive search: {lowercased type: {(camera_id, object_type): TemporalTracking}}
+        # (types differing only in case share the outer key, not the tracking)
+        self.active_trackings_by_type: Dict[str, Dict[Tuple[str, str], TemporalTracking]] = defaultdict(dict)
         
         # Validated stock quantities: {object_type: quantity}
         self.validated_stock: Dict[str, int] = defaultdict(int)
@@ -104,10 +291,17 @@ class TemporalDetectionEngine:
         # Pending validations: {validation_id: validation_data}
         self.pending_validations: Dict[str, Dict] = {}
         
-        # Callbacks for external systems (e.g., notification broadcast)
-        self.on_validation_created = None
-        self.on_validation_approved = None
-        self.on_validation_rejected = None
+        # Trackings flipped to pending by each validation: {validation_id: [(object_type, camera_id)]}
+        self._validation_trackings: Dict[str, List[Tuple[str, str]]] = {}
+        
+        # Validation requests waiting to be persisted by the DB writer thread
+        self._db_queue: "queue.Queue[Tuple]" = queue.Queue()
+        self._db_thread = threading.Thread(target=self._db_writer, name="validation-db", daemon=True)
+        self._db_thread.start()
+        
+        # Subscribers for external systems (e.g., notification broadcast):
+        # {event type: [callback(data)]}, see subscribe()
+        self._subscribers: Dict[str, List[Callable[[Dict], None]]] = defaultdict(list)
 
         logger.info(
             f"TemporalDetectionEngine initialized: "
@@ -116,6 +310,27 @@ class TemporalDetectionEngine:
             f"alert_delay={alert_delay_hours}h"
         )
     
+    def subscribe(self, event_type: str, callback: Callable[[Dict], None]):
+        """
+        Call `callback(data)` on each `event_type` event: VALIDATION_CREATED,
+        VALIDATION_APPROVED or VALIDATION_REJECTED (data = the validation dict).
+        Callbacks run in the emitting thread and must not block.
+        """
+        self._subscribers[event_type].append(callback)
+    
+    def unsubscribe(self, event_type: str, callback: Callable[[Dict], None]):
+        """Remove a callback registered with subscribe()"""
+        callbacks = self._subscribers.get(event_type)
+        if callbacks and callback in callbacks:
+            callbacks.remove(callback)
+    
+    def _emit(self, event_type: str, data: Dict):
+        for callback in self._subscribers.get(event_type, ()):
+            try:
+                callback(data)
+            except Exception as e:
+                logger.error(f"Error in {event_type} subscriber: {e}")
+    
     def process_detection(
         self,
         object_type: str,
@@ -143,51 +358,166 @@ class TemporalDetectionEngine:
             return None
         
         if timestamp is None:
-            timestamp = datetime.now()
-        
-        # Create detection event
-        event = DetectionEvent(
-            object_type=object_type,
-            camera_id=camera_id,
-            confidence=confidence,
-            timestamp=timestamp,
-            bbox_coords=bbox_coords,
-            tracking_id=tracking_id
-        )
-        
-        # Get or create tracking
-        key = (object_type, camera_id)
+            timestamp = self._now()
         
-        if key not in self.active_trackings:
-            # New tracking
-            tracking = TemporalTracking(
-                object_type=object_type,
-                camera_id=camera_id,
-                first_seen=timestamp,
-                last_seen=timestamp,
-                stability_threshold_minutes=self.stability_duration_minutes
-            )
-            self.active_trackings[key] = tracking
-            logger.info(f"Started tracking {object_type} on {camera_id}")
-        else:
-            tracking = self.active_trackings[key]
-        
-        # Update tracking
-        tracking.last_seen = timestamp
-        tracking.update_confidence(confidence)
-        tracking.detection_events.append(event)
-        
-        # Check if tracking became stable
-        if tracking.status == TrackingStatus.TRACKING and tracking.is_stable():
-            tracking.status = TrackingStatus.STABLE
-            logger.info(
-                f"{object_type} on {camera_id} became stable "
-                f"(duration: {tracking.get_duration_minutes():.1f}min, "
-                f"confidence: {tracking.avg_confidence:.2%})"
+        with self._lock:
+            key = (object_type, camera_id)
+            ts_epoch = timestamp.timestamp()
+            tracking = self.active_trackings.get(key)
+            
+            # Throttle: within min_interval_sec only keep last_seen fresh and
+            # count the detection against the last recorded event
+            if tracking is not None and ts_epoch - self._last_processed.get(key, 0.0) < self.min_interval_sec:
+                tracking.last_seen = timestamp
+                tracking.last_seen_epoch = ts_epoch
+                tracking.detection_events.add_hit()
+                return "tracking"
+            self._last_processed[key] = ts_epoch
+            
+            # Periodic cleanup (check_alerts also prunes, but may not be scheduled)
+            if ts_epoch - self._last_prune_epoch >= 3600:
+                self._prune(timestamp)
+            
+            # Get or create tracking
+            if tracking is None:
+                # New tracking
+                tracking = TemporalTracking(
+                    object_type=object_type,
+                    camera_id=camera_id,
+                    first_seen=timestamp,
+                    last_seen=timestamp,
+                    first_seen_epoch=ts_epoch,
+                    last_seen_epoch=ts_epoch,
+                    stability_threshold_minutes=self.stability_duration_minutes
+                )
+                self.active_trackings[key] = tracking
+                self._by_object_type[object_type][camera_id] = tracking
+                self.active_trackings_by_type[object_type.lower()][(camera_id, object_type)] = tracking
+                logger.info(f"Started tracking {object_type} on {camera_id}")
+                if len(self.active_trackings) > self._max_trackings:
+                    self._evict_over_cap(key)
+            else:
+                self.active_trackings.move_to_end(key)
+            
+            # Update tracking
+            tracking.update_confidence(confidence)
+            tracking.add_detection(timestamp, ts_epoch, confidence, bbox_coords, tracking_id)
+            
+            # Check if tracking became stable
+            if tracking.status == TrackingStatus.TRACKING and tracking.is_stable():
+                tracking.status = TrackingStatus.STABLE
+                logger.info(
+                    f"{object_type} on {camera_id} became stable "
+                    f"(duration: {tracking.get_duration_minutes():.1f}min, "
+                    f"confidence: {tracking.avg_confidence:.2%})"
+                )
+                return "stable"
+            
+            return "tracking"
+    
+    def _evict_over_cap(self, new_key: Tuple[str, str]):
+        """
+        Drop the least recently seen prunable trackings (same rule as _prune)
+        until max_trackings is respected. Trackings involved in a validation
+        are never evicted: the cap is exceeded instead, and logged.
+        """
+        excess = len(self.active_trackings) - self._max_trackings
+        evictable = []
+        for key, tracking in self.active_trackings.items():
+            if len(evictable) == excess:
+                break
+            if key != new_key and tracking.status in _PRUNABLE:
+                evictable.append(key)
+        for key in evictable:
+            self._remove_tracking(key)
+        if len(evictable) < excess:
+            logger.warning(
+                f"{len(self.active_trackings)} trackings exceed max_trackings={self._max_trackings}: "
+                f"the others are stable or pending validation"
             )
-            return "stable"
-        
-        return "tracking"
+    
+    def _remove_tracking(self, key: Tuple[str, str]):
+        """Drop a tracking from the main dict and every index"""
+        tracking = self.active_trackings.pop(key)
+        object_type, camera_id = key
+        for index, type_key, entry_key in ((self._by_object_type, object_type, camera_id),
+                                           (self.active_trackings_by_type, object_type.lower(), (camera_id, object_type))):
+            entries = index.get(type_key)
+            if entries is not None and entries.get(entry_key) is tracking:
+                del entries[entry_key]
+                if not entries:
+                    del index[type_key]
+        self._last_processed.pop(key, None)
+    
+    def _prune(self, now: Optional[datetime] = None):
+        """
+        Drop trackings unseen for `retention_hours` that are not part of a
+        validation (one-off false positives, validated/rejected objects), and
+        validations processed more than `retention_hours` ago.
+        """
+        with self._lock:
+            if now is None:
+                now = self._now()
+            now_epoch = now.timestamp()
+            self._last_prune_epoch = now_epoch
+            cutoff = now_epoch - self._retention_sec
+            
+            stale = [
+                key for key, tracking in self.active_trackings.items()
+                if tracking.status in _PRUNABLE and tracking.last_seen_epoch < cutoff
+            ]
+            for key in stale:
+                self._remove_tracking(key)
+            
+            done = [
+                validation_id for validation_id, validation in self.pending_validations.items()
+                if validation['status'] != 'pending'
+                and validation['validated_at'] is not None
+                and validation['validated_at'].timestamp() < cutoff
+            ]
+            for validation_id in done:
+                del self.pending_validations[validation_id]
+                self._validation_trackings.pop(validation_id, None)
+            
+            if stale or done:
+                logger.info(f"Pruned {len(stale)} stale trackings and {len(done)} processed validations")
+    
+    def _pending_trackings_of(self, validation_id: str, object_type: str) -> List[TemporalTracking]:
+        """Trackings put in PENDING_VALIDATION by this validation (consumes the record)"""
+        keys = self._validation_trackings.pop(validation_id, None)
+        if keys is None:
+            # Not created by this engine instance: fall back to the type index
+            return self._trackings_of(object_type)
+        trackings = (self.active_trackings.get(key) for key in keys)
+        return [tracking for tracking in trackings if tracking is not None]
+    
+    def _trackings_of(
+        self,
+        object_type: str,
+        camera_id: Optional[str] = None
+    ) -> List[TemporalTracking]:
+        """Trackings of an object type (optionally one camera), via the type index."""
+        by_camera = self._by_object_type.get(object_type)
+        if not by_camera:
+            return []
+        if camera_id:
+            tracking = by_camera.get(camera_id)
+            return [tracking] if tracking is not None else []
+        return list(by_camera.values())
+    
+    def search_trackings(self, name: str) -> List[TemporalTracking]:
+        """
+        Trackings whose object type contains `name` (case-insensitive).
+        Scans the distinct, already lowercased types of the type index rather
+        than every (type, camera) tracking, lowering only the query.
+        """
+        needle = name.lower()
+        with self._lock:
+            return [
+                tracking
+                for type_key, by_camera in self.active_trackings_by_type.items() if needle in type_key
+                for tracking in by_camera.values()
+            ]
     
     def count_stable_objects(
         self,
@@ -204,25 +534,16 @@ class TemporalDetectionEngine:
         Returns:
             Count of stable objects
         """
-        count = 0
-        
-        for (obj_type, cam_id), tracking in self.active_trackings.items():
-            if obj_type != object_type:
-                continue
-            
-            if camera_id and cam_id != camera_id:
-                continue
-            
-            if tracking.status in [TrackingStatus.STABLE, TrackingStatus.PENDING_VALIDATION]:
-                # Count based on detection events in last stability window
-                recent_events = [
-                    e for e in tracking.detection_events
-                    if (tracking.last_seen - e.timestamp).total_seconds() / 60 
-                       <= self.stability_duration_minutes
-                ]
-                count += len(recent_events)
-        
-        return count
+        with self._lock:
+            count = 0
+            
+            for tracking in self._trackings_of(object_type, camera_id):
+                if tracking.status in _STABLE_OR_PENDING:
+                    # Count based on detections in last stability window
+                    # (throttled ones included: independent of min_interval_sec)
+                    count += tracking.detection_events.hit_count()
+            
+            return count
     
     def calculate_stock_delta(
         self,
@@ -253,72 +574,62 @@ class TemporalDetectionEngine:
         """
         Create a validation request for admin approval.
         """
-        current, detected, delta = self.calculate_stock_delta(object_type, camera_id)
-        
-        if delta == 0:
-            return None
-        
-        # Get relevant trackings
-        trackings = []
-        for (obj_type, cam_id), tracking in self.active_trackings.items():
-            if obj_type != object_type:
-                continue
-            if camera_id and cam_id != camera_id:
-                continue
-            if tracking.status == TrackingStatus.STABLE:
-                trackings.append(tracking)
-        
-        if not trackings:
-            return None
-        
-        # Calculate average confidence across all trackings
-        avg_confidence = sum(t.avg_confidence for t in trackings) / len(trackings)
-        
-        # Create validation request
-        validation_id = f"VAL-{object_type}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        validation_data = {
-            'id': validation_id,
-            'object_type': object_type,
-            'camera_ids': list(set(t.camera_id for t in trackings)),
-            'quantity_delta': delta,
-            'current_quantity': current,
-            'proposed_quantity': detected,
-            'avg_confidence': avg_confidence,
-            'detection_duration_minutes': max(t.get_duration_minutes() for t in trackings),
-            'status': 'pending',
-            'created_at': datetime.now(),
-            'alert_sent_at': None,
-            'validated_at': None,
-            'validated_by': None,
-            'rejection_reason': None
-        }
-        
-        self.pending_validations[validation_id] = validation_data
-        
-        # PERSIST TO DATABASE
-        try:
-            from services.validation_service import get_validation_service
-            val_service = get_validation_service()
-            val_service.create_request(validation_data)
-        except Exception as e:
-            logger.error(f"Failed to persist validation request: {e}")
-        
-        # Update tracking status
-        for tracking in trackings:
-            tracking.status = TrackingStatus.PENDING_VALIDATION
+        with self._lock:
+            current, detected, delta = self.calculate_stock_delta(object_type, camera_id)
+            
+            if delta == 0:
+                return None
+            
+            # Get relevant trackings
+            trackings = [
+                tracking for tracking in self._trackings_of(object_type, camera_id)
+                if tracking.status == TrackingStatus.STABLE
+            ]
+            
+            if not trackings:
+                return None
+            
+            # Calculate average confidence across all trackings
+            avg_confidence = sum(t.avg_confidence for t in trackings) / len(trackings)
+            
+            # Create validation request
+            now = self._now()
+            validation_id = f"VAL-{object_type}-{now.strftime('%Y%m%d%H%M%S')}"
+            
+            validation_data = {
+                'id': validation_id,
+                'object_type': object_type,
+                'camera_ids': list(set(t.camera_id for t in trackings)),
+                'quantity_delta': delta,
+                'current_quantity': current,
+                'proposed_quantity': detected,
+                'avg_confidence': avg_confidence,
+                'detection_duration_minutes': max(t.get_duration_minutes() for t in trackings),
+                'status': 'pending',
+                'created_at': now,
+                'alert_sent_at': None,
+                'validated_at': None,
+                'validated_by': None,
+                'rejection_reason': None
+            }
+            
+            self.pending_validations[validation_id] = validation_data
+            
+            # PERSIST TO DATABASE (batched, in the background)
+            self._db_queue.put(("create", validation_data))
+            
+            # Update tracking status
+            for tracking in trackings:
+                tracking.status = TrackingStatus.PENDING_VALIDATION
+            self._validation_trackings[validation_id] = [(t.object_type, t.camera_id) for t in trackings]
+            
+            logger.info(
+                f"Created validation request {validation_id}: "
+                f"{object_type} {current} → {detected} ({delta:+d})"
+            )
         
-        logger.info(
-            f"Created validation request {validation_id}: "
-            f"{object_type} {current} → {detected} ({delta:+d})"
-        )
-        
-        # Trigger notification callback
-        if self.on_validation_created:
-            try:
-                self.on_validation_created(validation_data)
-            except Exception as e:
-                logger.error(f"Error in validation notification callback: {e}")
+        # Notify subscribers
+        self._emit("VALIDATION_CREATED", validation_data)
         
         return validation_data
     
@@ -330,51 +641,45 @@ class TemporalDetectionEngine:
         """
         Approve a validation request.
         """
-        if validation_id not in self.pending_validations:
-            logger.error(f"Validation {validation_id} not found")
-            return False
-        
-        validation = self.pending_validations[validation_id]
-        
-        if validation['status'] != 'pending':
-            logger.error(f"Validation {validation_id} already processed")
-            return False
-        
-        # PERSIST TO DATABASE
-        try:
-            from services.validation_service import get_validation_service
-            val_service = get_validation_service()
-            # Convert admin_id to int if necessary (based on User model)
-            val_service.approve_request(validation_id, 1) # Using ID 1 for now
-        except Exception as e:
-            logger.error(f"Failed to persist validation approval: {e}")
+        with self._lock:
+            if validation_id not in self.pending_validations:
+                logger.error(f"Validation {validation_id} not found")
+                return False
+            
+            validation = self.pending_validations[validation_id]
+            
+            if validation['status'] != 'pending':
+                logger.error(f"Validation {validation_id} already processed")
+                return False
+            
+        # PERSIST TO DATABASE (outside the lock: detections keep flowing)
+        # Convert admin_id to int if necessary (based on User model)
+        if not self._persist_decision("approve_request", validation_id, 1): # Using ID 1 for now
             return False
-
-        # Update validated stock
-        object_type = validation['object_type']
-        self.validated_stock[object_type] = validation['proposed_quantity']
-        
-        # Update validation status
-        validation['status'] = 'approved'
-        validation['validated_at'] = datetime.now()
-        validation['validated_by'] = admin_id
         
-        # Update tracking status
-        for (obj_type, cam_id), tracking in self.active_trackings.items():
-            if obj_type == object_type and tracking.status == TrackingStatus.PENDING_VALIDATION:
-                tracking.status = TrackingStatus.VALIDATED
-        
-        logger.info(
-            f"Validation {validation_id} approved by {admin_id}: "
-            f"{object_type} stock updated to {validation['proposed_quantity']}"
-        )
+        with self._lock:
+            # Update validated stock
+            object_type = validation['object_type']
+            self.validated_stock[object_type] = validation['proposed_quantity']
+            
+            # Update validation status
+            validation['status'] = 'approved'
+            validation['validated_at'] = self._now()
+            validation['validated_by'] = admin_id
+            
+            # Update tracking status
+            pending = TrackingStatus.PENDING_VALIDATION
+            for tracking in self._pending_trackings_of(validation_id, object_type):
+                if tracking.status is pending:
+                    tracking.status = TrackingStatus.VALIDATED
+            
+            logger.info(
+                f"Validation {validation_id} approved by {admin_id}: "
+                f"{object_type} stock updated to {validation['proposed_quantity']}"
+            )
         
-        # Trigger notification callback
-        if self.on_validation_approved:
-            try:
-                self.on_validation_approved(validation)
-            except Exception as e:
-                logger.error(f"Error in approval notification callback: {e}")
+        # Notify subscribers
+        self._emit("VALIDATION_APPROVED", validation)
         
         return True
     
@@ -387,56 +692,101 @@ class TemporalDetectionEngine:
         """
         Reject a validation request.
         """
-        if validation_id not in self.pending_validations:
-            logger.error(f"Validation {validation_id} not found")
+        with self._lock:
+            if validation_id not in self.pending_validations:
+                logger.error(f"Validation {validation_id} not found")
+                return False
+            
+            validation = self.pending_validations[validation_id]
+            
+            if validation['status'] != 'pending':
+                logger.error(f"Validation {validation_id} already processed")
+                return False
+            
+        # PERSIST TO DATABASE (outside the lock: detections keep flowing)
+        if not self._persist_decision("reject_request", validation_id, 1, reason):
             return False
         
-        validation = self.pending_validations[validation_id]
+        with self._lock:
+            # Update validation status
+            validation['status'] = 'rejected'
+            validation['validated_at'] = self._now()
+            validation['validated_by'] = admin_id
+            validation['rejection_reason'] = reason
+            
+            # Reset tracking status
+            object_type = validation['object_type']
+            now = validation['validated_at']
+            pending = TrackingStatus.PENDING_VALIDATION
+            for tracking in self._pending_trackings_of(validation_id, object_type):
+                if tracking.status is pending:
+                    tracking.status = TrackingStatus.REJECTED
+                    # Clear old events
+                    tracking.detection_events.clear()
+                    tracking.reset_window(now)
+                    tracking.detection_count = 0
+                    tracking.total_confidence = 0.0
+                    tracking.avg_confidence = 0.0
+            
+            logger.info(
+                f"Validation {validation_id} rejected by {admin_id}: {reason}"
+            )
         
-        if validation['status'] != 'pending':
-            logger.error(f"Validation {validation_id} already processed")
-            return False
+        # Notify subscribers
+        self._emit("VALIDATION_REJECTED", validation)
         
-        # PERSIST TO DATABASE
+        return True
+    
+    def _persist_decision(self, method: str, validation_id: str, *args) -> bool:
+        """
+        Persist an approval/rejection synchronously so callers learn about DB
+        failures. Queued creates are flushed first: the request must exist.
+        The DB only updates pending requests, so concurrent decisions on the
+        same validation cannot both succeed.
+        """
+        self.flush()
         try:
             from services.validation_service import get_validation_service
-            val_service = get_validation_service()
-            val_service.reject_request(validation_id, 1, reason)
+            if getattr(get_validation_service(), method)(validation_id, *args):
+                return True
+            logger.error(f"Validation {validation_id} could not be persisted")
         except Exception as e:
-            logger.error(f"Failed to persist validation rejection: {e}")
-            return False
-
-        # Update validation status
-        validation['status'] = 'rejected'
-        validation['validated_at'] = datetime.now()
-        validation['validated_by'] = admin_id
-        validation['rejection_reason'] = reason
-        
-        # Reset tracking status
-        object_type = validation['object_type']
-        for (obj_type, cam_id), tracking in self.active_trackings.items():
-            if obj_type == object_type and tracking.status == TrackingStatus.PENDING_VALIDATION:
-                tracking.status = TrackingStatus.REJECTED
-                # Clear old events
-                tracking.detection_events.clear()
-                tracking.first_seen = datetime.now()
-                tracking.last_seen = datetime.now()
-                tracking.detection_count = 0
-                tracking.total_confidence = 0.0
-                tracking.avg_confidence = 0.0
-        
-        logger.info(
-            f"Validation {validation_id} rejected by {admin_id}: {reason}"
-        )
-        
-        # Trigger notification callback
-        if self.on_validation_rejected:
+            logger.error(f"Failed to persist validation {validation_id}: {e}")
+        return False
+    
+    def _db_writer(self, max_batch: int = 50, max_wait_sec: float = 0.5):
+        """
+        Drain the validation request queue, persisting up to `max_batch` creates
+        (or whatever arrived within `max_wait_sec`) per transaction.
+        In-memory pending_validations stays authoritative for reads.
+        """
+        val_service = None
+        while True:
+            batch = [self._db_queue.get()]
+            deadline = time.monotonic() + max_wait_sec
+            while len(batch) < max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._db_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
             try:
-                self.on_validation_rejected(validation)
+                if val_service is None:
+                    # Own service/session: DB sessions must not be shared across threads
+                    from services.validation_service import ValidationService
+                    val_service = ValidationService()
+                val_service.apply_batch(batch)
             except Exception as e:
-                logger.error(f"Error in rejection notification callback: {e}")
-        
-        return True
+                logger.error(f"Failed to persist validation changes: {e}")
+            finally:
+                for _ in batch:
+                    self._db_queue.task_done()
+    
+    def flush(self):
+        """Block until every queued validation request has been persisted"""
+        self._db_queue.join()
     
     def check_alerts(self) -> List[Dict]:
         """
@@ -445,29 +795,31 @@ class TemporalDetectionEngine:
         Returns:
             List of validations requiring alerts
         """
-        alerts = []
-        current_time = datetime.now()
-        
-        for validation_id, validation in self.pending_validations.items():
-            if validation['status'] != 'pending':
-                continue
+        with self._lock:
+            alerts = []
+            current_time = self._now()
+            self._prune(current_time)
             
-            if validation['alert_sent_at'] is not None:
-                continue
+            for validation_id, validation in self.pending_validations.items():
+                if validation['status'] != 'pending':
+                    continue
             
-            # Check if alert delay has passed
-            time_since_creation = current_time - validation['created_at']
-            hours_elapsed = time_since_creation.total_seconds() / 3600
+                if validation['alert_sent_at'] is not None:
+                    continue
             
-            if hours_elapsed >= self.alert_delay_hours:
-                validation['alert_sent_at'] = current_time
-                alerts.append(validation)
-                logger.warning(
-                    f"Alert triggered for {validation_id}: "
-                    f"{validation['object_type']} pending validation for {hours_elapsed:.1f}h"
-                )
-        
-        return alerts
+                # Check if alert delay has passed
+                time_since_creation = current_time - validation['created_at']
+                hours_elapsed = time_since_creation.total_seconds() / 3600
+            
+                if hours_elapsed >= self.alert_delay_hours:
+                    validation['alert_sent_at'] = current_time
+                    alerts.append(validation)
+                    logger.warning(
+                        f"Alert triggered for {validation_id}: "
+                        f"{validation['object_type']} pending validation for {hours_elapsed:.1f}h"
+                    )
+            
+            return alerts
     
     def get_tracking_summary(self) -> Dict:
         """
@@ -476,28 +828,32 @@ class TemporalDetectionEngine:
         Returns:
             Summary dictionary
         """
-        summary = {
-            'total_trackings': len(self.active_trackings),
-            'by_status': defaultdict(int),
-            'by_object_type': defaultdict(int),
-            'pending_validations': len([v for v in self.pending_validations.values() if v['status'] == 'pending']),
-            'validated_stock': dict(self.validated_stock)
-        }
-        
-        for tracking in self.active_trackings.values():
-            summary['by_status'][tracking.status.value] += 1
-            summary['by_object_type'][tracking.object_type] += 1
-        
-        return summary
-
+        with self._lock:
+            summary = {
+                'total_trackings': len(self.active_trackings),
+                'by_status': defaultdict(int),
+                'by_object_type': defaultdict(int),
+                'pending_validations': len([v for v in self.pending_validations.values() if v['status'] == 'pending']),
+                'validated_stock': dict(self.validated_stock)
+            }
+            
+            for tracking in self.active_trackings.values():
+                summary['by_status'][tracking.status.value] += 1
+                summary['by_object_type'][tracking.object_type] += 1
+            
+            return summary
 
-# Singleton instance
-_temporal_engine = None
 
+# Singleton instance (lru_cache may run the factory twice on a concurrent
+# first call, and the engine starts a DB writer thread: explicit lock instead)
+_temporal_engine: Optional[TemporalDetectionEngine] = None
+_temporal_engine_lock = threading.Lock()
 
 def get_temporal_engine() -> TemporalDetectionEngine:
     """Get or create the global temporal detection engine"""
     global _temporal_engine
     if _temporal_engine is None:
-        _temporal_engine = TemporalDetectionEngine()
+        with _temporal_engine_lock:
+            if _temporal_engine is None:
+                _temporal_engine = TemporalDetectionEngine()
     return _temporal_engine
@@ -1,11 +1,19 @@
 """
 MediaPipe-Orchestrated Vision Pipeline for ASECNA Stock Management.
 Architecture: MediaPipe (Hands/Flow) -> YOLO (Detection) -> SAM2 (Segmentation) -> Interaction Logic
+
+Stages run concurrently: MediaPipe Hands on its own thread while YOLO runs,
+and validation requests (DB write + notifications) on a background thread,
+so neither stalls the next frame.
 """
 
 import cv2
 import numpy as np
+import itertools
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 from services.logger_service import logger
 
@@ -19,9 +27,18 @@ except ImportError:
     MP_AVAILABLE = False
 
 from config.settings import settings
-from ai.detector import ObjectDetector
+from ai.detector import ObjectDetector, BatchedDetectionScheduler, MODEL_FILES
 from ai.temporal_detection import get_temporal_engine
 
+# MediaPipe 21-point hand topology (landmark index pairs)
+HAND_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+)
+
 class VisionPipeline:
     """
     Orchestrator for the intelligent vision pipeline.
@@ -29,48 +46,53 @@ class VisionPipeline:
     """
     def __init__(self, camera_id: str, model_id: str = "yolov8n", segment: bool = False):
         self.camera_id = camera_id
-        self.detector = ObjectDetector(model_path=f"{model_id}.pt")
+        self.model_id = model_id
+        # Untracked detection is batched with the other cameras using this model
+        self.scheduler = get_batch_scheduler(model_id) if settings.BATCH_WINDOW_MS > 0 else None
+        if self.scheduler is not None:
+            self.scheduler.register()
+            self.detector = self.scheduler.detector
+        else:
+            self.detector = ObjectDetector(model_path=MODEL_FILES[model_id])
+        self._track_detector = None  # own model when tracking (tracker state is per stream)
+        self.segmentation_id = None  # SAM2 model set with set_segmenter()
         self.segment = segment
         self.temporal_engine = get_temporal_engine()
         
-        # MediaPipe initialization
+        # MediaPipe initialization (Task API, VIDEO mode: temporal smoothing across frames)
         self.mp_enabled = MP_AVAILABLE
         self.hand_landmarker = None
-        self.mp_hands = None
-        self.mp_draw = None
+        self._last_hands_ts_ms = 0
         
         if self.mp_enabled:
             try:
-                # Attempt to use the Task API first
                 base_options = python.BaseOptions(model_asset_path='ai/hand_landmarker.task')
                 options = vision.HandLandmarkerOptions(base_options=base_options,
+                                                       running_mode=vision.RunningMode.VIDEO,
                                                        num_hands=2)
                 self.hand_landmarker = vision.HandLandmarker.create_from_options(options)
                 logger.success(f"MediaPipe HandLandmarker (Task API) initialized for camera {self.camera_id}")
             except Exception as e:
-                logger.warning(f"Could not init MediaPipe HandLandmarker (Task API): {e}. Attempting legacy solution API.")
-                # Fallback to legacy solution API if Task API fails
-                try:
-                    if not hasattr(mp, 'solutions'):
-                        raise ImportError("MediaPipe solutions not found")
-                    
-                    self.mp_hands = mp.solutions.hands.Hands(
-                        static_image_mode=False,
-                        max_num_hands=2,
-                        min_detection_confidence=0.5
-                    )
-                    self.mp_draw = mp.solutions.drawing_utils
-                    self.hand_landmarker = "legacy" # Indicate using legacy API
-                    logger.success(f"MediaPipe Hands (Solution API) initialized for camera {self.camera_id}")
-                except Exception as e_legacy:
-                    logger.warning(f"Could not init MediaPipe Hands (Solution API): {e_legacy}. MediaPipe disabled for this pipeline.")
-                    self.mp_enabled = False
+                logger.warning(f"Could not init MediaPipe HandLandmarker (Task API): {e}. MediaPipe disabled for this pipeline.")
+                self.mp_enabled = False
             
+        self._rgb_buf = None  # reused BGR->RGB destination for MediaPipe
+        
+        # Pipeline stages (one thread each, so per-stage state is never shared)
+        self._hands_executor = None
+        if self.hand_landmarker is not None:
+            self._hands_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"hands-{camera_id}")
+        self._validation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"validation-{camera_id}")
+        self._temp_ids = itertools.count(1)  # ids for untracked boxes, unique per pipeline
         self.tracked_objects = {}  # {track_id: object_data}
         self.last_process_time = 0
         self.current_tracker = None
         
-    def process_frame(self, frame: np.ndarray, tracker_id: Optional[str] = None, segment: Optional[bool] = None) -> Tuple[np.ndarray, List[Dict], List[Dict]]:
+    def process_frame(self, frame: np.ndarray, tracker_id: Optional[str] = None, segment: Optional[bool] = None, render: bool = True) -> Tuple[Optional[np.ndarray], List[Dict], List[Dict]]:
+        """
+        Run the pipeline on one frame. With render=False (nobody is watching)
+        no annotated image is drawn and None is returned in its place.
+        """
         start_time = time.time()
         
         # Update flags if provided
@@ -80,78 +102,122 @@ class VisionPipeline:
         detections = []
         alerts = []
         hands_data = []
-        annotated_frame = frame.copy()
+        # Copied lazily: result.plot() already draws on its own copy
+        annotated_frame = frame if render else None
         
         # Sync segmenter/segment flag
         self.current_tracker = tracker_id
         
-        # 1. MediaPipe Hands Detection
-        if self.mp_enabled:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            if self.hand_landmarker == "legacy":
-                results_hands = self.mp_hands.process(rgb_frame)
-                if results_hands.multi_hand_landmarks:
-                    for hand_landmarks in results_hands.multi_hand_landmarks:
-                        # Draw landmarks
-                        mp.solutions.drawing_utils.draw_landmarks(
-                            annotated_frame, hand_landmarks, mp.solutions.hands.HAND_CONNECTIONS)
-                        
-                        # Store simple centroid for interaction logic
-                        h, w, c = frame.shape
-                        cx = int(hand_landmarks.landmark[9].x * w) # Middle finger MCP
-                        cy = int(hand_landmarks.landmark[9].y * h)
-                        hands_data.append({"id": "hand", "pos": (cx, cy)})
+        # 1. MediaPipe Hands Detection (runs alongside YOLO)
+        hands_future = self._hands_executor.submit(self._detect_hands, frame) if self._hands_executor else None
 
         # 2. YOLO Detection & 3. SAM2 Segmentation
-        results = self.detector.predict(
-            frame, 
-            conf=settings.CONFIDENCE_THRESHOLD, 
-            tracker=self.current_tracker,
-            segment=self.segment
-        )
+        if self.current_tracker:
+            detector = self._tracking_detector()
+            results = detector.predict(
+                frame, 
+                conf=settings.CONFIDENCE_THRESHOLD, 
+                tracker=self.current_tracker,
+                segment=self.segment,
+                source_ids=[self.camera_id]
+            )
+        elif self.scheduler is not None:
+            detector = self.detector
+            results = self.scheduler.predict(
+                frame,
+                source_id=self.camera_id,
+                conf=settings.CONFIDENCE_THRESHOLD,
+                segment=self.segment
+            )
+        else:
+            detector = self.detector
+            results = detector.predict(frame, conf=settings.CONFIDENCE_THRESHOLD, segment=self.segment,
+                                       source_ids=[self.camera_id])
         
         current_frame_ids = set()
         
+        if hands_future is not None:
+            hand_landmarks_list = hands_future.result()
+            if hand_landmarks_list:
+                if render:
+                    annotated_frame = frame.copy()
+                h, w = frame.shape[:2]
+                for hand_landmarks in hand_landmarks_list:
+                    points = [(int(lm.x * w), int(lm.y * h)) for lm in hand_landmarks]
+                    if render:
+                        # Draw landmarks
+                        for start, end in HAND_CONNECTIONS:
+                            cv2.line(annotated_frame, points[start], points[end], (0, 255, 0), 2)
+                        for point in points:
+                            cv2.circle(annotated_frame, point, 3, (0, 0, 255), -1)
+                    
+                    # Store simple centroid for interaction logic
+                    hands_data.append({"id": "hand", "pos": points[9]}) # Middle finger MCP
+        
         if results and len(results) > 0:
             result = results[0]
-            # Overlay YOLO results on top of MediaPipe drawings
-            annotated_frame = result.plot(img=annotated_frame)
+            if render:
+                # Overlay YOLO results on top of MediaPipe drawings
+                annotated_frame = result.plot(img=annotated_frame)
             
             if result.boxes:
-                for box in result.boxes:
-                    cls_id = int(box.cls[0])
-                    cls_name = self.detector.model.names[cls_id]
-                    conf = float(box.conf[0])
-                    xyxy = box.xyxy[0].tolist()
+                ts = datetime.now()  # one timestamp shared by every detection of this frame
+                boxes = result.boxes
+                xyxy_all = boxes.xyxy.cpu().numpy()
+                xyxy_list = xyxy_all.tolist()
+                cls_all = boxes.cls.int().cpu().tolist()
+                conf_all = boxes.conf.cpu().tolist()
+                ids_all = boxes.id.int().cpu().tolist() if boxes.is_track else None
+                
+                # Hand inside bbox, all (box, hand) pairs at once: shape (N, H)
+                hands_xy = np.array([hand["pos"] for hand in hands_data], dtype=np.float32).reshape(-1, 2)
+                hx, hy = hands_xy[:, 0], hands_xy[:, 1]
+                handling_mask = (
+                    (xyxy_all[:, None, 0] < hx) & (hx < xyxy_all[:, None, 2]) &
+                    (xyxy_all[:, None, 1] < hy) & (hy < xyxy_all[:, None, 3])
+                )
+                
+                # Bound once per frame (not at init: the model can be switched at runtime)
+                names = detector.model.names
+                process_detection = self.temporal_engine.process_detection
+                submit_validation = self._validation_executor.submit
+                create_validation_request = self.temporal_engine.create_validation_request
+                
+                for i in range(len(xyxy_all)):
+                    cls_name = names[cls_all[i]]
+                    conf = conf_all[i]
+                    xyxy = xyxy_list[i]
                     
                     # Unified ID
-                    track_id = str(int(box.id[0])) if box.is_track else f"temp_{int(time.time()*1000)}"
+                    track_id = str(ids_all[i]) if ids_all is not None else f"temp_{next(self._temp_ids)}"
                     current_frame_ids.add(track_id)
                     
                     # Logic: Interaction/Handling Detection
                     status = "stable"
-                    for hand in hands_data:
-                        hx, hy = hand["pos"]
-                        # Check if hand is inside bbox
-                        if xyxy[0] < hx < xyxy[2] and xyxy[1] < hy < xyxy[3]:
-                            status = "handling"
-                            # Draw interaction line
-                            cv2.line(annotated_frame, (hx, hy), (int((xyxy[0]+xyxy[2])/2), int((xyxy[1]+xyxy[3])/2)), (0, 0, 255), 2)
-                            cv2.putText(annotated_frame, "HANDLING", (int(xyxy[0]), int(xyxy[1])-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+                    if handling_mask[i].any():
+                        status = "handling"
+                        center = (int((xyxy[0]+xyxy[2])/2), int((xyxy[1]+xyxy[3])/2))
+                        for h in np.flatnonzero(handling_mask[i]):
+                            if render:
+                                hand_pos = hands_data[h]["pos"]
+                                # Draw interaction line
+                                cv2.line(annotated_frame, hand_pos, center, (0, 0, 255), 2)
+                                cv2.putText(annotated_frame, "HANDLING", (int(xyxy[0]), int(xyxy[1])-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
                             logger.info(f"Interaction détectée: Main sur {cls_name} ({track_id})")
 
                     # Update Temporal Engine
-                    temporal_status = self.temporal_engine.process_detection(
+                    temporal_status = process_detection(
                         object_type=cls_name,
                         camera_id=self.camera_id,
                         confidence=conf,
                         bbox_coords=tuple(xyxy),
+                        timestamp=ts,
                         tracking_id=track_id
                     )
                     
                     if temporal_status == "stable":
-                        self.temporal_engine.create_validation_request(cls_name, self.camera_id)
+                        # DB write + notifications off the frame path
+                        submit_validation(create_validation_request, cls_name, self.camera_id)
                     
                     detections.append({
                         "id": track_id,
@@ -167,11 +233,89 @@ class VisionPipeline:
         self.last_process_time = process_duration
         
         return annotated_frame, detections, alerts
+    
+    def set_model(self, model_id: str):
+        """Switch the detection model, from the next frame on"""
+        if model_id == self.model_id:
+            return
+        if model_id not in MODEL_FILES:
+            raise ValueError(f"Unknown detection model: {model_id}")
+        if self.scheduler is not None:
+            scheduler = get_batch_scheduler(model_id)
+            scheduler.register()
+            self.scheduler.unregister()
+            self.scheduler, self.detector = scheduler, scheduler.detector
+        else:
+            self.detector = ObjectDetector(model_path=MODEL_FILES[model_id])
+        self._track_detector = None  # rebuilt for the new model on demand
+        self.model_id = model_id
+
+    def set_segmenter(self, model_id: Optional[str]) -> bool:
+        """Load (or disable with None) the SAM2 model used when segmenting"""
+        if not self.detector.set_segmenter(model_id):
+            return False
+        if self._track_detector is not None and self._track_detector is not self.detector:
+            self._track_detector.set_segmenter(model_id)
+        self.segmentation_id = model_id
+        return True
+    
+    def _tracking_detector(self) -> ObjectDetector:
+        """Detector used with a tracker: the shared one can't hold per-camera track state"""
+        if self.scheduler is None:
+            return self.detector
+        if self._track_detector is None:
+            self._track_detector = ObjectDetector(model_path=MODEL_FILES[self.model_id])
+            if self.segmentation_id is not None:
+                self._track_detector.set_segmenter(self.segmentation_id)
+        return self._track_detector
+    
+    def _detect_hands(self, frame: np.ndarray):
+        """MediaPipe Hands stage (hands thread). Returns the landmarks of each hand found."""
+        if self._rgb_buf is None or self._rgb_buf.shape != frame.shape:
+            self._rgb_buf = np.empty_like(frame)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+        # SRGB mp.Image wraps the reused buffer
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=self._rgb_buf)
+        # VIDEO mode needs strictly increasing timestamps
+        ts_ms = max(time.monotonic_ns() // 1_000_000, self._last_hands_ts_ms + 1)
+        self._last_hands_ts_ms = ts_ms
+        return self.hand_landmarker.detect_for_video(mp_image, ts_ms).hand_landmarks
 
 # Factory for pipelines
 _pipelines = {}
+_pipelines_lock = threading.Lock()
+_batch_schedulers = {}
+_batch_schedulers_lock = threading.Lock()
+
+def get_batch_scheduler(model_id: str = "yolov8n") -> BatchedDetectionScheduler:
+    """One shared detector + batching scheduler per model"""
+    scheduler = _batch_schedulers.get(model_id)
+    if scheduler is None:
+        with _batch_schedulers_lock:
+            scheduler = _batch_schedulers.get(model_id)
+            if scheduler is None:
+                detector = ObjectDetector(model_path=MODEL_FILES[model_id])
+                scheduler = _batch_schedulers[model_id] = BatchedDetectionScheduler(detector)
+    return scheduler
 
 def get_vision_pipeline(camera_id: str, model_id: str = "yolov8n", segment: bool = False) -> VisionPipeline:
-    if camera_id not in _pipelines:
-        _pipelines[camera_id] = VisionPipeline(camera_id, model_id, segment)
-    return _pipelines[camera_id]
+    # Keyed on camera only (not lru_cache): later model/segment args must not create a second pipeline
+    pipeline = _pipelines.get(camera_id)
+    if pipeline is None:
+        with _pipelines_lock:
+            pipeline = _pipelines.get(camera_id)
+            if pipeline is None:
+                pipeline = _pipelines[camera_id] = VisionPipeline(camera_id, model_id, segment)
+    return pipeline
+
+def release_vision_pipeline(camera_id: str):
+    """Drop a removed camera's pipeline and its slot in the batch scheduler"""
+    with _pipelines_lock:
+        pipeline = _pipelines.pop(camera_id, None)
+    if pipeline is None:
+        return
+    if pipeline.scheduler is not None:
+        pipeline.scheduler.unregister()
+    if pipeline._hands_executor is not None:
+        pipeline._hands_executor.shutdown(wait=False)
+    pipeline._validation_executor.shutdown(wait=False)
@@ -1,5 +1,4 @@
 import sys
-import torch_init  # Configure PyTorch avant tout
 import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from app.ui.main_window import MainWindow
@@ -1,11 +1,10 @@
 from PyQt6.QtWidgets import QWidget, QLabel, QVBoxLayout
 from PyQt6.QtCore import pyqtSignal, pyqtSlot, Qt, QTimer
-from PyQt6.QtGui import QImage, QPixmap, QPainter, QColor
+from PyQt6.QtGui import QImage, QPixmap
 import multiprocessing
 import queue
-import cv2
-import numpy as np
 from workers.video_worker import VideoWorker
+from workers.inference_worker import get_inference_worker
 from services.logger_service import logger
 
 class CameraWidget(QWidget):
@@ -18,6 +17,7 @@ class CameraWidget(QWidget):
         super().__init__(parent)
         self.source = source
         self.worker = None
+        self.inference = None  # this camera's InferenceClient (shared inference process)
         self.result_queue = multiprocessing.Queue(maxsize=3)
         self.display_timer = QTimer()
         self.display_timer.timeout.connect(self.update_frame)
@@ -38,7 +38,10 @@ class CameraWidget(QWidget):
             return
             
         logger.info(f"Starting camera widget for source {self.source}")
-        self.worker = VideoWorker(self.source, self.result_queue)
+        self.inference = get_inference_worker().connect(str(self.source))
+        self.worker = VideoWorker(self.source, self.result_queue, self.inference)
+        self._sync_display_size()
+        self.worker.render.value = self.isVisible()
         self.worker.start()
         self.display_timer.start(30) # Check for frames every 30ms
         self.running = True
@@ -50,47 +53,78 @@ class CameraWidget(QWidget):
         if self.worker:
             self.worker.terminate() # Using terminate for speed in this context, use stop() properly in prod
             self.worker.join()
+            self.worker.release_frames()
+        if self.inference:
+            self.inference.close()
+            self.inference = None
         
         self.display_timer.stop()
         self.running = False
         self.image_label.setText("Camera Stopped")
         
+    def _sync_display_size(self):
+        """Tell the worker the label size so it can pre-scale frames"""
+        if self.worker:
+            size = self.image_label.size()
+            self.worker.display_size[0] = size.width()
+            self.worker.display_size[1] = size.height()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._sync_display_size()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.worker:
+            self.worker.render.value = True
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        if self.worker:
+            self.worker.render.value = False
+
     @pyqtSlot()
     def update_frame(self):
-        try:
-            # Get latest frame (non-blocking)
-            frame_data = self.result_queue.get_nowait()
-            frame, detections, alerts = frame_data
-            
+        # Drain the queue: only the newest frame is displayed, but no alert is lost
+        latest_frame = None
+        alerts = []
+        while True:
+            try:
+                frame, detections, frame_alerts = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
             if frame is not None:
-                self.display_image(frame)
-            
-            if alerts:
-                self.alert_signal.emit(alerts)
-                
-        except queue.Empty:
-            pass
+                latest_frame = frame
+            alerts.extend(frame_alerts)
+        
+        if latest_frame is not None:
+            self.display_image(latest_frame)
+        
+        if alerts:
+            self.alert_signal.emit(alerts)
 
     def display_image(self, frame):
         """
-        Convert CV2 frame to QPixmap and display.
+        Display a frame prepared by the worker: (slot, w, h, seq) of its
+        shared frame ring, already RGB and scaled to the label size.
         """
-        # Convert BGR to RGB
-        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        
-        qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-        
-        # Scale to fit label (keeping aspect ratio)
+        slot, w, h, seq = frame
+        rgb_bytes = self.worker.frame_bytes(slot, w, h, seq)
+        if rgb_bytes is None:
+            return  # overwritten while copying: keep the previous image
+        qt_image = QImage(rgb_bytes, w, h, 3 * w, QImage.Format.Format_RGB888)
         pixmap = QPixmap.fromImage(qt_image)
-        scaled_pixmap = pixmap.scaled(
-            self.image_label.size(),
-            Qt.AspectRatioMode.KeepAspectRatio,
-            Qt.TransformationMode.SmoothTransformation
-        )
         
-        self.image_label.setPixmap(scaled_pixmap)
+        # Label resized since the worker scaled this frame: cheap rescale
+        label_size = self.image_label.size()
+        if w > label_size.width() or h > label_size.height():
+            pixmap = pixmap.scaled(
+                label_size,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.FastTransformation
+            )
+        
+        self.image_label.setPixmap(pixmap)
 
     def closeEvent(self, event):
         self.stop_camera()
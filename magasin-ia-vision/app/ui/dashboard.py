@@ -1,8 +1,12 @@
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QListWidget, QPushButton, QMessageBox
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal, pyqtSlot
 import datetime
 import os
 from services.statistics_service import StatisticsService
+from services.stats_cache import StatsCache
+from data.database import session_scope
+from config.settings import settings
+from services.logger_service import logger
 
 class KPICard(QFrame):
     def __init__(self, title, value, color="#3498db"):
@@ -20,11 +24,61 @@ class KPICard(QFrame):
         layout.addWidget(self.value_label, alignment=Qt.AlignmentFlag.AlignCenter)
         self.setLayout(layout)
 
+class ExportWorker(QObject):
+    """
+    Runs the CSV export in a QThread, with its own DB session
+    (the dashboard session belongs to the GUI thread).
+    """
+    finished = pyqtSignal(bool, str)  # success, path
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    @pyqtSlot()
+    def run(self):
+        with session_scope() as db:
+            success = StatisticsService(db).export_movements_csv(self.path)
+        self.finished.emit(success, self.path)
+
+class StatsWorker(QObject):
+    """
+    Recomputes the dashboard KPIs into the stats cache in a QThread.
+    """
+    finished = pyqtSignal(dict)  # {cache key: value}
+
+    @pyqtSlot()
+    def run(self):
+        kpis = {}
+        try:
+            with session_scope() as db:
+                kpis = StatisticsService(db).precompute_all()
+        except Exception as e:
+            logger.error(f"KPI precompute failed: {e}")
+        self.finished.emit(kpis)
+
 class DashboardView(QWidget):
+    MAX_ALERT_ROWS = 500
+    KPI_KEYS = ["kpi:total_equipment", "kpi:missing", "kpi:movements_today"]
+
     def __init__(self):
         super().__init__()
         self.stats_service = StatisticsService()
         
+        # Debounce: a burst of alerts triggers a single KPI refresh
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(500)
+        self.refresh_timer.timeout.connect(self.refresh_stats)
+        
+        # KPIs are precomputed in the background; refresh_stats only reads the cache
+        self.stats_cache = StatsCache(self.stats_service.db)
+        self.stats_thread = None
+        self.precompute_timer = QTimer(self)
+        self.precompute_timer.setInterval(settings.STATS_PRECOMPUTE_INTERVAL_SEC * 1000)
+        self.precompute_timer.timeout.connect(self.schedule_precompute)
+        self.precompute_timer.start()
+        
         layout = QVBoxLayout()
         
         # Header
@@ -33,9 +87,10 @@ class DashboardView(QWidget):
         header.setStyleSheet("font-size: 24px; font-weight: bold;")
         header_layout.addWidget(header)
         
-        export_btn = QPushButton("Exporter Rapport CSV")
-        export_btn.clicked.connect(self.export_report)
-        header_layout.addWidget(export_btn, alignment=Qt.AlignmentFlag.AlignRight)
+        self.export_btn = QPushButton("Exporter Rapport CSV")
+        self.export_btn.clicked.connect(self.export_report)
+        header_layout.addWidget(self.export_btn, alignment=Qt.AlignmentFlag.AlignRight)
+        self.export_thread = None
         
         layout.addLayout(header_layout)
         layout.addSpacing(20)
@@ -64,35 +119,97 @@ class DashboardView(QWidget):
         
         layout.addStretch()
         self.setLayout(layout)
+        
+        self.refresh_stats()
 
     def add_alert(self, alert_data):
         """
         Add an alert to the list and update KPI.
         """
-        # Deduplicate: Don't add if the last alert is identical and recent (< 5s)
-        # For simplicity, just add
-        item_text = f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {alert_data['type']}: {alert_data['message']}"
-        self.alert_list.insertItem(0, item_text)
+        self.add_alerts([alert_data])
+
+    def add_alerts(self, alerts):
+        """
+        Add a batch of alerts (newest on top) with one insert and one KPI refresh.
+        """
+        if not alerts:
+            return
+        now = datetime.datetime.now().strftime('%H:%M:%S')
+        texts = [f"[{now}] {a['type']}: {a['message']}" for a in reversed(alerts)]
+        self.alert_list.insertItems(0, texts)
         
-        self.refresh_stats()
+        # Bounded list: drop the oldest rows
+        while self.alert_list.count() > self.MAX_ALERT_ROWS:
+            self.alert_list.takeItem(self.alert_list.count() - 1)
+        
+        self.refresh_timer.start()  # (re)start: coalesces bursts of add_alerts
 
     def refresh_stats(self):
-        # Update Alert KPI
-        # In real app, query DB count of unacknowledged alerts
+        # Update Alert KPI (live list, no DB access)
         current_alerts = self.alert_list.count()
         self.alert_kpi.value_label.setText(str(current_alerts))
         
-        # Update Movement KPI (Using Stats Service)
-        moves = self.stats_service.get_todays_movements_count()
-        self.use_kpi.value_label.setText(str(moves)) # Reusing 'En Utilisation' card for 'Mouvements Jour' for demo, or create new card
-        self.use_kpi.title_label.setText("Mouvements Jour")
-        
+        # Other KPIs come from the precomputed cache; a stale cache is
+        # shown as is while a background recompute is scheduled
+        kpis, updated_at = self.stats_cache.get_many(self.KPI_KEYS)
+        self.stats_service.db.commit()  # end the read transaction, don't hold a snapshot between refreshes
+        self.show_kpis(kpis)
+        if not StatsCache.is_fresh(updated_at, settings.STATS_MAX_AGE_SEC):
+            self.schedule_precompute()
+
+    def show_kpis(self, kpis):
+        if "kpi:total_equipment" in kpis:
+            self.stock_kpi.value_label.setText(str(kpis["kpi:total_equipment"]))
+        if "kpi:missing" in kpis:
+            self.missing_kpi.value_label.setText(str(kpis["kpi:missing"]))
+        if "kpi:movements_today" in kpis:
+            self.use_kpi.value_label.setText(str(kpis["kpi:movements_today"])) # Reusing 'En Utilisation' card for 'Mouvements Jour' for demo, or create new card
+            self.use_kpi.title_label.setText("Mouvements Jour")
+
+    def schedule_precompute(self):
+        if self.stats_thread is not None:
+            return  # already running
+        self.stats_thread = QThread(self)
+        self.stats_worker = StatsWorker()
+        self.stats_worker.moveToThread(self.stats_thread)
+        self.stats_thread.started.connect(self.stats_worker.run)
+        self.stats_worker.finished.connect(self.on_precompute_finished)
+        self.stats_worker.finished.connect(self.stats_thread.quit)
+        self.stats_thread.finished.connect(self.stats_worker.deleteLater)
+        self.stats_thread.finished.connect(self.stats_thread.deleteLater)
+        self.stats_thread.start()
+
+    @pyqtSlot(dict)
+    def on_precompute_finished(self, kpis):
+        self.stats_thread = None
+        self.stats_worker = None
+        self.show_kpis(kpis)
+
     def export_report(self):
+        if self.export_thread is not None:
+            return
         filename = f"rapport_mouvements_{datetime.date.today()}.csv"
         path = os.path.join(os.getcwd(), "exports", filename)
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
-        if self.stats_service.export_movements_csv(path):
+        # Export in a worker thread: the window stays responsive on large histories
+        self.export_btn.setEnabled(False)
+        self.export_thread = QThread(self)
+        self.export_worker = ExportWorker(path)
+        self.export_worker.moveToThread(self.export_thread)
+        self.export_thread.started.connect(self.export_worker.run)
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_worker.finished.connect(self.export_thread.quit)
+        self.export_thread.finished.connect(self.export_worker.deleteLater)
+        self.export_thread.finished.connect(self.export_thread.deleteLater)
+        self.export_thread.start()
+
+    @pyqtSlot(bool, str)
+    def on_export_finished(self, success, path):
+        self.export_thread = None
+        self.export_worker = None
+        self.export_btn.setEnabled(True)
+        if success:
             QMessageBox.information(self, "Export Réussi", f"Rapport sauvegardé:\n{path}")
         else:
             QMessageBox.critical(self, "Erreur Export", "Impossible de créer le fichier.")
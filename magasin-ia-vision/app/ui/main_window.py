@@ -1,10 +1,9 @@
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QStatusBar, QTabWidget
-from PyQt6.QtCore import Qt
-from app.ui.camera_view import CameraWidget
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QShortcut, QKeySequence
 from app.ui.dashboard import DashboardView
 from app.ui.stock_view import StockView
 from config.settings import settings
-from services.alert_service import AlertService
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -27,8 +26,9 @@ class MainWindow(QMainWindow):
         self.surveillance_tab = QWidget()
         self.surveillance_layout = QHBoxLayout(self.surveillance_tab)
         
-        self.camera_view = CameraWidget(source=0)
-        self.surveillance_layout.addWidget(self.camera_view, stretch=3)
+        # The camera stack (OpenCV, YOLO, worker process) is only imported
+        # and built when the Surveillance tab is first opened
+        self.camera_view = None
         
         self.controls_panel = QVBoxLayout()
         self.start_btn = QPushButton("Démarrer Caméra")
@@ -59,31 +59,76 @@ class MainWindow(QMainWindow):
         self.status_bar.showMessage("Prêt")
         
         # Connect Signals
-        self.camera_view.alert_signal.connect(self.handle_alert)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        
+        # Dev: dump the slowest SQL statements (DB_PROFILE=True)
+        if settings.DB_PROFILE:
+            QShortcut(QKeySequence("Ctrl+Shift+Q"), self).activated.connect(self.dump_slow_queries)
+
+        # Services (created on first alert)
+        self.alert_service = None
+        
+        # Alerts arriving within 100 ms are handled in a single pass
+        self._pending_alerts = []
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(100)
+        self._flush_timer.timeout.connect(self._flush_alerts)
 
-        # Services
-        self.alert_service = AlertService()
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.surveillance_tab:
+            self.ensure_camera_view()
+
+    def ensure_camera_view(self):
+        if self.camera_view is None:
+            from app.ui.camera_view import CameraWidget
+            self.camera_view = CameraWidget(source=0)
+            self.camera_view.alert_signal.connect(self.handle_alert)
+            self.surveillance_layout.insertWidget(0, self.camera_view, stretch=3)
+        return self.camera_view
 
     def handle_alert(self, alerts):
         """
-        Process alerts received from the camera worker.
+        Process alerts received from the camera worker (buffered, see _flush_alerts).
         """
-        for alert_data in alerts:
-            # Persist
-            self.alert_service.create_alert(alert_data['type'], alert_data['message'])
-            # Update UI
-            self.dashboard_view.add_alert(alert_data)
-            # Notify in status bar
-            self.status_bar.showMessage(f"ALERTE: {alert_data['message']}", 5000)
+        if not alerts:
+            return
+        self._pending_alerts.extend(alerts)
+        # Throttle, not debounce: a continuous alert stream still flushes every 100 ms
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _flush_alerts(self):
+        alerts, self._pending_alerts = self._pending_alerts, []
+        if not alerts:
+            return
+        # Persist (one transaction for the batch)
+        if self.alert_service is None:
+            from services.alert_service import AlertService
+            self.alert_service = AlertService()
+        self.alert_service.create_alerts(alerts)
+        # Update UI
+        self.dashboard_view.add_alerts(alerts)
+        # Notify in status bar (latest alert)
+        self.status_bar.showMessage(f"ALERTE: {alerts[-1]['message']}", 5000)
+
+    def dump_slow_queries(self):
+        from data.database import query_profiler
+        query_profiler.dump()
+        self.status_bar.showMessage("Requêtes SQL les plus lentes écrites dans le journal", 5000)
 
     def start_camera(self):
-        self.camera_view.start_camera()
+        self.ensure_camera_view().start_camera()
         self.status_bar.showMessage("Caméra démarrée")
 
     def stop_camera(self):
-        self.camera_view.stop_camera()
+        if self.camera_view:
+            self.camera_view.stop_camera()
         self.status_bar.showMessage("Caméra arrêtée")
 
     def closeEvent(self, event):
-        self.camera_view.stop_camera()
+        if self.camera_view:
+            self.camera_view.stop_camera()
+        self._flush_timer.stop()
+        self._flush_alerts()  # persist alerts still buffered
         event.accept()
@@ -1,19 +1,112 @@
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, 
+    QWidget, QVBoxLayout, QHBoxLayout, QTableView, QStyledItemDelegate, QStyle, QAbstractItemView,
     QPushButton, QLabel, QHeaderView, QLineEdit, QComboBox, QMessageBox, QFormLayout
 )
-from PyQt6.QtCore import Qt
-from data.database import get_db
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, pyqtSignal
+from PyQt6.QtGui import QColor
+from data.database import SessionLocal
 from data.repositories.equipment_repo import EquipmentRepository
 from data.models import EquipmentStatus
 
+class EquipmentTableModel(QAbstractTableModel):
+    """
+    Read-only table model over (id, unique_ref, type_name, status) rows.
+    The view only asks for the visible cells: no per-row widget or item.
+    """
+    HEADERS = ["ID", "Référence", "Type", "Statut", "Actions"]
+    ACTION_COLUMN = 4
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self._row_of = {}  # item id -> row
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = list(rows)
+        self._row_of = {row[0]: i for i, row in enumerate(self.rows)}
+        self.endResetModel()
+
+    def append_row(self, row):
+        position = len(self.rows)
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.append(tuple(row))
+        self._row_of[row[0]] = position
+        self.endInsertRows()
+
+    def update_status(self, item_id, status):
+        """Update one item in place: only its Statut/Actions cells are repainted."""
+        row = self._row_of.get(item_id)
+        if row is None:
+            return False
+        _, unique_ref, type_name, _ = self.rows[row]
+        self.rows[row] = (item_id, unique_ref, type_name, status)
+        self.dataChanged.emit(self.index(row, 3), self.index(row, self.ACTION_COLUMN))
+        return True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        item_id, unique_ref, type_name, status = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(item_id)
+        if column == 1:
+            return unique_ref
+        if column == 2:
+            return type_name or "N/A"
+        if column == 3:
+            return status.value
+        return "Sortir" if status == EquipmentStatus.IN_STOCK else "Retour"
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+
+class ActionButtonDelegate(QStyledItemDelegate):
+    """
+    Paints the "Sortir" / "Retour" button of the Actions column and reports
+    clicks, instead of one QPushButton widget per row.
+    """
+    clicked = pyqtSignal(int)  # row
+
+    COLORS = {"Sortir": QColor("#f39c12"), "Retour": QColor("#2ecc71")}
+
+    def paint(self, painter, option, index):
+        text = index.data()
+        rect = option.rect.adjusted(2, 2, -2, -2)
+        painter.save()
+        painter.setRenderHint(painter.RenderHint.Antialiasing)
+        color = self.COLORS.get(text, QColor("#7f8c8d"))
+        if option.state & QStyle.StateFlag.State_MouseOver:
+            color = color.darker(110)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(color)
+        painter.drawRoundedRect(rect, 3, 3)
+        painter.setPen(QColor("white"))
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text)
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease and option.rect.contains(event.position().toPoint()):
+            self.clicked.emit(index.row())
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
 class StockView(QWidget):
     def __init__(self):
         super().__init__()
-        # Database session management manually or via dependency injection in a real app
-        # Here we open a session for the widget's lifecycle for simplicity
-        self.db_gen = get_db()
-        self.db = next(self.db_gen)
+        # GUI thread session, shared with the other widgets (scoped_session registry)
+        self.db = SessionLocal()
         self.repo = EquipmentRepository(self.db)
         
         self.init_ui()
@@ -47,11 +140,22 @@ class StockView(QWidget):
         
         layout.addLayout(form_layout)
 
-        # Table
-        self.table = QTableWidget()
-        self.table.setColumnCount(5) # + Actions
-        self.table.setHorizontalHeaderLabels(["ID", "Référence", "Type", "Statut", "Actions"])
+        # Table (model/view: only visible rows are materialized)
+        self.model = EquipmentTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setMouseTracking(True)
+        self.table.verticalHeader().setVisible(False)
+        # Fixed row height: no per-row sizeHint queries when scrolling/resetting
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(28)
+        self.table.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.table.setHorizontalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.table.setAlternatingRowColors(False)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.action_delegate = ActionButtonDelegate(self.table)
+        self.action_delegate.clicked.connect(self.on_action_clicked)
+        self.table.setItemDelegateForColumn(EquipmentTableModel.ACTION_COLUMN, self.action_delegate)
         layout.addWidget(self.table)
         
         # Refresh Button
@@ -76,37 +180,21 @@ class StockView(QWidget):
             self.type_combo.addItem(t.name, t.id)
 
     def load_data(self):
-        self.table.setRowCount(0)
-        items = self.repo.get_all_items()
-        
-        for row, item in enumerate(items):
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(str(item.id)))
-            self.table.setItem(row, 1, QTableWidgetItem(item.unique_ref))
-            self.table.setItem(row, 2, QTableWidgetItem(item.equipment_type.name if item.equipment_type else "N/A"))
-            self.table.setItem(row, 3, QTableWidgetItem(item.status.value))
-            
-            # Actions
-            action_widget = QWidget()
-            action_layout = QHBoxLayout()
-            action_layout.setContentsMargins(2, 2, 2, 2)
-            
-            if item.status == EquipmentStatus.IN_STOCK:
-                btn = QPushButton("Sortir")
-                btn.clicked.connect(lambda checked, i=item.id: self.change_status(i, EquipmentStatus.IN_USE))
-                btn.setStyleSheet("background-color: #f39c12; color: white;")
-            else:
-                btn = QPushButton("Retour")
-                btn.clicked.connect(lambda checked, i=item.id: self.change_status(i, EquipmentStatus.IN_STOCK))
-                btn.setStyleSheet("background-color: #2ecc71; color: white;")
-                
-            action_layout.addWidget(btn)
-            action_widget.setLayout(action_layout)
-            self.table.setCellWidget(row, 4, action_widget)
+        self.model.set_rows(self.repo.get_all_items_for_listing())
+        self.db.commit()  # end the read transaction: the shared session stays idle between loads
+
+    def on_action_clicked(self, row):
+        item_id, _, _, status = self.model.rows[row]
+        if status == EquipmentStatus.IN_STOCK:
+            self.change_status(item_id, EquipmentStatus.IN_USE)
+        else:
+            self.change_status(item_id, EquipmentStatus.IN_STOCK)
 
     def change_status(self, item_id, new_status):
-        self.repo.update_item_status(item_id, new_status)
-        self.load_data()
+        item = self.repo.update_item_status(item_id, new_status)
+        # Patch the model row instead of reloading the whole table
+        if item is None or not self.model.update_status(item_id, new_status):
+            self.load_data()
 
 
     def add_item(self):
@@ -118,13 +206,14 @@ class StockView(QWidget):
             return
             
         try:
-            self.repo.create_item(ref, type_id)
+            item = self.repo.create_item(ref, type_id)
             self.ref_input.clear()
-            self.load_data()
+            # Append the created row (ORM object already returned) instead of reloading
+            self.model.append_row((item.id, item.unique_ref, self.type_combo.currentText() or "N/A", item.status))
             QMessageBox.information(self, "Succès", "Équipement ajouté.")
         except Exception as e:
             QMessageBox.critical(self, "Erreur", f"Erreur lors de l'ajout: {str(e)}")
 
     def closeEvent(self, event):
-        self.db.close()
+        SessionLocal.remove()
         event.accept()
@@ -15,15 +15,45 @@ class Settings:
     # Database
     DB_NAME = os.getenv("DB_NAME", "magasin_ia.sqlite")
     DB_URL = f"sqlite:///{DATA_DIR}/{DB_NAME}"  # Default to SQLite for ease of dev
+    DB_ECHO = os.getenv("DB_ECHO", "False").lower() == "true"  # Log every SQL statement (slow)
+    DB_PROFILE = os.getenv("DB_PROFILE", "False").lower() == "true"  # Slow query log (Ctrl+Shift+Q dumps it in the app)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", 1800))  # Reopen pooled connections older than this (server-side idle timeouts)
+    DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", 1200))  # Compiled SQL statements kept by the engine
+    SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", 64))
+    SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", 256))
 
     # Camera / Video
     RTSP_URLS = os.getenv("RTSP_URLS", "").split(",")
     SAVE_VIDEO_CLIPS = os.getenv("SAVE_VIDEO_CLIPS", "True").lower() == "true"
+    VIDEO_HW_DECODE = os.getenv("VIDEO_HW_DECODE", "none").lower()  # "vaapi", "nvdec" or "none": GStreamer decode of H.264 RTSP streams
+    CAPTURE_CPU_AFFINITY = os.getenv("CAPTURE_CPU_AFFINITY", "True").lower() == "true"  # Linux: pin each stream's capture thread to one core
 
     # AI Configuration
     YOLO_MODEL_PATH = MODELS_DIR / "yolov8n.pt"  # Placeholder
     CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", 0.25))
+    INFERENCE_IMGSZ = int(os.getenv("INFERENCE_IMGSZ", 640))
+    INFERENCE_MAX_BATCH = int(os.getenv("INFERENCE_MAX_BATCH", 8))  # Frames per batched predict
+    TORCHSCRIPT_EXPORT = os.getenv("TORCHSCRIPT_EXPORT", "True").lower() == "true"
+    TENSORRT_EXPORT = os.getenv("TENSORRT_EXPORT", "True").lower() == "true"  # CUDA + tensorrt only
+    INFERENCE_PRECISION = os.getenv("INFERENCE_PRECISION", "fp16")  # "fp16", "fp32" or "int8" (GPU)
+    USE_OPENCL = os.getenv("USE_OPENCL", "False").lower() == "true"  # cv2.UMat drawing path
+    MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", 3))  # Loaded models kept per detector
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", 1))  # Inference threads (CPU only, CUDA always uses 1)
+    TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", 0))  # 0 = physical cores // inference workers
+    BATCH_WINDOW_MS = int(os.getenv("BATCH_WINDOW_MS", 33))  # Cross-camera batching window, 0 = per-camera inference
     
+    # Dashboard
+    STATS_CACHE_TTL_SEC = float(os.getenv("STATS_CACHE_TTL_SEC", 30))  # KPI aggregates reuse window, 0 = no cache
+    STATS_PRECOMPUTE_INTERVAL_SEC = int(os.getenv("STATS_PRECOMPUTE_INTERVAL_SEC", 3600))  # Background KPI precompute
+    STATS_MAX_AGE_SEC = int(os.getenv("STATS_MAX_AGE_SEC", 300))  # Older precomputed KPIs trigger a recompute
+
+    # API Server (python server.py)
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+    SERVER_RELOAD = os.getenv("SERVER_RELOAD", "False").lower() == "true"  # Dev only: restart on code change
+
     # App Settings
     APP_NAME = "Magasin IA Vision"
     DEBUG = os.getenv("DEBUG", "True").lower() == "true"
@@ -1,27 +1,93 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session, declarative_base
 from config.settings import settings
 
+IS_SQLITE = settings.DB_URL.startswith("sqlite")
+
 # Create engine
 engine = create_engine(
     settings.DB_URL,
-    echo=settings.DEBUG,  # Log SQL queries in debug mode
-    pool_pre_ping=True
+    echo=settings.DB_ECHO,  # SQL logging is opt-in: it goes through the logger for every statement
+    pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+    # LRU of compiled statements (SQLAlchemy default 500): hot queries are never recompiled
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    # Sessions are used from worker threads (validation writer, export...)
+    connect_args={"check_same_thread": False} if IS_SQLITE else {}
 )
 
-# Create thread-safe session factory
-SessionLocal = scoped_session(
-    sessionmaker(autocommit=False, autoflush=False, bind=engine)
-)
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """
+        WAL: readers (UI, API) no longer block on the writers and commits
+        append to the log instead of rewriting pages; with synchronous=NORMAL
+        a commit no longer fsyncs (durable at checkpoint, never corrupted).
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_MB * 1024}")  # negative = KiB
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_MB * 1024 * 1024}")
+        cursor.close()
+
+# Opt-in slow query log, instead of echoing every statement
+query_profiler = None
+if settings.DB_PROFILE:
+    from data.query_profiler import QueryProfiler
+    query_profiler = QueryProfiler()
+    query_profiler.install(engine)
+
+SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Create thread-safe session factory (one shared session per thread)
+SessionLocal = scoped_session(SessionFactory)
 
 Base = declarative_base()
 
+def upsert_insert(dialect_name: str):
+    """
+    The dialect's insert() construct, which supports ON CONFLICT DO UPDATE
+    (PostgreSQL, SQLite), or None for other backends.
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
 def get_db():
     """
-    Dependency generator for database sessions.
+    Dependency generator for database sessions: one fresh session per
+    request (FastAPI Depends), closed at teardown. Not the thread-local
+    SessionLocal, which concurrent requests handled by the same
+    threadpool thread would otherwise share.
+    """
+    db = SessionFactory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@contextmanager
+def session_scope():
+    """
+    Transactional scope for one short unit of work, on its own session
+    (not the thread's shared one): commit on success, rollback on error,
+    always closed.
     """
-    db = SessionLocal()
+    db = SessionFactory()
     try:
         yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
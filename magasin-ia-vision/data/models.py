@@ -1,9 +1,44 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, Float, JSON, LargeBinary
+from sqlalchemy import Index, Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, Float, JSON, LargeBinary
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 import enum
+import json
+import struct
 from data.database import Base
 
+class PackedBBox(TypeDecorator):
+    """
+    Bounding box(es) stored as packed little-endian float32 instead of JSON:
+    one (x1, y1, x2, y2) box = 16 bytes; a list of boxes = int32 count + 16 bytes per box.
+    Rows written as JSON by older versions are still decoded.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    _BOX = struct.Struct('<4f')
+    _COUNT = struct.Struct('<i')
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if len(value) and not isinstance(value[0], (list, tuple)):
+            return self._BOX.pack(*value)
+        flat = [c for box in value for c in box]
+        return self._COUNT.pack(len(value)) + struct.pack(f'<{len(flat)}f', *flat)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):  # legacy JSON row
+            return json.loads(value)
+        value = bytes(value)
+        if len(value) == self._BOX.size:
+            return self._BOX.unpack(value)
+        n = self._COUNT.unpack_from(value)[0]
+        flat = struct.unpack_from(f'<{4 * n}f', value, self._COUNT.size)
+        return [flat[i:i + 4] for i in range(0, 4 * n, 4)]
+
 class UserRole(enum.Enum):
     ADMIN = "admin"
     OPERATOR = "operator"
@@ -58,8 +93,8 @@ class EquipmentItem(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     unique_ref = Column(String, unique=True, index=True, nullable=False)  # Serial number or QR code
-    type_id = Column(Integer, ForeignKey("equipment_types.id"))
-    status = Column(Enum(EquipmentStatus), default=EquipmentStatus.IN_STOCK)
+    type_id = Column(Integer, ForeignKey("equipment_types.id"), index=True)
+    status = Column(Enum(EquipmentStatus), default=EquipmentStatus.IN_STOCK)  # indexed by ix_items_status_type
     current_zone_id = Column(Integer, ForeignKey("zones.id"), nullable=True)
     last_seen_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -72,14 +107,19 @@ class EquipmentItem(Base):
     equipment_type = relationship("EquipmentType", back_populates="items")
     current_zone = relationship("Zone")
 
+    __table_args__ = (
+        # Stock listings/KPIs: filter by status, group or join by type
+        Index("ix_items_status_type", "status", "type_id"),
+    )
+
 class MovementHistory(Base):
     __tablename__ = "movement_history"
 
     id = Column(Integer, primary_key=True, index=True)
-    item_id = Column(Integer, ForeignKey("equipment_items.id"))
+    item_id = Column(Integer, ForeignKey("equipment_items.id"), index=True)  # top-used aggregation
     from_zone_id = Column(Integer, ForeignKey("zones.id"), nullable=True)
     to_zone_id = Column(Integer, ForeignKey("zones.id"), nullable=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     video_clip_path = Column(String, nullable=True)  # Path to clip evidence
     
     item = relationship("EquipmentItem")
@@ -90,8 +130,8 @@ class Alert(Base):
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, nullable=False)  # MISSING_ITEM, UNAUTHORIZED_MOVEMENT
     message = Column(Text, nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    is_acknowledged = Column(Boolean, default=False)
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    is_acknowledged = Column(Boolean, default=False, index=True)
 
 # NEW TABLES FOR ASECNA SYSTEM
 
@@ -172,7 +212,7 @@ class DetectionEvent(Base):
     camera_id = Column(String, nullable=False, index=True)
     confidence = Column(Float, nullable=False)
     detected_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
-    bbox_coords = Column(JSON, nullable=True)
+    bbox_coords = Column(PackedBBox, nullable=True)  # (x1, y1, x2, y2) as 4 x float32
     tracking_id = Column(String, nullable=True)
     temporal_tracking_id = Column(Integer, ForeignKey("temporal_trackings.id"), nullable=True)
 
@@ -211,3 +251,11 @@ class AdminConfig(Base):
     updated_by = Column(Integer, ForeignKey("users.id"), nullable=True)
 
     updater = relationship("User")
+
+class KVCache(Base):
+    """Precomputed values (dashboard KPIs...) keyed by name, JSON encoded"""
+    __tablename__ = "kv_cache"
+
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
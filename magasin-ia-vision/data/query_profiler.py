@@ -0,0 +1,49 @@
+"""
+Opt-in slow query log (DB_PROFILE=True).
+Only the statement and its duration are recorded, in a bounded ring
+buffer: nothing is formatted or logged on the query path.
+"""
+import threading
+import time
+from collections import deque
+from sqlalchemy import event
+
+class QueryProfiler:
+    def __init__(self, size=5000):
+        self.samples = deque(maxlen=size)  # (statement, seconds)
+        self._lock = threading.Lock()
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        with self._lock:  # top() copies the buffer from another thread
+            self.samples.append((statement, elapsed))
+
+    def top(self, n=10):
+        """
+        Slowest statements of the buffer, by total time:
+        [(statement, calls, total_ms, max_ms)].
+        """
+        with self._lock:
+            samples = list(self.samples)
+        stats = {}
+        for statement, elapsed in samples:
+            calls, total, worst = stats.get(statement, (0, 0.0, 0.0))
+            stats[statement] = (calls + 1, total + elapsed, max(worst, elapsed))
+        ranked = sorted(stats.items(), key=lambda kv: kv[1][1], reverse=True)[:n]
+        return [(statement, calls, total * 1000, worst * 1000) for statement, (calls, total, worst) in ranked]
+
+    def dump(self, n=10):
+        """Log the top-n slowest statements."""
+        from services.logger_service import logger
+        for statement, calls, total_ms, max_ms in self.top(n):
+            logger.info(f"[SQL] {total_ms:.1f} ms total, {calls} calls, max {max_ms:.1f} ms: {' '.join(statement.split())[:200]}")
+
+    def clear(self):
+        self.samples.clear()
@@ -1,8 +1,23 @@
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import Integer, bindparam, func, insert, select, update
+from sqlalchemy.orm import Session, joinedload, raiseload
 from data.models import EquipmentItem, EquipmentType, EquipmentStatus, MovementHistory
 from services.logger_service import logger
 import datetime
 
+_items = EquipmentItem.__table__
+
+# Hot-path statements built once: each call only binds parameters, the
+# cache key is computed on an already constructed statement
+_SELECT_CURRENT_ZONES = select(_items.c.id, _items.c.current_zone_id).where(
+    _items.c.id.in_(bindparam("ids", expanding=True))
+)
+_INSERT_HISTORY = insert(MovementHistory)
+_UPDATE_STATUS = update(_items).where(_items.c.id == bindparam("b_id")).values(
+    status=bindparam("b_status"),
+    # Keep the current zone when none is given
+    current_zone_id=func.coalesce(bindparam("b_zone", type_=Integer), _items.c.current_zone_id)
+)
+
 class EquipmentRepository:
     """
     Data Access Layer for Equipment entities.
@@ -33,12 +48,29 @@ class EquipmentRepository:
             raise e
 
     def get_all_items(self):
-        """Retrieve all specific equipment items with their types and zones."""
+        """
+        Retrieve all specific equipment items with their types and zones.
+        Both are many-to-one, so they come in the same SELECT (LEFT OUTER JOIN);
+        any other relationship access raises (no hidden N+1).
+        """
         return self.db.query(EquipmentItem).options(
             joinedload(EquipmentItem.equipment_type),
-            joinedload(EquipmentItem.current_zone)
+            joinedload(EquipmentItem.current_zone),
+            raiseload('*')
         ).all()
 
+    def get_all_items_for_listing(self):
+        """
+        Lightweight rows for list views: (id, unique_ref, type_name, status) tuples.
+        Only the needed columns are selected, no ORM objects are built.
+        """
+        return self.db.query(
+            EquipmentItem.id,
+            EquipmentItem.unique_ref,
+            EquipmentType.name,
+            EquipmentItem.status
+        ).outerjoin(EquipmentType, EquipmentItem.type_id == EquipmentType.id).order_by(EquipmentItem.id).all()
+
     def create_item(self, unique_ref, type_id, status=EquipmentStatus.IN_STOCK):
         """Create a new specific item instance."""
         try:
@@ -57,8 +89,24 @@ class EquipmentRepository:
             logger.error(f"Error creating equipment item: {e}")
             raise e
 
+    def bulk_create_items(self, rows):
+        """
+        Create many items in one INSERT batch and one commit.
+        rows: list of dicts with unique_ref, type_id and optionally status.
+        """
+        try:
+            mappings = [{"status": EquipmentStatus.IN_STOCK, **row} for row in rows]
+            self.db.bulk_insert_mappings(EquipmentItem, mappings)
+            self.db.commit()
+            logger.info(f"Created {len(mappings)} EquipmentItems")
+            return len(mappings)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error bulk creating equipment items: {e}")
+            raise e
+
     def update_item_status(self, item_id, status: EquipmentStatus, user_id=None, zone_id=None):
-        """Update the status of an item and record history."""
+        """Update the status of an item and record history (single commit)."""
         try:
             item = self.db.query(EquipmentItem).filter(EquipmentItem.id == item_id).first()
             if item:
@@ -76,12 +124,49 @@ class EquipmentRepository:
                 item.status = status
                 if zone_id:
                     item.current_zone_id = zone_id
+                unique_ref = item.unique_ref  # read before commit expires the instance
                     
                 self.db.commit()
-                self.db.refresh(item)
-                logger.info(f"Updated item {item.unique_ref} status to {status} with history.")
+                logger.info(f"Updated item {unique_ref} status to {status} with history.")
             return item
         except Exception as e:
             self.db.rollback()
             logger.error(f"Error updating item status: {e}")
             raise e
+
+    def update_many_statuses(self, item_ids, status: EquipmentStatus, zone_id=None):
+        """
+        Set the same status on several items (see bulk_update_statuses).
+        Returns the number of items updated.
+        """
+        return self.bulk_update_statuses([(item_id, status, zone_id) for item_id in item_ids])
+
+    def bulk_update_statuses(self, updates):
+        """
+        Apply (item_id, status, zone_id or None) updates and record their
+        history in one transaction: one executemany INSERT into
+        movement_history and one executemany UPDATE, no ORM instances.
+        Returns the number of items updated.
+        """
+        try:
+            ids = [item_id for item_id, _, _ in updates]
+            current_zone = dict(self.db.execute(_SELECT_CURRENT_ZONES, {"ids": ids}).all())
+            updates = [u for u in updates if u[0] in current_zone]
+            if not updates:
+                return 0
+            now = datetime.datetime.now()
+            self.db.execute(_INSERT_HISTORY, [
+                {"item_id": item_id, "from_zone_id": current_zone[item_id], "to_zone_id": zone_id, "timestamp": now}
+                for item_id, _, zone_id in updates
+            ])
+            self.db.execute(
+                _UPDATE_STATUS,
+                [{"b_id": item_id, "b_status": status, "b_zone": zone_id} for item_id, status, zone_id in updates]
+            )
+            self.db.commit()
+            logger.info(f"Updated {len(updates)} items status with history.")
+            return len(updates)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Error updating items status: {e}")
+            raise e
@@ -4,20 +4,35 @@ Desktop Application Wrapper using PyWebView
 Launches FastAPI server and opens native window
 """
 import webview
+import socket
 import threading
 import time
 import uvicorn
 from pathlib import Path
 
+HOST = "127.0.0.1"
+PORT = 8000
+
 def start_server():
     """Start FastAPI server in background thread"""
     uvicorn.run(
         "server:app",
-        host="127.0.0.1",
-        port=8000,
+        host=HOST,
+        port=PORT,
         log_level="info"
     )
 
+def wait_for_server(timeout=10.0):
+    """Poll the server port until it accepts connections (True) or timeout (False)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((HOST, PORT), timeout=0.1):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
 def main():
     """Main entry point for desktop application"""
     # Start FastAPI server in background thread
@@ -26,12 +41,13 @@ def main():
     
     # Wait for server to start
     print("Waiting for server to start...")
-    time.sleep(3)
+    if not wait_for_server():
+        print("Server did not answer within 10s, opening the window anyway")
     
     # Create and start PyWebView window
     window = webview.create_window(
         title="Magasin Intelligent IA - VisionStock",
-        url="http://127.0.0.1:8000",
+        url=f"http://{HOST}:{PORT}",
         width=1600,
         height=1000,
         resizable=True,
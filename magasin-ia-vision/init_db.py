@@ -1,26 +1,93 @@
+import json
 from data.database import engine, Base
-from data.models import User, EquipmentType, Zone
+from data.models import DetectionEvent, PackedBBox, User, EquipmentType, Zone
+from sqlalchemy import LargeBinary, bindparam, inspect, select, text
 from sqlalchemy.orm import Session
 from services.logger_service import logger
 
+DEFAULT_EQUIPMENT_TYPES = [
+    {"name": "Perceuse", "description": "Perceuses électriques", "alert_threshold": 2},
+    {"name": "Multimètre", "description": "Appareils de mesure", "alert_threshold": 5},
+    {"name": "Gilet Sécu", "description": "EPI", "alert_threshold": 10},
+]
+
+def _existing_index_names(inspector, tables):
+    if engine.dialect.name == "sqlite":
+        # One query for the whole schema (the inspector issues several PRAGMAs per table)
+        with engine.connect() as conn:
+            return set(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    return {ix["name"] for table in tables for ix in inspector.get_indexes(table.name)}
+
+def ensure_indexes(inspector, tables):
+    """
+    create_all() skips tables that already exist, so indexes added to the
+    models later are created here (no-op when already present).
+    An index that cannot be built (e.g. a unique one over existing
+    duplicates) is logged and skipped: it must not abort the seeding.
+    """
+    existing = _existing_index_names(inspector, tables)
+    for table in tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                try:
+                    index.create(bind=engine)
+                except Exception as e:
+                    logger.error(f"Could not create index {index.name} on {table.name}: {e}")
+
+def migrate_bbox_column(inspector):
+    """
+    detection_events.bbox_coords used to be a JSON column; PackedBBox now
+    stores binary. An existing JSON column (PostgreSQL rejects bytea in it)
+    is replaced by a binary one, its rows repacked, in one transaction.
+    Failures are logged: they must not abort the seeding.
+    """
+    table = DetectionEvent.__table__.name
+    column = next((c for c in inspector.get_columns(table) if c["name"] == "bbox_coords"), None)
+    if column is None or isinstance(column["type"], LargeBinary):
+        return
+    packed = PackedBBox()
+    binary = LargeBinary().compile(dialect=engine.dialect)
+    try:
+        with engine.begin() as conn:
+            rows = conn.execute(text(f"SELECT id, bbox_coords FROM {table} WHERE bbox_coords IS NOT NULL")).all()
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN bbox_packed {binary}"))
+            if rows:
+                # JSON arrives decoded (PostgreSQL json) or as text (SQLite, MySQL)
+                conn.execute(
+                    text(f"UPDATE {table} SET bbox_packed = :packed WHERE id = :id").bindparams(
+                        bindparam("packed", type_=LargeBinary)),
+                    [{"id": id_, "packed": packed.process_bind_param(
+                        json.loads(bbox) if isinstance(bbox, str) else bbox, engine.dialect)}
+                     for id_, bbox in rows]
+                )
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN bbox_coords"))
+            conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN bbox_packed TO bbox_coords"))
+        logger.success(f"{table}.bbox_coords converted to packed binary ({len(rows)} rows).")
+    except Exception as e:
+        logger.error(f"Could not convert {table}.bbox_coords to packed binary: {e}")
+
 def init_db():
     logger.info("Initializing database...")
     try:
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        logger.success("Tables created successfully.")
+        # Create only the missing tables (one table listing instead of a
+        # has_table round-trip per table); warm starts create nothing
+        inspector = inspect(engine)
+        existing = set(inspector.get_table_names())
+        tables = Base.metadata.sorted_tables
+        missing = [t for t in tables if t.name not in existing]
+        if missing:
+            Base.metadata.create_all(bind=engine, tables=missing, checkfirst=False)
+            logger.success(f"{len(missing)} table(s) created.")
+        ensure_indexes(inspector, [t for t in tables if t.name in existing])
+        if DetectionEvent.__table__.name in existing:
+            migrate_bbox_column(inspector)
         
         # Seed initial data
         with Session(engine) as session:
             # Check if we have types
-            if session.query(EquipmentType).count() == 0:
+            if session.scalar(select(EquipmentType.id).limit(1)) is None:
                 logger.info("Seeding default equipment types...")
-                types = [
-                    EquipmentType(name="Perceuse", description="Perceuses électriques", alert_threshold=2),
-                    EquipmentType(name="Multimètre", description="Appareils de mesure", alert_threshold=5),
-                    EquipmentType(name="Gilet Sécu", description="EPI", alert_threshold=10)
-                ]
-                session.add_all(types)
+                session.bulk_insert_mappings(EquipmentType, DEFAULT_EQUIPMENT_TYPES)
                 session.commit()
                 logger.success("Default types seeded.")
                 
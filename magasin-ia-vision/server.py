@@ -4,24 +4,43 @@ Backend principal avec REST API + WebSocket streaming vidéo
 """
 import asyncio
 import base64
-import cv2
+import hashlib
 import json
-from typing import List, Dict, Set
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import time
+from datetime import datetime
+from typing import List, Dict
+from fastapi import Depends, FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from workers.async_video_worker import AsyncVideoWorker
 from workers.multi_camera_manager import get_multi_camera_manager, CameraConfig
+from sqlalchemy.orm import Session
 from data.database import get_db
 from data.repositories.zone_repo import get_zone_repo
 from data.models import EquipmentType
 from services.logger_service import logger
 from ai.temporal_detection import get_temporal_engine
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _json_bytes(obj) -> bytes:
+    return orjson.dumps(obj) if ORJSON_AVAILABLE else json.dumps(obj).encode('utf-8')
+
+def _cached_json_response(request: Request, body: bytes, etag: str, max_age: int) -> Response:
+    """Pre-serialized JSON body with an ETag; 304 when the client already has it"""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Global variables
 video_worker = None
 multi_camera_manager = None
@@ -32,35 +51,35 @@ async def lifespan(app: FastAPI):
     global video_worker, multi_camera_manager
     
     # Startup
-    logger.info("Starting FastAPI server...")
+    loop = asyncio.get_running_loop()
+    logger.info(f"Starting FastAPI server ({type(loop).__module__}.{type(loop).__name__})...")
+    from ai.detector import configure_torch_threads  # loads torch
+    configure_torch_threads()
     
-    # Register notification callbacks for Temporal engine
+    # Push Temporal engine events to the notification websocket clients
     temporal_engine = get_temporal_engine()
     
-    def on_validation_created(data):
-        asyncio.create_task(notification_manager.broadcast({
-            "type": "VALIDATION_CREATED",
-            "message": f"Nouveau stock détecté: {data['object_type']} ({data['quantity_delta']:+d})",
-            "data": data
-        }))
-        
-    def on_validation_approved(data):
-        asyncio.create_task(notification_manager.broadcast({
-            "type": "VALIDATION_APPROVED",
-            "message": f"Validation approuvée: {data['object_type']} ({data['quantity_delta']:+d})",
-            "data": data
-        }))
-
-    def on_validation_rejected(data):
-        asyncio.create_task(notification_manager.broadcast({
-            "type": "VALIDATION_REJECTED",
-            "message": f"Validation rejetée: {data['object_type']}",
-            "data": data
-        }))
-
-    temporal_engine.on_validation_created = on_validation_created
-    temporal_engine.on_validation_approved = on_validation_approved
-    temporal_engine.on_validation_rejected = on_validation_rejected
+    notification_texts = {
+        "VALIDATION_CREATED": lambda data: f"Nouveau stock détecté: {data['object_type']} ({data['quantity_delta']:+d})",
+        "VALIDATION_APPROVED": lambda data: f"Validation approuvée: {data['object_type']} ({data['quantity_delta']:+d})",
+        "VALIDATION_REJECTED": lambda data: f"Validation rejetée: {data['object_type']}",
+    }
+    
+    def make_pusher(event_type, describe):
+        def push(data):
+            notification_manager.broadcast_nowait({
+                "type": event_type,
+                "message": describe(data),
+                "data": data
+            })
+        return push
+    
+    subscriptions = [
+        (event_type, make_pusher(event_type, describe))
+        for event_type, describe in notification_texts.items()
+    ]
+    for event_type, push in subscriptions:
+        temporal_engine.subscribe(event_type, push)
 
     # Initialize multi-camera manager
     multi_camera_manager = get_multi_camera_manager()
@@ -87,6 +106,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down server...")
+    for event_type, push in subscriptions:
+        temporal_engine.unsubscribe(event_type, push)
     if multi_camera_manager:
         multi_camera_manager.stop_all()
     if video_worker:
@@ -105,44 +126,97 @@ app.add_middleware(
 )
 
 # Mount static files (frontend)
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles plus a Cache-Control header. ETag / Last-Modified and the
+    304 answer to conditional requests are handled by StaticFiles itself.
+    The assets are not content-hashed, so the max-age stays short.
+    """
+    def __init__(self, *args, max_age: int = 60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}"
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", self.cache_control)
+        return response
+
 frontend_path = Path(__file__).parent / "frontend"
 if frontend_path.exists():
-    app.mount("/static", StaticFiles(directory=str(frontend_path)), name="static")
+    app.mount("/static", CachedStaticFiles(directory=str(frontend_path)), name="static")
 
 # ============================================================================
 # Notification System - Global Broadcast
 # ============================================================================
 
 class NotificationManager:
-    """Manages active WebSocket connections for notifications."""
+    """
+    Manages active WebSocket connections for notifications.
+    Each client has a bounded queue drained by its own writer task, so
+    broadcasting is only a put_nowait per client: a slow client never
+    delays the broadcaster nor the other clients.
+    """
+    QUEUE_SIZE = 64
+
     def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+        self.active_connections: Dict[WebSocket, asyncio.Queue] = {}
+        self._writers: Dict[WebSocket, asyncio.Task] = {}
+        self._loop = None
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.add(websocket)
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self.active_connections[websocket] = queue
+        self._writers[websocket] = asyncio.create_task(self._writer(websocket, queue))
         logger.info(f"Notification client connected: {websocket.client}")
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.pop(websocket, None)
+        writer = self._writers.pop(websocket, None)
+        if writer:
+            writer.cancel()
         logger.info(f"Notification client disconnected")
 
+    async def _writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        try:
+            while True:
+                message_str = await queue.get()
+                await websocket.send_text(message_str)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Error sending notification: {e}")
+            self.active_connections.pop(websocket, None)
+            self._writers.pop(websocket, None)
+
+    def _enqueue(self, message_str: str):
+        for queue in list(self.active_connections.values()):
+            if queue.full():
+                queue.get_nowait()  # drop the oldest pending notification
+            queue.put_nowait(message_str)
+
+    def broadcast_nowait(self, message: dict):
+        """
+        Queue a message for all connected clients, without waiting.
+        Safe to call from any thread (engine callbacks run in worker threads).
+        """
+        if not self.active_connections or self._loop is None:
+            return
+        # Encoded once for every client
+        message_str = orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode('utf-8') if ORJSON_AVAILABLE else json.dumps(message)
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._enqueue(message_str)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, message_str)
+
     async def broadcast(self, message: dict):
         """Send a message to all connected clients."""
-        if not self.active_connections:
-            return
-            
-        message_str = json.dumps(message)
-        disconnected = set()
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message_str)
-            except Exception as e:
-                logger.error(f"Error broadcasting notification: {e}")
-                disconnected.add(connection)
-        
-        for conn in disconnected:
-            self.active_connections.remove(conn)
+        self.broadcast_nowait(message)
 
 notification_manager = NotificationManager()
 
@@ -184,34 +258,24 @@ async def websocket_video(websocket: WebSocket, camera_id: str):
         await websocket.close()
         return
 
+    worker.viewers += 1
+    seq = 0
     try:
         while True:
-            frame_data = worker.get_frame()
+            # Sleeps until the worker publishes a newer frame (frames published
+            # while this client was sending are skipped, only the latest is sent)
+            frame = await worker.wait_frame(seq)
+            if frame is None:
+                # Camera removed / worker stopped: 1012 = service restart
+                logger.info(f"Video worker {camera_id} stopped, closing stream")
+                await websocket.close(code=1012)
+                break
+            seq, payload = frame
             
-            if frame_data:
-                frame, detections, alerts = frame_data
-                
-                # Prepare metadata
-                metadata = {
-                    "camera_id": camera_id,
-                    "detections": detections,
-                    "alerts": alerts,
-                    "timestamp": asyncio.get_event_loop().time()
-                }
-                metadata_json = json.dumps(metadata).encode('utf-8')
-                metadata_len = len(metadata_json)
-                
-                # Encode frame to JPEG
-                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-                
-                # Binary format: [4 bytes metadata_len] [N bytes metadata] [Raw JPEG bytes]
-                header = metadata_len.to_bytes(4, byteorder='big')
-                payload = header + metadata_json + buffer.tobytes()
-                
+            # Message (metadata + JPEG) already encoded once by the worker for all viewers
+            if payload is not None:
                 await websocket.send_bytes(payload)
             
-            await asyncio.sleep(0.01)  # High performance polling
-            
     except WebSocketDisconnect:
         logger.info(f"WebSocket client disconnected from {camera_id}")
     except Exception as e:
@@ -220,6 +284,8 @@ async def websocket_video(websocket: WebSocket, camera_id: str):
             await websocket.close()
         except:
             pass
+    finally:
+        worker.viewers -= 1
 
 # ============================================================================
 # REST API Endpoints
@@ -230,31 +296,29 @@ async def root():
     """Redirect to surveillance dashboard"""
     return FileResponse(str(frontend_path / "surveillance.html"))
 
-@app.get("/{page}.html")
-async def get_page(page: str):
-    """Serve any HTML page from the frontend directory"""
-    path = frontend_path / f"{page}.html"
-    if path.exists():
-        return FileResponse(str(path))
-    return {"error": "Page not found"}, 404
-
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
+    # The camera is opened by the worker thread: "starting" until it is
+    if not video_worker or not video_worker.running:
+        worker_state = "stopped"
+    else:
+        worker_state = "running" if video_worker.ready else "starting"
     return {
         "status": "healthy",
-        "video_worker": "running" if video_worker and video_worker.running else "stopped"
+        "video_worker": worker_state
     }
 
 @app.get("/api/equipment")
-async def get_equipment():
+def get_equipment(db: Session = Depends(get_db)):
     """Get all equipment items with full metadata for ASECNA inventory"""
     from data.repositories.equipment_repo import EquipmentRepository
-    db = next(get_db())
     repo = EquipmentRepository(db)
     items = repo.get_all_items()
     
-    return {
+    # Plain dicts of str/int/float encoded straight to bytes: skips FastAPI's
+    # jsonable_encoder walk over every field of every item
+    body = _json_bytes({
         "success": True,
         "data": [
             {
@@ -262,7 +326,7 @@ async def get_equipment():
                 "unique_ref": item.unique_ref,
                 "name": item.equipment_type.name if item.equipment_type else "Unknown Item",
                 "category": item.equipment_type.description if item.equipment_type else "Uncategorized",
-                "status": item.status.value if hasattr(item.status, 'value') else item.status,
+                "status": item.status.value if item.status is not None else None,
                 "declared_quantity": item.declared_quantity,
                 "detected_quantity": item.detected_quantity,
                 "counting_confidence": item.counting_confidence,
@@ -271,13 +335,14 @@ async def get_equipment():
             }
             for item in items
         ]
-    }
+    })
+    return Response(content=body, media_type="application/json")
 
 @app.get("/api/alerts")
-async def get_alerts():
+def get_alerts(db: Session = Depends(get_db)):
     """Get recent alerts"""
     from services.alert_service import AlertService
-    service = AlertService()
+    service = AlertService(db)
     alerts = service.get_recent_alerts(limit=50)
     
     return {
@@ -295,10 +360,10 @@ async def get_alerts():
     }
 
 @app.get("/api/stats")
-async def get_statistics():
+def get_statistics(db: Session = Depends(get_db)):
     """Get real system statistics from DB"""
     from services.statistics_service import StatisticsService
-    service = StatisticsService()
+    service = StatisticsService(db)
     stats = service.get_inventory_stats()
     
     return {
@@ -313,30 +378,34 @@ async def get_statistics():
     }
 
 
-@app.get("/api/models/available")
-async def get_available_models():
-    """Get list of available AI models"""
-    return {
-        "success": True,
-        "data": {
-            "detectors": [
-                {"id": "yolov8n", "name": "YOLOv8 Nano", "size": "6MB"},
-                {"id": "yolov8s", "name": "YOLOv8 Small", "size": "22MB"},
-                {"id": "yolov8m", "name": "YOLOv8 Medium", "size": "52MB"},
-                {"id": "yolov8l", "name": "YOLOv8 Large", "size": "88MB"},
-                {"id": "yolov11n", "name": "YOLOv11 Nano", "size": "5MB"},
-            ],
-            "trackers": [
-                {"id": "bytetrack", "name": "ByteTrack", "description": "High-performance multi-object tracking"},
-                {"id": "botsort", "name": "BoT-SORT", "description": "Robust tracking with ReID"},
-                {"id": "deepsort", "name": "DeepSORT", "description": "Classic deep learning tracker"},
-            ],
-            "segmenters": [
-                {"id": "sam2-base", "name": "SAM2 Base", "size": "154MB"},
-                {"id": "sam2-large", "name": "SAM2 Large", "size": "220MB"},
-            ]
-        }
+_AVAILABLE_MODELS = {
+    "success": True,
+    "data": {
+        "detectors": [
+            {"id": "yolov8n", "name": "YOLOv8 Nano", "size": "6MB"},
+            {"id": "yolov8s", "name": "YOLOv8 Small", "size": "22MB"},
+            {"id": "yolov8m", "name": "YOLOv8 Medium", "size": "52MB"},
+            {"id": "yolov8l", "name": "YOLOv8 Large", "size": "88MB"},
+            {"id": "yolov11n", "name": "YOLOv11 Nano", "size": "5MB"},
+        ],
+        "trackers": [
+            {"id": "bytetrack", "name": "ByteTrack", "description": "High-performance multi-object tracking"},
+            {"id": "botsort", "name": "BoT-SORT", "description": "Robust tracking with ReID"},
+            {"id": "deepsort", "name": "DeepSORT", "description": "Classic deep learning tracker"},
+        ],
+        "segmenters": [
+            {"id": "sam2-base", "name": "SAM2 Base", "size": "154MB"},
+            {"id": "sam2-large", "name": "SAM2 Large", "size": "220MB"},
+        ]
     }
+}
+_AVAILABLE_MODELS_BODY = _json_bytes(_AVAILABLE_MODELS)
+_AVAILABLE_MODELS_ETAG = '"' + hashlib.md5(_AVAILABLE_MODELS_BODY).hexdigest() + '"'
+
+@app.get("/api/models/available")
+async def get_available_models(request: Request):
+    """Get list of available AI models (static: serialized once at import)"""
+    return _cached_json_response(request, _AVAILABLE_MODELS_BODY, _AVAILABLE_MODELS_ETAG, max_age=300)
 
 @app.post("/api/models/detector")
 async def switch_detector(model_id: str):
@@ -376,7 +445,7 @@ async def get_cameras():
     return {"success": False, "message": "Multi-camera manager not initialized"}
 
 @app.post("/api/cameras/add")
-async def add_camera_persistent(data: dict):
+def add_camera_persistent(data: dict, db: Session = Depends(get_db)):
     """Add a new camera with IP and Zone, and persist it"""
     global multi_camera_manager
     
@@ -389,17 +458,14 @@ async def add_camera_persistent(data: dict):
     
     # 1. Persist in Database
     try:
-        from sqlalchemy.orm import Session
-        from data.database import engine
-        with Session(engine) as session:
-            repo = get_zone_repo(session)
-            zone = repo.add_zone(
-                name=zone_name,
-                camera_id=ip_address,
-                equipment_type_id=equipment_type_id
-            )
-            zone_id = f"ZONE-{zone.id}"
-            camera_id = f"CAM-{zone.id}"
+        repo = get_zone_repo(db)
+        zone = repo.add_zone(
+            name=zone_name,
+            camera_id=ip_address,
+            equipment_type_id=equipment_type_id
+        )
+        zone_id = f"ZONE-{zone.id}"
+        camera_id = f"CAM-{zone.id}"
     except Exception as e:
         logger.error(f"Failed to persist camera in DB: {e}")
         return {"success": False, "message": f"DB Error: {e}"}
@@ -418,17 +484,28 @@ async def add_camera_persistent(data: dict):
     
     return {"success": False, "message": f"Failed to add camera {camera_id} to manager"}
 
+EQUIPMENT_TYPES_TTL_SEC = 30
+_equipment_types_cache = None  # (body, etag, expires_at)
+
+def _equipment_types_payload(db: Session):
+    """Serialized equipment types, re-queried at most every EQUIPMENT_TYPES_TTL_SEC"""
+    global _equipment_types_cache
+    now = time.monotonic()
+    if _equipment_types_cache is None or _equipment_types_cache[2] <= now:
+        types = db.query(EquipmentType.id, EquipmentType.name).all()
+        body = _json_bytes({
+            "success": True, 
+            "data": [{"id": type_id, "name": name} for type_id, name in types]
+        })
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        _equipment_types_cache = (body, etag, now + EQUIPMENT_TYPES_TTL_SEC)
+    return _equipment_types_cache
+
 @app.get("/api/equipment-types")
-async def get_equipment_types():
+def get_equipment_types(request: Request, db: Session = Depends(get_db)):
     """Get list of equipment types for dropdowns"""
-    from sqlalchemy.orm import Session
-    from data.database import engine
-    with Session(engine) as session:
-        types = session.query(EquipmentType).all()
-        return {
-            "success": True, 
-            "data": [{"id": t.id, "name": t.name} for t in types]
-        }
+    body, etag, _ = _equipment_types_payload(db)
+    return _cached_json_response(request, body, etag, max_age=EQUIPMENT_TYPES_TTL_SEC)
 
 @app.delete("/api/cameras/{camera_id}")
 async def remove_camera(camera_id: str):
@@ -485,7 +562,7 @@ async def cameras_status():
 # === Reports & Analytics Endpoints ===
 
 @app.get("/api/reports/weekly")
-async def get_weekly_report():
+def get_weekly_report():
     """Generate weekly report data"""
     from services.report_service import get_report_service
     
@@ -498,7 +575,7 @@ async def get_weekly_report():
         return {"success": False, "message": str(e)}
 
 @app.get("/api/reports/export/excel")
-async def export_excel_report():
+def export_excel_report():
     """Export weekly report as Excel file"""
     from services.report_service import get_report_service
     from fastapi.responses import Response
@@ -520,7 +597,7 @@ async def export_excel_report():
         return {"success": False, "message": str(e)}
 
 @app.get("/api/reports/export/csv")
-async def export_csv_report(sheet: str = "summary"):
+def export_csv_report(sheet: str = "summary"):
     """Export specific sheet as CSV"""
     from services.report_service import get_report_service
     from fastapi.responses import Response
@@ -582,10 +659,10 @@ async def get_analytics_stats():
 # === Temporal Detection & Validation Endpoints ===
 
 @app.get("/api/config/detection")
-async def get_detection_config():
+def get_detection_config(db: Session = Depends(get_db)):
     """Get current detection configuration from DB"""
-    from services.config_service import get_config_manager
-    config_manager = get_config_manager()
+    from services.config_service import ConfigurationManager
+    config_manager = ConfigurationManager(db)
     configs = config_manager.get_all_configs()
     
     return {
@@ -594,18 +671,18 @@ async def get_detection_config():
             "stability_duration_minutes": int(configs.get("stability_duration_minutes", 60)),
             "confidence_threshold": float(configs.get("confidence_threshold", 0.60)),
             "alert_delay_hours": int(configs.get("alert_delay_hours", 3)),
-            "asecna_countries": configs.get("asecna_countries", "[]")
+            "asecna_countries": config_manager.get_asecna_countries()
         }
     }
 
 @app.post("/api/config/detection/update")
-async def update_detection_config(config: dict):
+def update_detection_config(config: dict, db: Session = Depends(get_db)):
     """Update detection configuration in DB and sync engine"""
-    from services.config_service import get_config_manager
-    config_manager = get_config_manager()
+    from services.config_service import ConfigurationManager
+    config_manager = ConfigurationManager(db)
     
-    for key, value in config.items():
-        config_manager.set_config(key, value)
+    if not config_manager.set_configs(config):
+        return {"success": False, "message": "Failed to update configuration"}
         
     return {"success": True, "message": "Database configuration updated and engine synced"}
 
@@ -650,27 +727,36 @@ async def search_object(name: str):
     from ai.temporal_detection import get_temporal_engine
     engine = get_temporal_engine()
     
-    results = []
-    for (obj_type, cam_id), tracking in engine.active_trackings.items():
-        if name.lower() in obj_type.lower():
-            results.append({
-                "object_type": obj_type,
-                "camera_id": cam_id,
-                "status": tracking.status.value,
-                "duration": tracking.get_duration_minutes(),
-                "avg_confidence": tracking.avg_confidence,
-                "tracking_link": f"/surveillance?camera={cam_id}&highlight={obj_type}"
-            })
+    results = [
+        {
+            "object_type": tracking.object_type,
+            "camera_id": tracking.camera_id,
+            "status": tracking.status.value,
+            "duration": tracking.get_duration_minutes(),
+            "avg_confidence": tracking.avg_confidence,
+            "tracking_link": f"/surveillance?camera={tracking.camera_id}&highlight={tracking.object_type}"
+        }
+        for tracking in engine.search_trackings(name)
+    ]
             
     return {"success": True, "data": results}
 
+# Top-level HTML pages (/surveillance.html, ...). Mounted last: every route
+# declared above (API, websockets, "/") matches first.
+if frontend_path.exists():
+    app.mount("/", CachedStaticFiles(directory=str(frontend_path), html=True), name="frontend")
+
 if __name__ == "__main__":
-    from datetime import datetime
     import uvicorn
+    from config.settings import settings
+    # loop/http "auto": uvloop and httptools when installed, asyncio/h11 otherwise.
+    # Single process: cameras, workers and notification clients live in memory.
     uvicorn.run(
         "server:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        reload=settings.SERVER_RELOAD,
+        loop="auto",
+        http="auto",
         log_level="info"
     )
@@ -33,6 +33,27 @@ class AlertService:
             logger.error(f"Failed to create alert: {e}")
             return None
 
+    def create_alerts(self, alerts):
+        """
+        Persist a batch of alerts ({'type', 'message'} dicts) in one transaction.
+        """
+        if not alerts:
+            return []
+        try:
+            now = datetime.datetime.now()
+            rows = [
+                Alert(type=a['type'], message=a['message'], timestamp=now, is_acknowledged=False)
+                for a in alerts
+            ]
+            self.db.add_all(rows)
+            self.db.commit()
+            logger.warning(f"{len(rows)} new alert(s), last: {alerts[-1]['type']} - {alerts[-1]['message']}")
+            return rows
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to create alerts: {e}")
+            return []
+
     def get_active_alerts(self):
         """
         Get all unacknowledged alerts.
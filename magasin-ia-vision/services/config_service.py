@@ -3,93 +3,230 @@ Configuration Manager for ASECNA Stock Management
 Handles reading and writing admin configurations from the database.
 """
 
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, Mapping, Sequence, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from data.database import SessionLocal
+from data.database import SessionFactory, upsert_insert
 from data.models import AdminConfig
 import logging
 import json
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+import time
 
 logger = logging.getLogger(__name__)
 
+# Configs as read from the DB, shared by every manager instance (the API builds
+# one per request): ({key: raw value}, expires_at), plus the JSON values decoded
+# from it. set_configs writes through and bumps the version (decoded values are
+# dropped); the TTL picks up rows written by another process.
+CONFIG_CACHE_TTL_SEC = 30.0
+_cache_lock = threading.Lock()
+_cache_version = 0
+_configs_cache: Optional[Tuple[Dict[str, str], float]] = None
+_decoded_cache: Dict[str, Any] = {}
+
+def _invalidate_cache():
+    global _cache_version, _configs_cache
+    with _cache_lock:
+        _cache_version += 1
+        _configs_cache = None
+        _decoded_cache.clear()
+
+def _write_through(updates: Mapping[str, str]):
+    """Apply committed updates to the cache (copy-on-write: readers may hold the old dict)"""
+    global _cache_version, _configs_cache
+    with _cache_lock:
+        _cache_version += 1
+        _decoded_cache.clear()
+        if _configs_cache is not None:
+            configs, expires_at = _configs_cache
+            _configs_cache = ({**configs, **updates}, expires_at)
+
+# Settings that TemporalDetectionEngine mirrors
+_ENGINE_KEYS = frozenset(("stability_duration_minutes", "confidence_threshold", "alert_delay_hours"))
+
+def _upsert_statement(dialect_name: str):
+    """INSERT ... ON CONFLICT (config_key) DO UPDATE, or None if the dialect has no such clause"""
+    insert = upsert_insert(dialect_name)
+    if insert is None:
+        return None
+    stmt = insert(AdminConfig)
+    return stmt.on_conflict_do_update(
+        index_elements=[AdminConfig.config_key],
+        set_={
+            "config_value": stmt.excluded.config_value,
+            "updated_by": stmt.excluded.updated_by,
+            "updated_at": func.now(),  # onupdate is not applied to ON CONFLICT
+        },
+    )
+
+def _to_config_value(value: Any) -> str:
+    # Convert value to string for storage (lists/dicts as JSON)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if not isinstance(value, str):
+        return str(value)
+    return value
+
 class ConfigurationManager:
     """
     Manages application-wide configurations stored in the database.
     """
     
-    _defaults = {
+    _ASECNA_COUNTRIES = (
+        "Sénégal",
+        "Côte d'Ivoire",
+        "Mali",
+        "Burkina Faso",
+        "Gabon",
+        "Cameroun",
+        "Tchad",
+        "Niger",
+        "Mauritanie",
+        "Guinée",
+        "Guinée-Bissau",
+        "Guinée Équatoriale",
+        "Togo",
+        "Bénin",
+        "République Centrafricaine",
+        "Congo",
+        "Madagascar",
+        "Comores",
+        "France",
+    )
+    
+    # Read-only: shared by every instance and copied into each cache load
+    _defaults = MappingProxyType({
         "stability_duration_minutes": "60",
         "confidence_threshold": "0.60",
         "alert_delay_hours": "3",
-        "asecna_countries": '["Sénégal", "Côte d\'Ivoire", "Mali", "Burkina Faso", "Gabon", "Cameroun", "Tchad", "Niger", "Mauritanie", "Guinée", "Guinée-Bissau", "Guinée Équatoriale", "Togo", "Bénin", "République Centrafricaine", "Congo", "Madagascar", "Comores", "France"]'
-    }
+        "asecna_countries": json.dumps(list(_ASECNA_COUNTRIES), ensure_ascii=False)
+    })
 
     def __init__(self, db: Optional[Session] = None):
+        # Caller-owned session (request scope), or None: each DB access then
+        # uses its own short-lived session, so the process-wide manager never
+        # holds a connection between calls
         self._db = db
-        self._db_owned = False
-        
-    @property
-    def db(self) -> Session:
-        if self._db is None:
-            self._db = SessionLocal()
-            self._db_owned = True
-        return self._db
         
-    def __del__(self):
-        if self._db_owned and self._db:
-            self._db.close()
+    @contextmanager
+    def _session(self):
+        if self._db is not None:
+            yield self._db
+        else:
+            with SessionFactory() as db:
+                yield db
 
     def get_config(self, key: str) -> str:
         """
         Get a configuration value by key.
         """
-        config = self.db.query(AdminConfig).filter(AdminConfig.config_key == key).first()
-        if config:
-            return config.config_value
-        return self._defaults.get(key, "")
+        return self._load().get(key, "")
+
+    def get_json_config(self, key: str, default: Any = None) -> Any:
+        """
+        Get a JSON-encoded configuration (e.g. asecna_countries) as a Python
+        value, decoded once per config version.
+        """
+        version = _cache_version
+        if key in _decoded_cache:
+            return _decoded_cache[key]
+        try:
+            value = json.loads(self.get_config(key))
+        except ValueError:
+            logger.error(f"Configuration {key} is not valid JSON")
+            return default
+        with _cache_lock:
+            if version == _cache_version:
+                _decoded_cache[key] = value
+        return value
+
+    def get_asecna_countries(self) -> Sequence[str]:
+        """ASECNA member countries: the built-in tuple unless customized in DB"""
+        if self.get_config("asecna_countries") == self._defaults["asecna_countries"]:
+            return self._ASECNA_COUNTRIES
+        return self.get_json_config("asecna_countries", [])
 
     def set_config(self, key: str, value: Any, admin_id: Optional[int] = None) -> bool:
         """
         Set a configuration value.
         """
-        try:
-            # Convert value to string for storage
-            if not isinstance(value, str):
-                value = str(value)
-                
-            config = self.db.query(AdminConfig).filter(AdminConfig.config_key == key).first()
+        return self.set_configs({key: value}, admin_id)
+
+    def set_configs(self, items: Mapping[str, Any], admin_id: Optional[int] = None) -> bool:
+        """
+        Set several configuration values in one statement and one commit
+        (a settings form save), then sync the temporal engine once.
+        """
+        updates = {key: _to_config_value(value) for key, value in items.items()}
+        if not updates:
+            return True
+        
+        with self._session() as db:
+            try:
+                stmt = _upsert_statement(db.get_bind().dialect.name)
+                if stmt is not None:
+                    db.execute(stmt, [
+                        {"config_key": key, "config_value": value, "updated_by": admin_id}
+                        for key, value in updates.items()
+                    ])
+                else:
+                    self._merge_configs(db, updates, admin_id)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to set configuration {', '.join(updates)}: {e}")
+                return False
+        
+        _write_through(updates)  # no reload for the engine update below
+        for key, value in updates.items():
+            logger.info(f"Configuration updated: {key} = {value}")
+        
+        # If a core detection setting changed, update the temporal engine
+        if not _ENGINE_KEYS.isdisjoint(updates):
+            self._update_temporal_engine()
+            
+        return True
+
+    @staticmethod
+    def _merge_configs(db: Session, updates: Dict[str, str], admin_id: Optional[int]):
+        """Portable fallback: existing rows loaded in one query, the others inserted"""
+        rows = {
+            config.config_key: config
+            for config in db.query(AdminConfig).filter(AdminConfig.config_key.in_(list(updates)))
+        }
+        for key, value in updates.items():
+            config = rows.get(key)
             if config:
                 config.config_value = value
                 config.updated_by = admin_id
             else:
-                config = AdminConfig(
-                    config_key=key,
-                    config_value=value,
-                    updated_by=admin_id
-                )
-                self.db.add(config)
-            
-            self.db.commit()
-            logger.info(f"Configuration updated: {key} = {value}")
-            
-            # If it's a core detection setting, update the temporal engine
-            if key in ["stability_duration_minutes", "confidence_threshold", "alert_delay_hours"]:
-                self._update_temporal_engine()
-                
-            return True
-        except Exception as e:
-            self.db.rollback()
-            logger.error(f"Failed to set configuration {key}: {e}")
-            return False
+                db.add(AdminConfig(config_key=key, config_value=value, updated_by=admin_id))
 
     def get_all_configs(self) -> Dict[str, str]:
         """
         Get all configurations as a dictionary.
         """
+        return dict(self._load())
+
+    def _load(self) -> Dict[str, str]:
+        """Defaults overlaid with the DB rows, read once per config version / TTL"""
+        global _configs_cache
+        cached = _configs_cache
+        if cached is not None:
+            if cached[1] > time.monotonic():
+                return cached[0]
+            _invalidate_cache()  # expired: decoded values go too
+        version = _cache_version
         configs = {**self._defaults}
-        db_configs = self.db.query(AdminConfig).all()
-        for c in db_configs:
-            configs[c.config_key] = c.config_value
+        with self._session() as db:
+            rows = db.query(AdminConfig.config_key, AdminConfig.config_value).all()
+        configs.update(rows)
+        with _cache_lock:
+            if version == _cache_version:  # not invalidated while reading
+                _configs_cache = (configs, time.monotonic() + CONFIG_CACHE_TTL_SEC)
         return configs
 
     def _update_temporal_engine(self):
@@ -104,6 +241,7 @@ class ConfigurationManager:
             
             if "stability_duration_minutes" in configs:
                 engine.stability_duration_minutes = int(configs["stability_duration_minutes"])
+                engine.stability_threshold_sec = engine.stability_duration_minutes * 60.0
             if "confidence_threshold" in configs:
                 engine.confidence_threshold = float(configs["confidence_threshold"])
             if "alert_delay_hours" in configs:
@@ -115,10 +253,13 @@ class ConfigurationManager:
 
 # Singleton instance
 _config_manager = None
+_config_manager_lock = threading.Lock()
 
 def get_config_manager(db: Optional[Session] = None) -> ConfigurationManager:
     """Get or create the global configuration manager instance"""
     global _config_manager
     if _config_manager is None:
-        _config_manager = ConfigurationManager(db)
+        with _config_manager_lock:
+            if _config_manager is None:
+                _config_manager = ConfigurationManager(db)
     return _config_manager
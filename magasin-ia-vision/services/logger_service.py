@@ -1,22 +1,43 @@
 import sys
 import logging
+import functools
 from loguru import logger
 from config.settings import settings
 
+@functools.lru_cache(maxsize=16)
+def _loguru_level(levelname, levelno):
+    """Loguru level for a stdlib level (only a handful exist, resolved once each)"""
+    try:
+        return logger.level(levelname).name
+    except ValueError:
+        return levelno
+
 class InterceptHandler(logging.Handler):
     """
     Redirects standard logging messages to Loguru.
     """
+    # Frames between emit() and the code that called logging:
+    # Handler.handle, Logger.callHandlers, Logger.handle, Logger._log, Logger.info
+    _depth = 6
+
     def emit(self, record):
+        level = _loguru_level(record.levelname, record.levelno)
+
+        # Fast path: the depth of the previous record still points at the
+        # first frame outside the logging module
+        depth = self._depth
         try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
+            frame = sys._getframe(depth)
+            stale = (frame.f_code.co_filename == logging.__file__
+                     or sys._getframe(depth - 1).f_code.co_filename != logging.__file__)
+        except ValueError:  # stack shallower than the cached depth
+            stale = True
+        if stale:
+            frame, depth = sys._getframe(1), 1
+            while frame and frame.f_code.co_filename == logging.__file__:
+                frame = frame.f_back
+                depth += 1
+            self._depth = depth
 
         logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
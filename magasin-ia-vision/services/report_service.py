@@ -5,18 +5,138 @@ Generates weekly/monthly reports with stock movements, withdrawals, and AI analy
 Supports Excel and CSV export formats.
 """
 
-import pandas as pd
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from types import MappingProxyType
+from typing import Optional, Dict, Mapping, Sequence, Tuple
+import csv
 import io
 import logging
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 
+class _ExcelKit:
+    """openpyxl classes and shared styles, imported on the first Excel export"""
+    
+    def __init__(self):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font, PatternFill
+        self.Workbook = Workbook
+        self.WriteOnlyCell = WriteOnlyCell
+        # Shared style objects (not one Font/PatternFill per cell or per export)
+        self.title_font = Font(size=16, bold=True)
+        self.bold_font = Font(bold=True)
+        self.header_blue = self._solid_fill(PatternFill, '137fec')
+        self.header_green = self._solid_fill(PatternFill, '10b981')
+        self.header_amber = self._solid_fill(PatternFill, 'f59e0b')
+    
+    @staticmethod
+    def _solid_fill(PatternFill, color: str):
+        return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+_excel_kit = None
+
+
+def _excel() -> _ExcelKit:
+    global _excel_kit
+    if _excel_kit is None:
+        _excel_kit = _ExcelKit()
+    return _excel_kit
+
+
+# Mock report data (until the report queries are written): built once,
+# read-only (MappingProxyType rows in tuples) and shared by every report
+def _frozen_rows(*rows: Dict) -> Tuple[Mapping, ...]:
+    return tuple(MappingProxyType(row) for row in rows)
+
+_MOCK_SUMMARY = MappingProxyType({
+    'total_items_start': 1420,
+    'total_items_end': 1385,
+    'total_movements': 156,
+    'entries': 45,
+    'exits': 111,
+    'withdrawals_processed': 23,
+    'critical_alerts': 3,
+    'ai_detections': 892
+})
+
+_MOCK_COUNTRIES = _frozen_rows(
+    {'country': 'Côte d\'Ivoire', 'withdrawals': 8, 'quantity': 125},
+    {'country': 'Mali', 'withdrawals': 5, 'quantity': 78},
+    {'country': 'Burkina Faso', 'withdrawals': 4, 'quantity': 62},
+    {'country': 'Sénégal', 'withdrawals': 3, 'quantity': 45},
+    {'country': 'Gabon', 'withdrawals': 2, 'quantity': 28},
+    {'country': 'Cameroun', 'withdrawals': 1, 'quantity': 15}
+)
+
+_MOCK_CATEGORIES = _frozen_rows(
+    {'category': 'RAM', 'quantity': 450, 'withdrawals': 85},
+    {'category': 'Desktop Computers', 'quantity': 320, 'withdrawals': 42},
+    {'category': 'Laptops', 'quantity': 215, 'withdrawals': 28},
+    {'category': 'Air Conditioners', 'quantity': 180, 'withdrawals': 15},
+    {'category': 'Printers', 'quantity': 120, 'withdrawals': 12},
+    {'category': 'Network Equipment', 'quantity': 100, 'withdrawals': 8}
+)
+
+_MOCK_WITHDRAWALS = _frozen_rows(
+    {
+        'id': 'WD-0012',
+        'date': '2026-02-13',
+        'country': 'Côte d\'Ivoire',
+        'equipment': 'RAM DDR4 8GB',
+        'quantity': 50,
+        'status': 'Completed'
+    },
+    {
+        'id': 'WD-0013',
+        'date': '2026-02-12',
+        'country': 'Mali',
+        'equipment': 'Desktop Computer',
+        'quantity': 10,
+        'status': 'In Transit'
+    }
+)
+
+_MOCK_AI_METRICS = MappingProxyType({
+    'total_detections': 892,
+    'average_confidence': 0.91,
+    'counting_accuracy': 0.89,
+    'false_positives': 12,
+    'missed_detections': 8
+})
+
+_MOCK_ALERTS = _frozen_rows(
+    {
+        'date': '2026-02-11',
+        'type': 'Stock Discrepancy',
+        'severity': 'Medium',
+        'description': 'RAM count mismatch: Declared 100, Detected 98',
+        'resolved': True
+    },
+    {
+        'date': '2026-02-10',
+        'type': 'Unauthorized Movement',
+        'severity': 'High',
+        'description': 'Equipment detected in restricted zone',
+        'resolved': False
+    }
+)
+
+
+# export_to_csv sheet name -> records (list of dicts) of that sheet
+_CSV_EXTRACTORS = {
+    'summary': lambda data: [data['summary']],
+    'by_country': lambda data: data['by_country'],
+    'by_category': lambda data: data['by_category'],
+    'withdrawals': lambda data: data['withdrawals'],
+    'alerts': lambda data: data['alerts'],
+}
+
+
 class ReportService:
     """
     Service for generating comprehensive stock reports.
@@ -28,8 +148,12 @@ class ReportService:
     - Scheduled automatic generation
     """
     
+    # The default (last 7 days) report is reused by the JSON and export endpoints
+    REPORT_CACHE_TTL_SEC = 60
+    
     def __init__(self, db_session=None):
         self.db = db_session
+        self._default_report = None  # (report_data, expires_at)
     
     def generate_weekly_report(
         self,
@@ -44,8 +168,24 @@ class ReportService:
             end_date: Report end date (default: today)
             
         Returns:
-            Dictionary with report data and metadata
+            Dictionary with report data and metadata (treat as read-only:
+            the default-range report is shared for REPORT_CACHE_TTL_SEC)
         """
+        if start_date is None and end_date is None:
+            cached = self._default_report
+            now = time.monotonic()
+            if cached is not None and cached[1] > now:
+                return cached[0]
+            report_data = self._build_weekly_report(None, None)
+            self._default_report = (report_data, now + self.REPORT_CACHE_TTL_SEC)
+            return report_data
+        return self._build_weekly_report(start_date, end_date)
+    
+    def _build_weekly_report(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime]
+    ) -> Dict:
         if not start_date:
             start_date = datetime.now() - timedelta(days=7)
         if not end_date:
@@ -71,96 +211,33 @@ class ReportService:
         
         return report_data
     
-    def _generate_summary(self, start_date: datetime, end_date: datetime) -> Dict:
+    # The _generate_* methods return the read-only module constants below
+    # until they query the database (callers must not mutate the result)
+    def _generate_summary(self, start_date: datetime, end_date: datetime) -> Mapping:
         """Generate summary statistics"""
         # TODO: Replace with actual database queries
-        return {
-            'total_items_start': 1420,
-            'total_items_end': 1385,
-            'total_movements': 156,
-            'entries': 45,
-            'exits': 111,
-            'withdrawals_processed': 23,
-            'critical_alerts': 3,
-            'ai_detections': 892
-        }
+        return _MOCK_SUMMARY
     
-    def _generate_country_breakdown(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def _generate_country_breakdown(self, start_date: datetime, end_date: datetime) -> Sequence[Mapping]:
         """Generate withdrawals breakdown by country"""
         # Mock data - replace with actual queries
-        countries = [
-            {'country': 'Côte d\'Ivoire', 'withdrawals': 8, 'quantity': 125},
-            {'country': 'Mali', 'withdrawals': 5, 'quantity': 78},
-            {'country': 'Burkina Faso', 'withdrawals': 4, 'quantity': 62},
-            {'country': 'Sénégal', 'withdrawals': 3, 'quantity': 45},
-            {'country': 'Gabon', 'withdrawals': 2, 'quantity': 28},
-            {'country': 'Cameroun', 'withdrawals': 1, 'quantity': 15}
-        ]
-        return countries
+        return _MOCK_COUNTRIES
     
-    def _generate_category_breakdown(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def _generate_category_breakdown(self, start_date: datetime, end_date: datetime) -> Sequence[Mapping]:
         """Generate stock distribution by category"""
-        categories = [
-            {'category': 'RAM', 'quantity': 450, 'withdrawals': 85},
-            {'category': 'Desktop Computers', 'quantity': 320, 'withdrawals': 42},
-            {'category': 'Laptops', 'quantity': 215, 'withdrawals': 28},
-            {'category': 'Air Conditioners', 'quantity': 180, 'withdrawals': 15},
-            {'category': 'Printers', 'quantity': 120, 'withdrawals': 12},
-            {'category': 'Network Equipment', 'quantity': 100, 'withdrawals': 8}
-        ]
-        return categories
+        return _MOCK_CATEGORIES
     
-    def _generate_withdrawals_data(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def _generate_withdrawals_data(self, start_date: datetime, end_date: datetime) -> Sequence[Mapping]:
         """Generate detailed withdrawals data"""
-        withdrawals = [
-            {
-                'id': 'WD-0012',
-                'date': '2026-02-13',
-                'country': 'Côte d\'Ivoire',
-                'equipment': 'RAM DDR4 8GB',
-                'quantity': 50,
-                'status': 'Completed'
-            },
-            {
-                'id': 'WD-0013',
-                'date': '2026-02-12',
-                'country': 'Mali',
-                'equipment': 'Desktop Computer',
-                'quantity': 10,
-                'status': 'In Transit'
-            }
-        ]
-        return withdrawals
+        return _MOCK_WITHDRAWALS
     
-    def _generate_ai_metrics(self, start_date: datetime, end_date: datetime) -> Dict:
+    def _generate_ai_metrics(self, start_date: datetime, end_date: datetime) -> Mapping:
         """Generate AI detection metrics"""
-        return {
-            'total_detections': 892,
-            'average_confidence': 0.91,
-            'counting_accuracy': 0.89,
-            'false_positives': 12,
-            'missed_detections': 8
-        }
+        return _MOCK_AI_METRICS
     
-    def _generate_alerts_data(self, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def _generate_alerts_data(self, start_date: datetime, end_date: datetime) -> Sequence[Mapping]:
         """Generate alerts/anomalies data"""
-        alerts = [
-            {
-                'date': '2026-02-11',
-                'type': 'Stock Discrepancy',
-                'severity': 'Medium',
-                'description': 'RAM count mismatch: Declared 100, Detected 98',
-                'resolved': True
-            },
-            {
-                'date': '2026-02-10',
-                'type': 'Unauthorized Movement',
-                'severity': 'High',
-                'description': 'Equipment detected in restricted zone',
-                'resolved': False
-            }
-        ]
-        return alerts
+        return _MOCK_ALERTS
     
     def export_to_excel(
         self,
@@ -181,51 +258,59 @@ class ReportService:
             date_str = datetime.now().strftime('%Y-%m-%d')
             filename = f'ASECNA_Weekly_Report_{date_str}.xlsx'
         
-        wb = Workbook()
-        
-        # Remove default sheet
-        wb.remove(wb.active)
+        # Write-only workbook: rows are streamed to the sheet XML as they are
+        # appended instead of keeping a Cell object per cell in memory
+        wb = _excel().Workbook(write_only=True)
         
         # 1. Summary Sheet
-        ws_summary = wb.create_sheet('Summary')
-        self._create_summary_sheet(ws_summary, report_data)
+        self._create_summary_sheet(wb.create_sheet('Summary'), report_data)
         
         # 2. By Country Sheet
-        ws_country = wb.create_sheet('By Country')
-        self._create_country_sheet(ws_country, report_data['by_country'])
+        self._create_country_sheet(wb.create_sheet('By Country'), report_data['by_country'])
         
         # 3. By Category Sheet
-        ws_category = wb.create_sheet('By Category')
-        self._create_category_sheet(ws_category, report_data['by_category'])
+        self._create_category_sheet(wb.create_sheet('By Category'), report_data['by_category'])
         
         # 4. Withdrawals Sheet
-        ws_withdrawals = wb.create_sheet('Withdrawals')
-        self._create_withdrawals_sheet(ws_withdrawals, report_data['withdrawals'])
+        self._create_withdrawals_sheet(wb.create_sheet('Withdrawals'), report_data['withdrawals'])
         
         # 5. Alerts Sheet
-        ws_alerts = wb.create_sheet('Alerts')
-        self._create_alerts_sheet(ws_alerts, report_data['alerts'])
+        self._create_alerts_sheet(wb.create_sheet('Alerts'), report_data['alerts'])
         
         # Save to bytes
         excel_buffer = io.BytesIO()
         wb.save(excel_buffer)
-        excel_buffer.seek(0)
         
         logger.info(f"Excel report generated: {filename}")
         return excel_buffer.getvalue()
     
+    @staticmethod
+    def _styled(ws, value, font=None, fill=None):
+        cell = _excel().WriteOnlyCell(ws, value=value)
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        return cell
+    
+    def _append_header(self, ws, headers, fill=None):
+        bold = _excel().bold_font
+        ws.append([self._styled(ws, header, bold, fill) for header in headers])
+    
     def _create_summary_sheet(self, ws, report_data):
         """Create summary sheet with key metrics"""
-        # Header
-        ws['A1'] = 'ASECNA Stock Management - Weekly Report'
-        ws['A1'].font = Font(size=16, bold=True)
+        # Column widths must be set before the first row in write-only mode
+        ws.column_dimensions['A'].width = 30
+        ws.column_dimensions['B'].width = 15
         
-        ws['A2'] = f"Period: {report_data['metadata']['start_date']} to {report_data['metadata']['end_date']}"
-        ws['A3'] = f"Generated: {report_data['metadata']['generated_at']}"
+        # Header (rows 1-3, metrics start on row 5)
+        ws.append([self._styled(ws, 'ASECNA Stock Management - Weekly Report', _excel().title_font)])
+        ws.append([f"Period: {report_data['metadata']['start_date']} to {report_data['metadata']['end_date']}"])
+        ws.append([f"Generated: {report_data['metadata']['generated_at']}"])
+        ws.append([])
         
         # Metrics
         summary = report_data['summary']
-        row = 5
         metrics = [
             ('Total Items (Start)', summary['total_items_start']),
             ('Total Items (End)', summary['total_items_end']),
@@ -237,25 +322,13 @@ class ReportService:
             ('AI Detections', summary['ai_detections'])
         ]
         
+        bold = _excel().bold_font
         for label, value in metrics:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            ws[f'A{row}'].font = Font(bold=True)
-            row += 1
-        
-        # Auto-adjust column width
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 15
+            ws.append([self._styled(ws, label, bold), value])
     
     def _create_country_sheet(self, ws, data):
         """Create country breakdown sheet"""
-        headers = ['Country', 'Withdrawals', 'Total Quantity']
-        ws.append(headers)
-        
-        # Style header
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color='137fec', end_color='137fec', fill_type='solid')
+        self._append_header(ws, ['Country', 'Withdrawals', 'Total Quantity'], _excel().header_blue)
         
         # Data rows
         for item in data:
@@ -263,23 +336,14 @@ class ReportService:
     
     def _create_category_sheet(self, ws, data):
         """Create category breakdown sheet"""
-        headers = ['Category', 'Current Stock', 'Withdrawals']
-        ws.append(headers)
-        
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color='10b981', end_color='10b981', fill_type='solid')
+        self._append_header(ws, ['Category', 'Current Stock', 'Withdrawals'], _excel().header_green)
         
         for item in data:
             ws.append([item['category'], item['quantity'], item['withdrawals']])
     
     def _create_withdrawals_sheet(self, ws, data):
         """Create withdrawals detail sheet"""
-        headers = ['Request ID', 'Date', 'Country', 'Equipment', 'Quantity', 'Status']
-        ws.append(headers)
-        
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
+        self._append_header(ws, ['Request ID', 'Date', 'Country', 'Equipment', 'Quantity', 'Status'])
         
         for item in data:
             ws.append([
@@ -293,12 +357,7 @@ class ReportService:
     
     def _create_alerts_sheet(self, ws, data):
         """Create alerts/anomalies sheet"""
-        headers = ['Date', 'Type', 'Severity', 'Description', 'Resolved']
-        ws.append(headers)
-        
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.fill = PatternFill(start_color='f59e0b', end_color='f59e0b', fill_type='solid')
+        self._append_header(ws, ['Date', 'Type', 'Severity', 'Description', 'Resolved'], _excel().header_amber)
         
         for item in data:
             ws.append([
@@ -324,33 +383,32 @@ class ReportService:
         Returns:
             CSV file as bytes
         """
-        if sheet_name == 'summary':
-            df = pd.DataFrame([report_data['summary']])
-        elif sheet_name == 'by_country':
-            df = pd.DataFrame(report_data['by_country'])
-        elif sheet_name == 'by_category':
-            df = pd.DataFrame(report_data['by_category'])
-        elif sheet_name == 'withdrawals':
-            df = pd.DataFrame(report_data['withdrawals'])
-        elif sheet_name == 'alerts':
-            df = pd.DataFrame(report_data['alerts'])
-        else:
+        extractor = _CSV_EXTRACTORS.get(sheet_name)
+        if extractor is None:
             raise ValueError(f"Unknown sheet name: {sheet_name}")
+        records = extractor(report_data)
         
+        # Columns = keys in first-seen order, missing values left empty
+        # (same output as DataFrame(records).to_csv(index=False))
+        headers = list(dict.fromkeys(key for record in records for key in record))
         csv_buffer = io.StringIO()
-        df.to_csv(csv_buffer, index=False)
-        csv_buffer.seek(0)
+        writer = csv.writer(csv_buffer, lineterminator='\n')
+        writer.writerow(headers)
+        writer.writerows([record.get(key) for key in headers] for record in records)
         
         return csv_buffer.getvalue().encode('utf-8')
 
 
 # Singleton instance
 _report_service = None
+_report_service_lock = threading.Lock()
 
 
 def get_report_service(db_session=None):
     """Get or create the global report service instance"""
     global _report_service
     if _report_service is None:
-        _report_service = ReportService(db_session)
+        with _report_service_lock:
+            if _report_service is None:
+                _report_service = ReportService(db_session)
     return _report_service
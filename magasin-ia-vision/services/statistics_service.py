@@ -1,11 +1,28 @@
-from sqlalchemy import func
+from sqlalchemy import bindparam, case, func, select
 from sqlalchemy.orm import Session
-from data.models import MovementHistory, EquipmentItem, EquipmentType, Alert
+from data.models import MovementHistory, EquipmentItem, EquipmentType, EquipmentStatus, Alert
 from data.database import get_db
+from services.stats_cache import StatsCache
+from config.settings import settings
 import datetime
+import time
 import csv
 import os
 
+_items = EquipmentItem.__table__
+_history = MovementHistory.__table__
+
+# Dashboard top-used query, built once (only the limit is bound per call).
+# Grouped on the indexed movement_history.item_id join column
+_movement_count = func.count(_history.c.id)
+_SELECT_TOP_USED = (
+    select(_items.c.unique_ref, _movement_count.label('count'))
+    .join_from(_items, _history, _history.c.item_id == _items.c.id)
+    .group_by(_items.c.id)
+    .order_by(_movement_count.desc())
+    .limit(bindparam("limit"))
+)
+
 class StatisticsService:
     def __init__(self, db: Session = None):
         if db:
@@ -13,40 +30,68 @@ class StatisticsService:
         else:
             self.db_gen = get_db()
             self.db = next(self.db_gen)
+        # KPI cache: key -> (value, expires_at)
+        self._cache = {}
+
+    def _cached(self, key, compute):
+        """Return the cached value of `key`, recomputing it once the TTL is over"""
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        value = compute()
+        self._cache[key] = (value, now + settings.STATS_CACHE_TTL_SEC)
+        return value
+
+    def invalidate_cache(self):
+        self._cache.clear()
 
     def get_todays_movements_count(self):
-        today = datetime.date.today()
-        return self.db.query(MovementHistory).filter(func.date(MovementHistory.timestamp) == today).count()
+        return self._cached("movements_today", self._count_todays_movements)
+
+    def _count_todays_movements(self):
+        # Range on the raw column (index friendly) instead of DATE(timestamp) = today
+        start = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+        end = start + datetime.timedelta(days=1)
+        return self.db.query(func.count(MovementHistory.id)).filter(
+            MovementHistory.timestamp >= start,
+            MovementHistory.timestamp < end
+        ).scalar()
 
     def get_top_used_items(self, limit=5):
         """
         Returns items with most movements.
         """
-        return self.db.query(
-            EquipmentItem.unique_ref, 
-            func.count(MovementHistory.id).label('count')
-        ).join(MovementHistory).group_by(EquipmentItem.id).order_by(func.count(MovementHistory.id).desc()).limit(limit).all()
+        return self._cached(f"top_used:{limit}", lambda: self.db.execute(_SELECT_TOP_USED, {"limit": limit}).all())
 
     def export_movements_csv(self, filepath):
         """
         Export full movement history to CSV.
+        Rows are streamed (projected columns, fetched by chunks) and written
+        as they come, so memory stays flat whatever the history size.
         """
-        movements = self.db.query(MovementHistory).order_by(MovementHistory.timestamp.desc()).all()
+        query = select(
+            MovementHistory.id,
+            EquipmentItem.unique_ref,
+            MovementHistory.from_zone_id,
+            MovementHistory.to_zone_id,
+            MovementHistory.timestamp
+        ).outerjoin(EquipmentItem, MovementHistory.item_id == EquipmentItem.id).order_by(
+            MovementHistory.timestamp.desc()
+        ).execution_options(stream_results=True, yield_per=10000)
         
         try:
-            with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['ID', 'Item Ref', 'From Zone', 'To Zone', 'Timestamp']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-                writer.writeheader()
-                for mov in movements:
-                    writer.writerow({
-                        'ID': mov.id,
-                        'Item Ref': mov.item.unique_ref if mov.item else 'Unknown',
-                        'From Zone': mov.from_zone_id,
-                        'To Zone': mov.to_zone_id,
-                        'Timestamp': mov.timestamp.isoformat()
-                    })
+            # plain tuples, server-side cursor where supported (closed even on error)
+            with self.db.execute(query) as rows, \
+                    open(filepath, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['ID', 'Item Ref', 'From Zone', 'To Zone', 'Timestamp'])
+                # Generator consumed by writerows (C loop), one fetch batch in memory
+                writer.writerows(
+                    (mov_id, unique_ref or 'Unknown', from_zone, to_zone,
+                     timestamp.isoformat() if timestamp else '')
+                    for mov_id, unique_ref, from_zone, to_zone, timestamp in rows
+                )
             return True
         except Exception as e:
             return False
@@ -55,26 +100,64 @@ class StatisticsService:
         """
         Returns real statistics for the inventory dashboard.
         """
-        total = self.db.query(EquipmentItem).count()
-        active = self.db.query(EquipmentItem).filter(EquipmentItem.status != 'missing').count()
-        critical = self.db.query(Alert).filter(Alert.is_acknowledged == False).count()
+        return self._cached("inventory_stats", self._compute_inventory_stats)
+
+    def _compute_inventory_stats(self):
+        # Whole dashboard in one round trip: conditional counts over the items
+        # plus two uncorrelated scalar subqueries (alerts, low stock types)
+        critical_q = (
+            select(func.count(Alert.id))
+            .where(Alert.is_acknowledged == False)
+            .scalar_subquery()
+        )
+        # Low stock: types whose item count is below their alert_threshold
+        per_type = (
+            select(EquipmentType.id)
+            .outerjoin(EquipmentItem, EquipmentItem.type_id == EquipmentType.id)
+            .group_by(EquipmentType.id, EquipmentType.alert_threshold)
+            .having(func.count(EquipmentItem.id) < EquipmentType.alert_threshold)
+            .subquery()
+        )
+        low_stock_q = select(func.count()).select_from(per_type).correlate(None).scalar_subquery()
         
-        # Low stock based on declared vs detected or alert thresholds
-        # For now, let's use EquipmentType alert_threshold
-        low_stock = 0
-        from data.models import EquipmentType
-        types = self.db.query(EquipmentType).all()
-        for t in types:
-            count = self.db.query(EquipmentItem).filter(EquipmentItem.type_id == t.id).count()
-            if count < t.alert_threshold:
-                low_stock += 1
+        total, with_status, in_use, missing, critical, low_stock = self.db.execute(
+            select(
+                func.count(EquipmentItem.id),
+                func.count(EquipmentItem.status),
+                func.count(case((EquipmentItem.status == EquipmentStatus.IN_USE, 1))),
+                func.count(case((EquipmentItem.status == EquipmentStatus.MISSING, 1))),
+                critical_q,
+                low_stock_q
+            ).select_from(EquipmentItem)
+        ).one()
+        active = with_status - missing
 
         return {
             "total_equipment": total,
             "active_equipment": active,
             "critical_alerts": critical,
-            "low_stock_warnings": low_stock
+            "low_stock_warnings": low_stock,
+            "in_use_equipment": in_use,
+            "missing_equipment": missing
+        }
+
+    def precompute_all(self):
+        """
+        Compute every dashboard KPI and store it in the persistent stats cache.
+        Meant to run off the GUI thread (periodic job / stale cache).
+        """
+        stats = self._compute_inventory_stats()
+        kpis = {
+            "kpi:total_equipment": stats["total_equipment"],
+            "kpi:in_use": stats["in_use_equipment"],
+            "kpi:missing": stats["missing_equipment"],
+            "kpi:alerts_active": stats["critical_alerts"],
+            "kpi:low_stock": stats["low_stock_warnings"],
+            "kpi:movements_today": self._count_todays_movements()
         }
+        StatsCache(self.db).set_many(kpis)
+        self.invalidate_cache()
+        return kpis
 
     def close(self):
         self.db.close()
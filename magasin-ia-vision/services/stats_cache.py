@@ -0,0 +1,58 @@
+from sqlalchemy.orm import Session
+from data.models import KVCache
+from data.database import get_db
+import datetime
+import json
+
+_table_ready = False
+
+class StatsCache:
+    """
+    Persistent key/value cache for precomputed statistics (kv_cache table).
+    Values survive restarts, so the dashboard has numbers to show before
+    the first computation is done.
+    """
+    def __init__(self, db: Session = None):
+        if db:
+            self.db = db
+        else:
+            self.db_gen = get_db()
+            self.db = next(self.db_gen)
+        self._ensure_table()
+
+    def _ensure_table(self):
+        # The desktop app does not run init_db: create the table on first use
+        global _table_ready
+        if not _table_ready:
+            KVCache.__table__.create(bind=self.db.get_bind(), checkfirst=True)
+            _table_ready = True
+
+    def get_many(self, keys):
+        """
+        Returns ({key: value}, oldest updated_at) for the keys present.
+        updated_at is None when a key is missing.
+        """
+        rows = self.db.query(KVCache.key, KVCache.value, KVCache.updated_at).filter(KVCache.key.in_(keys)).all()
+        values = {key: json.loads(value) for key, value, _ in rows}
+        oldest = min((updated_at for _, _, updated_at in rows), default=None)
+        if len(values) < len(keys):
+            oldest = None
+        return values, oldest
+
+    def set_many(self, values):
+        """Upsert all values in one transaction."""
+        now = datetime.datetime.now()
+        try:
+            for key, value in values.items():
+                self.db.merge(KVCache(key=key, value=json.dumps(value), updated_at=now))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    @staticmethod
+    def is_fresh(updated_at, max_age_sec):
+        return updated_at is not None and (datetime.datetime.now() - updated_at).total_seconds() < max_age_sec
+
+    def close(self):
+        self.db.close()
@@ -3,59 +3,128 @@ Validation Service for ASECNA Stock Management
 Handles the persistence of validation requests and admin approvals in the database.
 """
 
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional, Dict
+from itertools import groupby
+from typing import Iterable, List, Optional, Dict, Tuple
+from sqlalchemy import and_, bindparam, insert, select, update
 from sqlalchemy.orm import Session
 from data.database import SessionLocal
-from data.models import ValidationRequest, TemporalTracking, DetectionEvent, User, TrackingStatus
+from data.models import (
+    ValidationRequest, TemporalTracking, DetectionEvent, User, TrackingStatus,
+    EquipmentItem, EquipmentType, Zone
+)
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
+# Hot lookups built once: each call only binds parameters (the compiled SQL
+# is then found in the engine's statement cache without rebuilding the query)
+_SELECT_PENDING = select(ValidationRequest).where(ValidationRequest.status == "pending")
+_SELECT_PENDING_BY_CODE = _SELECT_PENDING.where(ValidationRequest.validation_code == bindparam("code"))
+
+# Pending requests with their equipment type, zone (first camera) and item.
+# Ordered so that the first row of a request is the one to use
+_SELECT_APPROVAL_TARGETS = select(
+    ValidationRequest, EquipmentType.id, Zone.id, Zone.name, EquipmentItem.id
+).outerjoin(
+    EquipmentType, EquipmentType.name == ValidationRequest.object_type
+).outerjoin(
+    Zone, Zone.camera_id == ValidationRequest.camera_ids[0].as_string()
+).outerjoin(
+    EquipmentItem, and_(
+        EquipmentItem.type_id == EquipmentType.id,
+        EquipmentItem.current_zone_id == Zone.id
+    )
+).where(
+    ValidationRequest.validation_code.in_(bindparam("codes", expanding=True)),
+    ValidationRequest.status == "pending"
+).order_by(ValidationRequest.id, Zone.id, EquipmentItem.id)
+
 class ValidationService:
     """
     Handles persistence logic for stock validation requests.
     """
     
     def __init__(self, db: Optional[Session] = None):
+        # Caller-owned session, or None: the calling thread's SessionLocal
+        # session, so the shared service never hands one session (and its
+        # connection) to several threads
         self._db = db
-        self._db_owned = False
         
     @property
     def db(self) -> Session:
-        if self._db is None:
-            self._db = SessionLocal()
-            self._db_owned = True
-        return self._db
-        
-    def __del__(self):
-        if self._db_owned and self._db:
-            self._db.close()
+        if self._db is not None:
+            return self._db
+        return SessionLocal()
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        One transaction for several calls (e.g. an admin bulk action): the
+        create/approve/reject/sync methods called inside only flush, the
+        block commits once on exit and rolls back everything on error
+        (their own errors then propagate instead of returning False).
+        Nested blocks join the outer one.
+        """
+        db = self.db
+        depth = db.info.get("uow_depth", 0)
+        db.info["uow_depth"] = depth + 1
+        try:
+            yield db
+            if depth == 0:
+                db.commit()
+        except Exception:
+            if depth == 0:
+                db.rollback()
+            raise
+        finally:
+            db.info["uow_depth"] = depth
+
+    def _in_unit_of_work(self) -> bool:
+        return self.db.info.get("uow_depth", 0) > 0
+
+    def _commit(self):
+        if self._in_unit_of_work():
+            self.db.flush()  # committed by unit_of_work()
+        else:
+            self.db.commit()
+
+    def _rollback(self):
+        """Called from an except block: inside a unit of work, re-raise so the whole unit rolls back"""
+        if self._in_unit_of_work():
+            raise
+        self.db.rollback()
+
+    def _add_request(self, data: Dict) -> ValidationRequest:
+        request = ValidationRequest(
+            validation_code=data['id'],
+            object_type=data['object_type'],
+            camera_ids=data['camera_ids'],
+            quantity_delta=data['quantity_delta'],
+            current_quantity=data['current_quantity'],
+            proposed_quantity=data['proposed_quantity'],
+            avg_confidence=data['avg_confidence'],
+            detection_duration_minutes=data['detection_duration_minutes'],
+            status="pending",
+            created_at=datetime.now()
+        )
+        self.db.add(request)
+        return request
 
     def create_request(self, data: Dict) -> ValidationRequest:
         """
         Create a new validation request in the database.
         """
         try:
-            request = ValidationRequest(
-                validation_code=data['id'],
-                object_type=data['object_type'],
-                camera_ids=data['camera_ids'],
-                quantity_delta=data['quantity_delta'],
-                current_quantity=data['current_quantity'],
-                proposed_quantity=data['proposed_quantity'],
-                avg_confidence=data['avg_confidence'],
-                detection_duration_minutes=data['detection_duration_minutes'],
-                status="pending",
-                created_at=datetime.now()
-            )
-            self.db.add(request)
-            self.db.commit()
+            request = self._add_request(data)
+            self._commit()
             self.db.refresh(request)
             logger.info(f"Persistent validation request created: {request.validation_code}")
             return request
         except Exception as e:
-            self.db.rollback()
+            self._rollback()
             logger.error(f"Failed to create persistent validation request: {e}")
             raise
 
@@ -63,101 +132,184 @@ class ValidationService:
         """
         Retrieve all pending validation requests.
         """
-        return self.db.query(ValidationRequest).filter(ValidationRequest.status == "pending").all()
+        return self.db.scalars(_SELECT_PENDING).all()
+
+    def _apply_approval(self, validation_code: str, admin_id: int) -> bool:
+        """Approve + update stock without committing (False if nothing to do)"""
+        return self._apply_approvals([(validation_code, admin_id)]) == 1
+
+    def _apply_approvals(self, approvals: Iterable[Tuple[str, int]]) -> int:
+        """
+        Approve (validation_code, admin_id) pairs and update stock without
+        committing, with a fixed number of statements whatever the batch size:
+        requests are read with their equipment type, zone and item in one
+        joined query, then items are written with one executemany UPDATE and
+        one INSERT.
+        Returns the number of requests approved.
+        """
+        admins = {}
+        for validation_code, admin_id in approvals:
+            admins.setdefault(validation_code, admin_id)
+        if not admins:
+            return 0
+
+        # For each camera involved, find the zone and update/create items
+        # Simplified logic: Update the first zone found for these cameras
+        rows = self.db.execute(_SELECT_APPROVAL_TARGETS, {"codes": list(admins)}).all()
+
+        targets = {}  # request -> (type id, zone id, zone name, item id)
+        for request, *target in rows:
+            targets.setdefault(request, target)
+        found = {request.validation_code for request in targets}
+        for validation_code in admins:
+            if validation_code not in found:
+                logger.warning(f"Pending validation request not found: {validation_code}")
+        # Apply in the caller's order: a later approval for the same zone wins
+        order = {validation_code: index for index, validation_code in enumerate(admins)}
+        requests = sorted(targets, key=lambda request: order[request.validation_code])
+
+        # One timestamp for the whole batch (validation, counts and new refs agree)
+        now = datetime.now()
+        ref_suffix = now.strftime('%H%M%S%f')
+        to_update = {}  # item id -> row
+        to_insert = {}  # (type id, zone id) -> row
+        approved = 0
+        for request in requests:
+            type_id, zone_id, zone_name, item_id = targets[request]
+            if type_id is None:
+                # Request left pending: a commit must not persist a half-applied approval
+                logger.error(f"Equipment type {request.object_type} not found for validation")
+                continue
+
+            request.status = "approved"
+            request.validated_at = now
+            request.validated_by = admins[request.validation_code]
+            approved += 1
+
+            if zone_id is None:
+                continue
+            counts = {
+                "declared_quantity": request.proposed_quantity,
+                "detected_quantity": request.proposed_quantity,
+                "last_count_timestamp": now,
+                "counting_confidence": request.avg_confidence
+            }
+            if item_id is not None:
+                to_update[item_id] = {"id": item_id, **counts}
+            else:
+                # Create new item record for this type in this zone
+                to_insert[(type_id, zone_id)] = {
+                    "unique_ref": f"{request.object_type.upper()}-{zone_name.upper()}-{ref_suffix}",
+                    "type_id": type_id,
+                    "current_zone_id": zone_id,
+                    **counts
+                }
+
+        # ORM bulk statements: UPDATE by primary key / INSERT, each one executemany
+        if to_update:
+            self.db.execute(update(EquipmentItem), list(to_update.values()))
+        if to_insert:
+            self.db.execute(insert(EquipmentItem), list(to_insert.values()))
+        return approved
 
     def approve_request(self, validation_code: str, admin_id: int) -> bool:
         """
         Approve a validation request and update stock.
         """
         try:
-            request = self.db.query(ValidationRequest).filter(
-                ValidationRequest.validation_code == validation_code,
-                ValidationRequest.status == "pending"
-            ).first()
-            
-            if not request:
-                logger.warning(f"Pending validation request not found: {validation_code}")
-                return False
-                
-            request.status = "approved"
-            request.validated_at = datetime.now()
-            request.validated_by = admin_id
-            
-            # Update equipment_items quantity
-            from data.models import EquipmentItem, EquipmentType, Zone
-            
-            # Find the equipment type
-            eq_type = self.db.query(EquipmentType).filter(EquipmentType.name == request.object_type).first()
-            if not eq_type:
-                logger.error(f"Equipment type {request.object_type} not found for validation")
+            if not self._apply_approval(validation_code, admin_id):
                 return False
-                
-            # For each camera involved, find the zone and update/create items
-            # Simplified logic: Update the first zone found for these cameras
-            camera_id = request.camera_ids[0] if isinstance(request.camera_ids, list) and request.camera_ids else str(request.camera_ids)
-            zone = self.db.query(Zone).filter(Zone.camera_id == camera_id).first()
-            
-            if zone:
-                # Update declared quantity for items of this type in this zone
-                # Note: In this simplified model, we might have multiple items or one aggregate
-                item = self.db.query(EquipmentItem).filter(
-                    EquipmentItem.type_id == eq_type.id,
-                    EquipmentItem.current_zone_id == zone.id
-                ).first()
-                
-                if item:
-                    item.declared_quantity = request.proposed_quantity
-                    item.detected_quantity = request.proposed_quantity
-                    item.last_count_timestamp = datetime.now()
-                    item.counting_confidence = request.avg_confidence
-                else:
-                    # Create new item record for this type in this zone
-                    new_item = EquipmentItem(
-                        unique_ref=f"{eq_type.name.upper()}-{zone.name.upper()}-{datetime.now().strftime('%H%M%S')}",
-                        type_id=eq_type.id,
-                        current_zone_id=zone.id,
-                        declared_quantity=request.proposed_quantity,
-                        detected_quantity=request.proposed_quantity,
-                        last_count_timestamp=datetime.now(),
-                        counting_confidence=request.avg_confidence
-                    )
-                    self.db.add(new_item)
-            
-            self.db.commit()
+            self._commit()
             logger.info(f"Validation request {validation_code} approved and stock updated in DB")
             return True
         except Exception as e:
-            self.db.rollback()
+            self._rollback()
             logger.error(f"Failed to approve validation request in DB: {e}")
             return False
 
+    def approve_requests_bulk(self, validation_codes: List[str], admin_id: int) -> int:
+        """
+        Approve several validation requests and update stock in one transaction.
+        
+        Returns:
+            Number of requests approved (0 if the transaction failed)
+        """
+        try:
+            approved = self._apply_approvals((code, admin_id) for code in validation_codes)
+            self._commit()
+            logger.info(f"{approved}/{len(validation_codes)} validation requests approved and stock updated in DB")
+            return approved
+        except Exception as e:
+            self._rollback()
+            logger.error(f"Failed to approve validation requests in DB: {e}")
+            return 0
+
+    def _apply_rejection(self, validation_code: str, admin_id: int, reason: str) -> bool:
+        """Reject without committing (False if the request is not pending)"""
+        request = self.db.scalars(_SELECT_PENDING_BY_CODE, {"code": validation_code}).first()
+        
+        if not request:
+            logger.warning(f"Pending validation request not found: {validation_code}")
+            return False
+            
+        request.status = "rejected"
+        request.validated_at = datetime.now()
+        request.validated_by = admin_id
+        request.rejection_reason = reason
+        return True
+
     def reject_request(self, validation_code: str, admin_id: int, reason: str) -> bool:
         """
         Reject a validation request.
         """
         try:
-            request = self.db.query(ValidationRequest).filter(
-                ValidationRequest.validation_code == validation_code,
-                ValidationRequest.status == "pending"
-            ).first()
-            
-            if not request:
-                logger.warning(f"Pending validation request not found: {validation_code}")
+            if not self._apply_rejection(validation_code, admin_id, reason):
                 return False
-                
-            request.status = "rejected"
-            request.validated_at = datetime.now()
-            request.validated_by = admin_id
-            request.rejection_reason = reason
-            
-            self.db.commit()
+            self._commit()
             logger.info(f"Validation request {validation_code} rejected in DB")
             return True
         except Exception as e:
-            self.db.rollback()
+            self._rollback()
             logger.error(f"Failed to reject validation request in DB: {e}")
             return False
 
+    def apply_batch(self, operations: List[Tuple]) -> int:
+        """
+        Persist a batch of queued validation changes in a single transaction.
+        
+        Args:
+            operations: ("create", data) / ("approve", code, admin_id) /
+                ("reject", code, admin_id, reason) tuples, in order
+            
+        Returns:
+            Number of operations applied
+        """
+        handlers = {
+            "create": self._add_request,
+            "reject": self._apply_rejection,
+        }
+        try:
+            for op, group in groupby(operations, key=lambda operation: operation[0]):
+                if op == "approve":
+                    # Consecutive approvals are applied together
+                    self._apply_approvals((code, admin_id) for _, code, admin_id in group)
+                else:
+                    for _, *args in group:
+                        handlers[op](*args)
+                # Creates must be visible to approvals later in the same batch
+                self.db.flush()
+            self._commit()
+            logger.info(f"Persisted {len(operations)} validation changes")
+            return len(operations)
+        except Exception as e:
+            self._rollback()
+            if len(operations) == 1:
+                logger.error(f"Failed to persist validation change {operations[0][0]}: {e}")
+                return 0
+            # One bad operation must not lose the whole batch: replay one by one
+            logger.warning(f"Validation batch failed ({e}), retrying operations individually")
+            return sum(self.apply_batch([operation]) for operation in operations)
+
     def sync_temporal_tracking(self, tracking_data: Dict) -> TemporalTracking:
         """
         Synchronize in-memory tracking with database.
@@ -185,20 +337,28 @@ class ValidationService:
                 tracking.detection_count = tracking_data['detection_count']
                 tracking.avg_confidence = tracking_data['avg_confidence']
                 
-            self.db.commit()
+            self._commit()
             self.db.refresh(tracking)
             return tracking
         except Exception as e:
-            self.db.rollback()
+            self._rollback()
             logger.error(f"Failed to sync temporal tracking: {e}")
             raise
 
+
 # Singleton instance
 _validation_service = None
+_validation_service_lock = threading.Lock()
 
 def get_validation_service(db: Optional[Session] = None) -> ValidationService:
-    """Get or create the global validation service instance"""
+    """
+    Get or create the global validation service instance. Without `db` it
+    works on each calling thread's own session; request handlers holding a
+    Depends(get_db) session should use ValidationService(db) instead.
+    """
     global _validation_service
     if _validation_service is None:
-        _validation_service = ValidationService(db)
+        with _validation_service_lock:
+            if _validation_service is None:
+                _validation_service = ValidationService(db)
     return _validation_service
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "allow_lazy_load: the test may trigger lazy relationship loads (known N+1 path)"
+    )
+
+
+@pytest.fixture(autouse=True)
+def no_lazy_loads(request):
+    """
+    Fail a test whose ORM code lazy-loads a relationship: one extra query
+    per object (N+1). Loads must be declared in the query (joinedload,
+    selectinload...) or the test marked allow_lazy_load.
+    """
+    lazy_loads = []
+
+    def record(orm_execute_state):
+        if not orm_execute_state.is_select:
+            return  # lazy_loaded_from raises for INSERT/UPDATE/DELETE
+        state = orm_execute_state.lazy_loaded_from
+        if state is not None:
+            lazy_loads.append(f"{state.class_.__name__}: {orm_execute_state.statement}")
+
+    event.listen(Session, "do_orm_execute", record)
+    try:
+        yield
+    finally:
+        event.remove(Session, "do_orm_execute", record)
+    if lazy_loads and request.node.get_closest_marker("allow_lazy_load") is None:
+        pytest.fail("Lazy relationship load(s) (N+1):\n" + "\n".join(lazy_loads), pytrace=False)
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import LargeBinary, create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+import init_db
+from data.models import Base, DetectionEvent, EquipmentItem, EquipmentType
+
+
+def _index_names(engine):
+    with engine.connect() as conn:
+        return set(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'magasin.sqlite'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(init_db, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def test_ensure_indexes_creates_missing_indexes(engine):
+    # Database created before the index was added to the model
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_items_status_type"))
+    tables = [EquipmentItem.__table__]
+
+    init_db.ensure_indexes(inspect(engine), tables)
+    assert "ix_items_status_type" in _index_names(engine)
+
+    # Already present: nothing to do
+    init_db.ensure_indexes(inspect(engine), tables)
+    assert "ix_items_status_type" in _index_names(engine)
+
+
+def test_ensure_indexes_skips_an_index_it_cannot_build(engine):
+    # Duplicates already stored: the unique name index cannot be created
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_equipment_types_name"))
+        conn.execute(text("DROP INDEX ix_items_status_type"))
+        conn.execute(text("INSERT INTO equipment_types (name) VALUES ('Perceuse'), ('Perceuse')"))
+
+    init_db.ensure_indexes(inspect(engine), [EquipmentType.__table__, EquipmentItem.__table__])
+
+    indexes = _index_names(engine)
+    assert "ix_equipment_types_name" not in indexes
+    assert "ix_items_status_type" in indexes
+
+
+def test_migrate_bbox_column_repacks_json_boxes(engine):
+    # Table created when bbox_coords was still a JSON column
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE detection_events DROP COLUMN bbox_coords"))
+        conn.execute(text("ALTER TABLE detection_events ADD COLUMN bbox_coords JSON"))
+        conn.execute(text(
+            "INSERT INTO detection_events (object_type, camera_id, confidence, bbox_coords) "
+            "VALUES ('souris', 'cam1', 0.9, '[1.0, 2.0, 3.0, 4.0]'), ('clavier', 'cam1', 0.8, NULL)"
+        ))
+
+    init_db.migrate_bbox_column(inspect(engine))
+
+    column = next(c for c in inspect(engine).get_columns("detection_events") if c["name"] == "bbox_coords")
+    assert isinstance(column["type"], LargeBinary)
+    with Session(engine) as session:
+        boxes = dict(session.execute(select(DetectionEvent.object_type, DetectionEvent.bbox_coords)).all())
+    assert boxes == {"souris": (1.0, 2.0, 3.0, 4.0), "clavier": None}
+
+    # Already binary: nothing to do
+    init_db.migrate_bbox_column(inspect(engine))
@@ -0,0 +1,52 @@
+import struct
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from data.models import Base, DetectionEvent, PackedBBox
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_packed_bbox_single_box():
+    bbox = PackedBBox()
+    packed = bbox.process_bind_param((1.5, 2.0, 30.25, 40.0), None)
+    assert len(packed) == 16
+    assert bbox.process_result_value(packed, None) == (1.5, 2.0, 30.25, 40.0)
+
+
+def test_packed_bbox_box_list():
+    bbox = PackedBBox()
+    boxes = [(0.0, 1.0, 2.0, 3.0), [4.0, 5.0, 6.0, 7.0]]
+    packed = bbox.process_bind_param(boxes, None)
+    assert len(packed) == 4 + 2 * 16
+    assert bbox.process_result_value(packed, None) == [(0.0, 1.0, 2.0, 3.0), (4.0, 5.0, 6.0, 7.0)]
+    assert bbox.process_result_value(bbox.process_bind_param([], None), None) == []
+
+
+def test_packed_bbox_none_and_legacy_json():
+    bbox = PackedBBox()
+    assert bbox.process_bind_param(None, None) is None
+    assert bbox.process_result_value(None, None) is None
+    assert bbox.process_result_value("[1, 2, 3, 4]", None) == [1, 2, 3, 4]
+
+
+def test_packed_bbox_database_round_trip(db):
+    db.add_all([
+        DetectionEvent(object_type="souris", camera_id="cam1", confidence=0.9, bbox_coords=(10, 20, 30, 40)),
+        DetectionEvent(object_type="clavier", camera_id="cam1", confidence=0.8, bbox_coords=None),
+    ])
+    db.commit()
+    db.expire_all()
+
+    events = {e.object_type: e for e in db.query(DetectionEvent).all()}
+    assert events["souris"].bbox_coords == (10.0, 20.0, 30.0, 40.0)
+    assert events["clavier"].bbox_coords is None
+    stored = db.execute(text("SELECT bbox_coords FROM detection_events WHERE object_type = 'souris'")).scalar()
+    assert stored == struct.pack('<4f', 10, 20, 30, 40)
@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+import pytest
+from ai.roi_filter import NO_TARGET_IDS, filter_boxes, filter_boxes_numpy, points_in_polygon
+
+# Concave ROI (U shape): exercises several edge crossings per ray
+POLYGON = np.array([[0, 0], [100, 0], [100, 100], [70, 100], [70, 30], [30, 30], [30, 100], [0, 100]], dtype=np.float64)
+
+
+def _reference_inside(points, polygon):
+    contour = polygon.astype(np.float32).reshape(-1, 1, 2)
+    return np.array([cv2.pointPolygonTest(contour, (float(x), float(y)), False) > 0 for x, y in points])
+
+
+@pytest.fixture
+def boxes():
+    rng = np.random.default_rng(0)
+    centers = rng.uniform(-20, 120, size=(500, 2))
+    half = rng.uniform(1, 10, size=(500, 2))
+    xyxy = np.hstack([centers - half, centers + half]).astype(np.float32)
+    cls_ids = rng.integers(0, 5, size=500).astype(np.int32)
+    confidences = rng.uniform(0.3, 1.0, size=500).astype(np.float32)
+    return xyxy, cls_ids, confidences
+
+
+def test_points_in_polygon_matches_reference(boxes):
+    xyxy = boxes[0].astype(np.float64)
+    centers = (xyxy[:, 0:2] + xyxy[:, 2:4]) * 0.5
+    np.testing.assert_array_equal(points_in_polygon(centers, POLYGON), _reference_inside(centers, POLYGON))
+
+
+@pytest.mark.parametrize("impl", [filter_boxes, filter_boxes_numpy], ids=["default", "numpy"])
+def test_filter_boxes_matches_reference(impl, boxes):
+    xyxy, cls_ids, confidences = boxes
+    centers = (xyxy[:, 0:2].astype(np.float64) + xyxy[:, 2:4]) * 0.5
+    inside = _reference_inside(centers, POLYGON)
+
+    keep, confidence_sum = impl(xyxy, cls_ids, confidences, POLYGON, NO_TARGET_IDS, False)
+    np.testing.assert_array_equal(keep, inside)
+    assert confidence_sum == pytest.approx(float(confidences[inside].sum()), rel=1e-5)
+
+    target_ids = np.array([1, 3], dtype=np.int32)  # sorted, as ObjectCounter builds them
+    keep, confidence_sum = impl(xyxy, cls_ids, confidences, POLYGON, target_ids, True)
+    expected = inside & np.isin(cls_ids, target_ids)
+    np.testing.assert_array_equal(keep, expected)
+    assert confidence_sum == pytest.approx(float(confidences[expected].sum()), rel=1e-5)
@@ -1,10 +1,11 @@
 import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from data.models import Base, EquipmentStatus
+from data.models import Base, EquipmentItem, EquipmentStatus, MovementHistory, ValidationRequest, Zone
 from data.repositories.equipment_repo import EquipmentRepository
 from services.alert_service import AlertService
 from services.statistics_service import StatisticsService
+from services.validation_service import ValidationService
 import datetime
 
 # Setup in-memory DB for testing
@@ -64,3 +65,64 @@ def test_statistics_service(test_db):
     top_items = stats.get_top_used_items()
     assert len(top_items) > 0
     assert top_items[0].unique_ref == "DRILL-001"
+
+@pytest.fixture
+def fresh_db():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+def _validation(code, object_type="Perceuse"):
+    return {
+        "id": code, "object_type": object_type, "camera_ids": ["cam1"],
+        "quantity_delta": 2, "current_quantity": 1, "proposed_quantity": 3,
+        "avg_confidence": 0.9, "detection_duration_minutes": 61.0
+    }
+
+def test_apply_batch_replays_operations_on_failure(fresh_db):
+    service = ValidationService(fresh_db)
+    assert service.apply_batch([("create", _validation("VAL-1"))]) == 1
+
+    # The duplicate code fails the batch: the other operations are replayed one by one
+    applied = service.apply_batch([
+        ("create", _validation("VAL-2")),
+        ("create", _validation("VAL-1")),
+        ("reject", "VAL-1", None, "faux positif"),
+    ])
+    assert applied == 2
+
+    requests = {r.validation_code: r for r in fresh_db.query(ValidationRequest).all()}
+    assert sorted(requests) == ["VAL-1", "VAL-2"]
+    assert requests["VAL-1"].status == "rejected"
+    assert requests["VAL-1"].rejection_reason == "faux positif"
+    assert requests["VAL-2"].status == "pending"
+
+def test_bulk_update_statuses(fresh_db):
+    repo = EquipmentRepository(fresh_db)
+    etype = repo.create_type("TestDrill", "Drill for testing")
+    zone_a, zone_b = Zone(name="A"), Zone(name="B")
+    fresh_db.add_all([zone_a, zone_b])
+    fresh_db.flush()
+    first = EquipmentItem(unique_ref="DRILL-001", type_id=etype.id, current_zone_id=zone_a.id)
+    second = EquipmentItem(unique_ref="DRILL-002", type_id=etype.id, current_zone_id=zone_a.id)
+    fresh_db.add_all([first, second])
+    fresh_db.commit()
+
+    updated = repo.bulk_update_statuses([
+        (first.id, EquipmentStatus.IN_USE, zone_b.id),
+        (second.id, EquipmentStatus.MISSING, None),  # zone kept
+        (9999, EquipmentStatus.IN_USE, None),  # unknown item: skipped
+    ])
+    assert updated == 2
+
+    fresh_db.expire_all()
+    items = {item.id: item for item in fresh_db.query(EquipmentItem).all()}
+    assert (items[first.id].status, items[first.id].current_zone_id) == (EquipmentStatus.IN_USE, zone_b.id)
+    assert (items[second.id].status, items[second.id].current_zone_id) == (EquipmentStatus.MISSING, zone_a.id)
+
+    history = sorted(
+        (h.item_id, h.from_zone_id, h.to_zone_id) for h in fresh_db.query(MovementHistory).all()
+    )
+    assert history == [(first.id, zone_a.id, zone_b.id), (second.id, zone_a.id, None)]
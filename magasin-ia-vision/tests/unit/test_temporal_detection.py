@@ -0,0 +1,111 @@
+import datetime
+import pytest
+from ai.temporal_detection import DetectionEventLog, TemporalDetectionEngine, TrackingStatus
+
+
+BASE = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+def feed(engine, seconds=60, fps=10, per_frame=2):
+    """Detections of `per_frame` objects per frame for `seconds` (inclusive)"""
+    for i in range(seconds * fps + 1):
+        timestamp = BASE + datetime.timedelta(milliseconds=1000 * i // fps)
+        for n in range(per_frame):
+            engine.process_detection("souris", "cam1", 0.9, (n, 0, n + 10, 10), timestamp=timestamp)
+
+
+@pytest.mark.parametrize("min_interval_sec", [0.0, 1.0])
+def test_stock_delta_independent_of_throttle(min_interval_sec):
+    engine = TemporalDetectionEngine(stability_duration_minutes=1, min_interval_sec=min_interval_sec)
+    feed(engine)
+
+    current, detected, delta = engine.calculate_stock_delta("souris", "cam1")
+    assert (current, detected, delta) == (0, 1202, 1202)
+
+    tracking = engine.active_trackings[("souris", "cam1")]
+    if min_interval_sec:
+        # One recorded event per second, the other detections folded into them
+        assert len(tracking.detection_events) == 61
+
+
+def test_types_differing_in_case_are_both_searchable():
+    engine = TemporalDetectionEngine()
+    engine.process_detection("Souris", "cam1", 0.9, (0, 0, 10, 10), timestamp=BASE)
+    engine.process_detection("souris", "cam1", 0.9, (0, 0, 10, 10), timestamp=BASE)
+    assert sorted(t.object_type for t in engine.search_trackings("SOURIS")) == ["Souris", "souris"]
+
+    engine._remove_tracking(("Souris", "cam1"))
+    assert [t.object_type for t in engine.search_trackings("souris")] == ["souris"]
+
+
+def test_event_log_round_trip():
+    log = DetectionEventLog("souris", "cam1")
+    base = BASE.timestamp()
+    for i in range(200):  # past the initial capacity: compaction rebases the offsets
+        log.append(base + i * 0.5, 0.5 + i / 1000, (i, i + 1, i + 2, i + 3), tracking_id=f"t{i}")
+
+    assert len(log) == 200
+    event = log[150]
+    assert event.ts_epoch == pytest.approx(base + 75.0, abs=1e-3)
+    assert event.timestamp == datetime.datetime.fromtimestamp(event.ts_epoch)
+    assert event.confidence == pytest.approx(0.65)
+    assert event.bbox_coords == (150.0, 151.0, 152.0, 153.0)
+    assert event.tracking_id == "t150"
+    assert (event.object_type, event.camera_id) == ("souris", "cam1")
+    assert log[-1].tracking_id == "t199"
+    assert [e.tracking_id for e in log][:2] == ["t0", "t1"]
+
+
+def test_event_log_window_eviction():
+    log = DetectionEventLog("souris", "cam1")
+    base = BASE.timestamp()
+    for i in range(10):
+        log.append(base + i, 0.9, (0, 0, 1, 1), tracking_id=str(i))
+        log.add_hit()
+
+    log.evict_before(base + 4)  # events at t < 4 s go
+    assert len(log) == 6
+    assert log[0].tracking_id == "4"
+    assert log[0].ts_epoch == pytest.approx(base + 4)
+    assert log.hit_count() == 12
+
+    log.evict_before(base + 100)
+    assert len(log) == 0 and log.hit_count() == 0
+    with pytest.raises(IndexError):
+        log[0]
+
+    # An emptied log restarts its base at the next event
+    log.append(base + 1000, 0.9, (0, 0, 1, 1))
+    assert log.base_epoch == base + 1000
+    assert log[0].ts_epoch == base + 1000
+
+
+def test_tracking_cap_only_evicts_prunable_trackings():
+    engine = TemporalDetectionEngine(stability_duration_minutes=1, max_trackings=2)
+    feed(engine, per_frame=1)  # "souris" on cam1 becomes stable
+    later = BASE + datetime.timedelta(minutes=2)
+    engine.process_detection("clavier", "cam1", 0.9, (0, 0, 1, 1), timestamp=later)
+    engine.process_detection("ecran", "cam1", 0.9, (0, 0, 1, 1), timestamp=later)
+    # The oldest tracking is the stable one: the oldest prunable one goes instead
+    assert set(engine.active_trackings) == {("souris", "cam1"), ("ecran", "cam1")}
+
+    engine.active_trackings[("ecran", "cam1")].status = TrackingStatus.PENDING_VALIDATION
+    engine.process_detection("stylo", "cam1", 0.9, (0, 0, 1, 1), timestamp=later)
+    # Nothing prunable left: the cap is exceeded rather than dropping a validation
+    assert len(engine.active_trackings) == 3
+
+
+def test_approval_not_applied_when_persisting_fails(monkeypatch):
+    import services.validation_service as validation_service
+
+    class FailingService:
+        def approve_request(self, validation_code, admin_id):
+            return False
+
+    monkeypatch.setattr(validation_service, "get_validation_service", lambda: FailingService())
+    engine = TemporalDetectionEngine()
+    engine.pending_validations["VAL-1"] = {"id": "VAL-1", "object_type": "souris", "status": "pending", "proposed_quantity": 3}
+
+    assert engine.approve_validation("VAL-1", "admin") is False
+    assert engine.pending_validations["VAL-1"]["status"] == "pending"
+    assert "souris" not in engine.validated_stock
@@ -1,16 +1,35 @@
 """
-Script d'initialisation pour configurer PyTorch avant le chargement des modèles.
+Chargement des poids PyTorch pour les modèles Ultralytics.
+
+torch >= 2.6 charge par défaut avec weights_only=True, ce qui refuse les
+checkpoints YOLO/SAM2 (objets Python picklés). allow_unsafe_load() rétablit
+weights_only=False uniquement pendant la construction d'un modèle de
+confiance, au lieu de remplacer torch.load pour tout le processus.
 """
+import threading
+from contextlib import contextmanager
 import torch
 
-# Sauvegarder la fonction originale
 _original_load = torch.load
+_lock = threading.Lock()
+_depth = 0  # blocs allow_unsafe_load() actifs (tous threads confondus)
 
-# Créer une version patchée qui force weights_only=False
-def patched_load(*args, **kwargs):
+def _trusted_load(*args, **kwargs):
     kwargs.setdefault('weights_only', False)
     return _original_load(*args, **kwargs)
 
-# Remplacer torch.load par la version patchée
-torch.load = patched_load
-
+@contextmanager
+def allow_unsafe_load():
+    """torch.load avec weights_only=False par défaut, le temps du bloc"""
+    global _depth
+    with _lock:
+        _depth += 1
+        if _depth == 1:
+            torch.load = _trusted_load
+    try:
+        yield
+    finally:
+        with _lock:
+            _depth -= 1
+            if _depth == 0:
+                torch.load = _original_load
@@ -1,22 +1,106 @@
 import cv2
+import os
 import time
 import threading
+from config.settings import settings
 from services.logger_service import logger
 
+# Low-latency FFmpeg demuxing for live streams (read when a capture is
+# opened): no input buffering, RTSP over TCP. Can be overridden from the env
+os.environ.setdefault(
+    "OPENCV_FFMPEG_CAPTURE_OPTIONS",
+    "rtsp_transport;tcp|fflags;nobuffer|flags;low_delay|max_delay;0"
+)
+
+# One capture thread per stream already: OpenCV's own worker pool on top
+# of it only oversubscribes the cores (jittery FPS with several cameras)
+cv2.setNumThreads(1)
+if not settings.USE_OPENCL:
+    cv2.ocl.setUseOpenCL(False)
+
+def pin_current_thread(index):
+    """
+    Pin the calling thread to one CPU (index modulo the CPUs available to
+    the process), keeping its decode/resize buffers in that core's caches.
+    Linux only, no-op elsewhere or with CAPTURE_CPU_AFFINITY off.
+    """
+    if not settings.CAPTURE_CPU_AFFINITY or not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    cpu = cpus[index % len(cpus)]
+    try:
+        os.sched_setaffinity(0, {cpu})  # 0 = calling thread on Linux
+    except OSError as e:
+        logger.warning(f"Could not pin capture thread to CPU {cpu}: {e}")
+
+# GStreamer decode (+ scale) elements per VIDEO_HW_DECODE backend
+_GST_DECODERS = {
+    "vaapi": ("vaapih264dec", "vaapipostproc height={height}"),
+    "nvdec": ("nvh264dec", "cudaupload ! cudascale ! video/x-raw(memory:CUDAMemory),height={height} ! cudadownload"),
+}
+
+def _gst_pipeline(url, decoder, scaler, max_height=None):
+    stages = [f"rtspsrc location={url} latency=50", "rtph264depay", "h264parse", decoder]
+    if max_height:
+        stages.append(scaler.format(height=max_height))
+    stages += ["videoconvert", "video/x-raw,format=BGR", "appsink drop=true max-buffers=1 sync=false"]
+    return " ! ".join(stages)
+
+def _is_live(source):
+    return isinstance(source, int) or (isinstance(source, str) and source.startswith(("rtsp", "http")))
+
+def open_capture(source, max_height=None, buffered=False):
+    """
+    cv2.VideoCapture for a source. With VIDEO_HW_DECODE set, RTSP streams are
+    decoded (and scaled down to `max_height` if given) by the GPU through
+    GStreamer instead of FFmpeg on the CPU; the default backend is used when
+    the pipeline cannot be opened (OpenCV without GStreamer, missing plugin).
+    Live sources (camera, RTSP/HTTP) keep a single buffered frame unless
+    `buffered`: a slow reader gets the newest frame, not a backlog. Files are
+    left alone (every frame is wanted there).
+    """
+    backend = _GST_DECODERS.get(settings.VIDEO_HW_DECODE)
+    if backend and isinstance(source, str) and source.startswith("rtsp"):
+        cap = cv2.VideoCapture(_gst_pipeline(source, *backend, max_height=max_height), cv2.CAP_GSTREAMER)
+        if cap.isOpened():
+            logger.info(f"Hardware decode ({settings.VIDEO_HW_DECODE}) for {source}")
+            return cap
+        logger.warning(f"{settings.VIDEO_HW_DECODE} GStreamer pipeline unavailable for {source}, using software decode")
+    cap = cv2.VideoCapture(source)
+    if not buffered and _is_live(source):
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
 class StreamHandler:
     """
     Handles video stream capture from a single source (RTSP or Webcam).
     Uses a separate thread to read frames to prevent I/O blocking.
     """
-    def __init__(self, source, source_id=0):
+    RECONNECT_DELAY = 0.5  # first retry after a lost source, doubled on each failure
+    MAX_RECONNECT_DELAY = 30.0
+
+    def __init__(self, source, source_id=0, target_fps=30, max_height=None):
         self.source = source
-        self.source_id = source_id
+        self.source_id = source_id  # capture thread CPU (modulo the core count), None = not pinned
+        self.target_fps = target_fps  # capture pace (frames read per second)
+        self.max_height = max_height  # hardware-decoded streams are scaled down to it
         self.cap = None
         self.running = False
         self.thread = None
-        self.lock = threading.Lock()
-        self.latest_frame = None
+        # The capture thread only grab()s; the newest grabbed frame is decoded
+        # (retrieve) by get_frame(), so only frames a reader gets are converted
+        # and a reader always gets the newest one. The lock serializes grab and
+        # retrieve on the VideoCapture; reconnecting only takes it to swap the
+        # capture object, the (possibly slow) open happens outside it
+        self._cap_lock = threading.Lock()
+        self._grab_ns = 0  # time.monotonic_ns() of the last successful grab()
+        # Last decoded (frame, grab time), returned again until a newer grab
+        self._latest = (None, 0)
+        # Set by a reader that found the capture busy: the capture thread
+        # decodes its next grab for it (live grab() holds the lock most of the time)
+        self._frame_wanted = False
         self.last_read_time = 0
+        self._reconnect_delay = self.RECONNECT_DELAY
         self.fps = 0
         self.frame_count = 0
         self.start_time = 0
@@ -32,23 +116,31 @@ class StreamHandler:
         self.thread.start()
 
     def _connect(self):
-        if self.cap:
-            self.cap.release()
+        # Detach the old capture under the lock, release/open outside it:
+        # get_frame() never waits on a stalled source
+        with self._cap_lock:
+            old_cap, self.cap = self.cap, None
+            self._grab_ns = 0  # nothing grabbed yet on the new capture
+        if old_cap:
+            old_cap.release()  # before opening: a webcam cannot be opened twice
         
         # Determine if source is int (webcam index) or string (RTSP url/file path)
         src = self.source
         if str(src).isdigit():
             src = int(src)
             
-        self.cap = cv2.VideoCapture(src)
+        cap = open_capture(src, self.max_height)
+        opened = cap.isOpened()
+        if opened:
+            # Let the driver pace live cameras: cap.read() then blocks in C (GIL released)
+            cap.set(cv2.CAP_PROP_FPS, self.target_fps)
         
-        if not self.cap.isOpened():
+        with self._cap_lock:
+            self.cap = cap
+        
+        if not opened:
             logger.error(f"Failed to open video source: {self.source}")
             return False
-            
-        # Optimization for RTSP
-        if isinstance(src, str) and (src.startswith("rtsp") or src.startswith("http")):
-             self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 2)
              
         logger.success(f"Successfully connected to source: {self.source}")
         return True
@@ -58,29 +150,42 @@ class StreamHandler:
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=2.0)
         
-        if self.cap:
-            self.cap.release()
+        with self._cap_lock:
+            if self.cap:
+                self.cap.release()
         logger.info(f"Stopped stream handler for source: {self.source}")
 
     def _update(self):
+        if self.source_id is not None:
+            pin_current_thread(self.source_id)
         self.start_time = time.time()
+        # Wake at frame boundaries (monotonic deadlines) instead of polling
+        interval = 1.0 / self.target_fps
+        next_deadline = time.monotonic()
         while self.running:
             if self.cap is None or not self.cap.isOpened():
-                time.sleep(1)
+                self._wait_before_reconnect()
                 self._connect()
                 continue
 
-            ret, frame = self.cap.read()
+            # grab() keeps the stream position current; the BGR conversion and
+            # copy (retrieve) only happen in get_frame()
+            with self._cap_lock:
+                ret = self.cap.grab()
+                if ret:
+                    self._grab_ns = time.monotonic_ns()
+                    if self._frame_wanted:
+                        self._frame_wanted = False
+                        self._decode_latest()
             if not ret:
                 logger.warning(f"Failed to read frame from {self.source}. Reconnecting...")
                 self._connect()
-                time.sleep(0.5)
+                self._wait_before_reconnect()
                 continue
 
-            with self.lock:
-                self.latest_frame = frame
-                self.last_read_time = time.time()
-                self.frame_count += 1
+            self._reconnect_delay = self.RECONNECT_DELAY
+            self.last_read_time = time.time()
+            self.frame_count += 1
             
             # Simple FPS calculation
             elapsed = time.time() - self.start_time
@@ -89,14 +194,48 @@ class StreamHandler:
                 self.frame_count = 0
                 self.start_time = time.time()
             
-            # Limit loop speed to avoid CPU burn if camera is very fast (unlikely but safe)
-            time.sleep(0.005)
+            # Sleep until the next frame is due (files, cameras ignoring CAP_PROP_FPS);
+            # when late, restart from now rather than bursting to catch up
+            next_deadline += interval
+            sleep_for = next_deadline - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            else:
+                next_deadline = time.monotonic()
+
+    def _wait_before_reconnect(self):
+        """Exponential backoff: a dead camera costs a retry every 30 s at most, not a busy loop"""
+        time.sleep(self._reconnect_delay)
+        self._reconnect_delay = min(self._reconnect_delay * 2, self.MAX_RECONNECT_DELAY)
 
     def get_frame(self):
-        with self.lock:
-            if self.latest_frame is None:
-                return None
-            return self.latest_frame.copy()
+        """
+        Newest (frame, grab time in time.monotonic_ns()), frame None before
+        the first one. The frame is shared with the other readers: copy it
+        before modifying it in place.
+        The last grabbed frame is decoded here, on demand; without a newer
+        grab the same array is returned again. Never waits on the capture:
+        while the capture thread is inside grab() (which a stalled source can
+        block indefinitely), the previously decoded frame is returned and the
+        capture thread decodes the next grab for the following call.
+        """
+        if not self._cap_lock.acquire(blocking=False):
+            self._frame_wanted = True
+            return self._latest
+        try:
+            self._decode_latest()
+            return self._latest
+        finally:
+            self._cap_lock.release()
+
+    def _decode_latest(self):
+        """retrieve() the last grab into _latest if not done yet (caller holds _cap_lock)"""
+        grab_ns = self._grab_ns
+        if grab_ns > self._latest[1]:
+            ret, frame = self.cap.retrieve()
+            if ret:
+                # retrieve() returns a new array each time: a returned frame is never written again
+                self._latest = (frame, grab_ns)
 
     def is_active(self):
         return self.running and self.cap is not None and self.cap.isOpened()
@@ -2,23 +2,67 @@
 Async Video Worker for FastAPI
 Captures video frames and runs YOLO detection in a background thread
 """
-import torch_init  # Fix PyTorch weights_only issue
 import asyncio
 import cv2
+import json
+import time
 import threading
-import queue
-from ai.detector import ObjectDetector
 from ai.temporal_detection import get_temporal_engine
+from video.stream_handler import open_capture
 from services.logger_service import logger
 
+# Each camera has its own capture thread: single-threaded OpenCV per stream
+cv2.setNumThreads(1)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _dumps_bytes(obj):
+    """JSON-encode to UTF-8 bytes (orjson in C when available)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj).encode('utf-8')
+
 class AsyncVideoWorker:
-    def __init__(self, source=0, camera_id=None, model_id="yolov8n", tracker_id=None, segmentation_id=None):
+    JPEG_QUALITY = 85
+    FRAME_RING_SIZE = 3  # capture/resize arrays recycled by the capture loop
+    MAX_FRAME_HEIGHT = 800  # larger frames are scaled down before detection
+    # Idle mode: with no viewer/reader for IDLE_AFTER_SEC and no alert, the
+    # pipeline only runs on motion (more than MOTION_AREA_RATIO of the pixels
+    # changing by MOTION_PIXEL_DELTA at 1/16 resolution) or every
+    # IDLE_INFERENCE_INTERVAL_SEC, which keeps temporal tracking alive
+    IDLE_AFTER_SEC = 3.0
+    IDLE_INFERENCE_INTERVAL_SEC = 60.0
+    MOTION_PIXEL_DELTA = 25
+    MOTION_AREA_RATIO = 0.01
+
+    def __init__(self, source=0, camera_id=None, model_id="yolov8n", tracker_id=None, segmentation_id=None,
+                 buffered=False, fps=20):
         self.source = source
+        self.fps = fps  # capture/inference pace
+        self.buffered = buffered  # False: live sources keep only the newest frame (low latency)
         self.camera_id = camera_id or str(source)
-        self.frame_queue = queue.Queue(maxsize=2)
+        # Latest published (frame, detections, alerts) and its sequence number;
+        # websocket clients await _frame_event instead of polling
+        self._latest = None
+        self._seq = 0
+        self._loop = None
+        self._frame_event = None
+        # (detections, alerts, encoded metadata without its closing brace)
+        # of the last frame: reused while nothing changes (idle camera)
+        self._meta_cache = None
+        self.viewers = 0  # connected video clients; frames are only drawn while > 0
         self.running = False
+        self.ready = False  # source opened and pipeline loaded (start() returns before that)
         self.thread = None
-        self.detector = None
+        self._pipeline = None  # this camera's VisionPipeline, bound once the source is open
+        self._last_read = 0.0  # monotonic time of the last get_frame()/wait_frame() call
+        self._motion_ref = None  # small grayscale copy of the last analysed idle frame
+        # {"model"|"tracker"|"segmenter": id} applied by the capture thread (request_switch)
+        self._switch_requests = {}
         
         # New model/tracking settings
         self.model_id = model_id
@@ -31,27 +75,45 @@ class AsyncVideoWorker:
             return
             
         self.running = True
-        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
         logger.info(f"AsyncVideoWorker started for source: {self.source}")
         
     def stop(self):
-        """Stop the video capture thread"""
+        """Stop the video capture thread (websocket clients waiting for a frame are released)"""
         self.running = False
+        self._notify_waiters()
         if self.thread:
             self.thread.join(timeout=2)
         logger.info("AsyncVideoWorker stopped")
 
     def switch_model(self, model_id):
         """Switch detection model at runtime"""
-        if self.detector:
-            success = self.detector.set_model(model_id)
-            if success:
-                self.model_id = model_id
-                logger.info(f"Worker switched to model: {model_id}")
-                return True
+        if self._pipeline is not None:
+            self._pipeline.set_model(model_id)
+            self.model_id = model_id
+            logger.info(f"Worker switched to model: {model_id}")
+            return True
         return False
 
+    def request_switch(self, kind, value):
+        """
+        Non-blocking switch_model/switch_tracker/switch_segmenter: applied by
+        the capture thread before its next frame (a later request of the same
+        kind replaces a pending one). Lets a broadcast to every camera return
+        at once while the workers load the weights concurrently.
+        """
+        self._switch_requests[kind] = value
+
+    def _apply_switch_requests(self):
+        switches = {"model": self.switch_model, "tracker": self.switch_tracker, "segmenter": self.switch_segmenter}
+        while self._switch_requests:
+            kind, value = self._switch_requests.popitem()
+            try:
+                switches[kind](value)
+            except Exception as e:
+                logger.error(f"Failed to switch {kind} to {value}: {e}")
+
     def switch_tracker(self, tracker_id):
         """Switch or disable tracker"""
         # tracker_id can be "bytetrack", "botsort", or None
@@ -64,17 +126,25 @@ class AsyncVideoWorker:
 
     def switch_segmenter(self, model_id):
         """Switch or disable segmentation model"""
-        if self.detector:
-            success = self.detector.set_segmenter(model_id)
-            if success:
-                self.segmentation_id = model_id
-                logger.info(f"Worker switched segmenter to: {model_id}")
-                return True
+        if self._pipeline is not None and self._pipeline.set_segmenter(model_id):
+            self.segmentation_id = model_id
+            logger.info(f"Worker switched segmenter to: {model_id}")
+            return True
         return False
 
+    def _run(self):
+        try:
+            self._capture_loop()
+        finally:
+            # Source lost / detector failure / stop(): release the waiting clients
+            self.running = False
+            self.ready = False
+            self._notify_waiters()
+
     def _capture_loop(self):
         """Main capture loop running in background thread"""
-        cap = cv2.VideoCapture(self.source)
+        # Hardware-decoded RTSP streams come out already at MAX_FRAME_HEIGHT
+        cap = open_capture(self.source, max_height=self.MAX_FRAME_HEIGHT, buffered=self.buffered)
         
         if not cap.isOpened():
             logger.error(f"Failed to open video source: {self.source}")
@@ -83,7 +153,7 @@ class AsyncVideoWorker:
                 for fallback_idx in [2, 0, 1]:
                     if fallback_idx == self.source: continue
                     logger.info(f"Trying fallback camera index: {fallback_idx}")
-                    cap = cv2.VideoCapture(fallback_idx)
+                    cap = open_capture(fallback_idx, buffered=self.buffered)
                     if cap.isOpened():
                         logger.success(f"Found working camera at index: {fallback_idx}")
                         self.source = fallback_idx
@@ -93,53 +163,91 @@ class AsyncVideoWorker:
                 self.running = False
                 return
             
-        # Initialize detector
+        if isinstance(self.source, int):
+            self._limit_capture_height(cap)
+            
+        # Per-camera pipeline: resolved once here, not on every frame
+        # (switch_model() updates it in place)
         try:
-            self.detector = ObjectDetector(model_path=self.model_id + ".pt")
+            from ai.vision_pipeline import get_vision_pipeline
+            self._pipeline = get_vision_pipeline(
+                camera_id=self.camera_id, 
+                model_id=self.model_id, 
+                segment=(self.segmentation_id is not None)
+            )
+            if self.segmentation_id is not None:
+                self._pipeline.set_segmenter(self.segmentation_id)
         except Exception as e:
-            logger.error(f"Failed to initialize detector: {e}")
+            logger.error(f"Failed to initialize vision pipeline: {e}")
+            cap.release()
             return
             
         logger.success(f"Video source opened: {self.source}")
+        self.ready = True
         
-        import time
-        last_frame_time = 0
-        target_fps = 20  # Limit capture to 20 FPS to reduce CPU
+        target_fps = self.fps  # Limit capture (20 FPS by default) to reduce CPU
         frame_interval = 1.0 / target_fps
+        # Live cameras: the driver paces the frames and cap.read() blocks in C
+        cap.set(cv2.CAP_PROP_FPS, target_fps)
+        next_deadline = time.monotonic()
+        
+        # Decoded and resized frames are written into a small ring of arrays
+        # instead of a fresh ~1 MB allocation each per frame
+        capture_ring = [None] * self.FRAME_RING_SIZE
+        resize_ring = [None] * self.FRAME_RING_SIZE
+        slot = 0
+        detections, alerts = [], []
+        next_forced_inference = 0.0
 
         while self.running:
-            current_time = time.time()
-            if current_time - last_frame_time < frame_interval:
-                cap.grab() # Just grab, don't decode for skipping
-                continue
+            if self._switch_requests:
+                self._apply_switch_requests()
+                
+            # Sleep until the next frame is due (monotonic deadline) instead of
+            # spinning on cap.grab(); when late, restart from now (no burst)
+            sleep_for = next_deadline - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+                next_deadline += frame_interval
+            else:
+                next_deadline = time.monotonic() + frame_interval
                 
-            ret, frame = cap.read()
-            last_frame_time = current_time
+            slot = (slot + 1) % self.FRAME_RING_SIZE
+            ret, frame = cap.read(capture_ring[slot])  # reused when the size matches
             
             if not ret:
                 logger.warning("Failed to read frame")
                 continue
+            capture_ring[slot] = frame
             
             # Optimization: Resize frame if it's too large
             # Increased from 640 to 800 for better sensitivity to distant/side objects
             height, width = frame.shape[:2]
-            if height > 800:
-                scale = 800 / height
-                frame = cv2.resize(frame, (int(width * scale), 800))
+            if height > self.MAX_FRAME_HEIGHT:
+                scale = self.MAX_FRAME_HEIGHT / height
+                frame = resize_ring[slot] = cv2.resize(
+                    frame, (int(width * scale), self.MAX_FRAME_HEIGHT), dst=resize_ring[slot])
                 
+            # Nobody watching and nothing happening: skip the pipeline while
+            # the scene doesn't move (last detections are kept)
+            now = time.monotonic()
+            if self.viewers == 0 and not alerts and now - self._last_read > self.IDLE_AFTER_SEC:
+                moved, small = self._detect_motion(frame)
+                if not moved and now < next_forced_inference:
+                    self._publish((None, detections, alerts))
+                    continue
+                self._motion_ref = small
+            else:
+                self._motion_ref = None
+            next_forced_inference = now + self.IDLE_INFERENCE_INTERVAL_SEC
+            
             # NEW: Orchestrated Vision Pipeline (YOLO + SAM2 + MediaPipe)
             try:
-                from ai.vision_pipeline import get_vision_pipeline
-                pipeline = get_vision_pipeline(
-                    camera_id=self.camera_id, 
-                    model_id=self.model_id, 
-                    segment=(self.segmentation_id is not None)
-                )
-                
-                annotated_frame, detections, alerts = pipeline.process_frame(
+                annotated_frame, detections, alerts = self._pipeline.process_frame(
                     frame, 
                     tracker_id=self.tracker_id, 
-                    segment=(self.segmentation_id is not None)
+                    segment=(self.segmentation_id is not None),
+                    render=self.viewers > 0
                 )
                 
             except Exception as e:
@@ -148,22 +256,124 @@ class AsyncVideoWorker:
                 detections = []
                 alerts = []
                 
-            # Put frame in queue (non-blocking)
-            try:
-                # Clear queue if it's lagging to ensure latest frame is always available
-                if self.frame_queue.full():
-                    try: self.frame_queue.get_nowait()
-                    except: pass
-                self.frame_queue.put_nowait((annotated_frame, detections, alerts))
-            except Exception:
-                pass
+            # Encoded once here for all websocket viewers (not once per viewer)
+            payload = None
+            if self.viewers > 0 and annotated_frame is not None:
+                payload = self._encode_payload(annotated_frame, detections, alerts)
+            self._publish((annotated_frame, detections, alerts), payload)
                 
         cap.release()
         logger.info("Video capture released")
         
-    def get_frame(self):
-        """Get the latest frame (non-blocking)"""
-        try:
-            return self.frame_queue.get_nowait()
-        except queue.Empty:
+    def _detect_motion(self, frame):
+        """
+        Cheap change detection for idle cameras: 1/16-resolution grayscale
+        difference with the last analysed frame. Returns (moved, small frame).
+        """
+        height, width = frame.shape[:2]
+        small = cv2.cvtColor(
+            cv2.resize(frame, (width // 4, height // 4), interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY)
+        ref = self._motion_ref
+        if ref is None or ref.shape != small.shape:
+            return True, small
+        changed = cv2.countNonZero(cv2.compare(cv2.absdiff(small, ref), self.MOTION_PIXEL_DELTA, cv2.CMP_GT))
+        return changed > small.size * self.MOTION_AREA_RATIO, small
+
+    def _limit_capture_height(self, cap):
+        """
+        Ask the camera for frames at most MAX_FRAME_HEIGHT high (same aspect
+        ratio) so the capture loop doesn't resize every frame on the CPU.
+        Cameras without such a mode keep theirs and the loop resizes.
+        """
+        width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        if height <= self.MAX_FRAME_HEIGHT:
+            return
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, round(width * self.MAX_FRAME_HEIGHT / height))
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.MAX_FRAME_HEIGHT)
+        new_height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        if new_height <= self.MAX_FRAME_HEIGHT:
+            logger.info(f"Camera {self.source}: capture {int(width)}x{int(height)} -> "
+                        f"{int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(new_height)}")
+        else:
+            logger.info(f"Camera {self.source} has no mode <= {self.MAX_FRAME_HEIGHT}p, frames are resized")
+
+    def _encode_payload(self, frame, detections, alerts):
+        """
+        Websocket message for a frame.
+        Binary format: [4 bytes metadata_len] [N bytes metadata JSON] [Raw JPEG bytes]
+        """
+        metadata_json = self._encode_metadata(detections, alerts)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.JPEG_QUALITY])
+        if not ok:
             return None
+        # Single allocation + copy: join reads the JPEG straight from the
+        # encoder's array (no intermediate tobytes()/concatenation copies)
+        return b"".join((len(metadata_json).to_bytes(4, byteorder='big'), metadata_json, memoryview(buffer).cast('B')))
+
+    def _encode_metadata(self, detections, alerts):
+        """
+        Metadata JSON of a frame. Detections/alerts are plain lists (compared
+        in C), so an unchanged frame only costs the comparison and the
+        timestamp; they are re-encoded when they differ.
+        """
+        cached = self._meta_cache
+        if cached is None or cached[0] != detections or cached[1] != alerts:
+            body = _dumps_bytes({
+                "camera_id": self.camera_id,
+                "detections": detections,
+                "alerts": alerts
+            })
+            cached = self._meta_cache = (detections, alerts, body[:-1])
+        # same clock as the event loop time
+        return b'%s,"timestamp":%.6f}' % (cached[2], time.monotonic())
+
+    def _publish(self, frame_data, payload=None):
+        """Replace the latest frame (older unsent frames are dropped) and wake the waiters"""
+        self._latest = (frame_data, payload)
+        self._seq += 1
+        self._notify_waiters()
+
+    def _notify_waiters(self):
+        # Any thread: wake the websocket clients blocked in wait_frame
+        loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._wake_waiters)
+            except RuntimeError:
+                self._loop = None  # event loop closed
+        
+    def _wake_waiters(self):
+        # Runs in the event loop: wake everyone waiting on the current event,
+        # later waiters get a fresh one
+        event, self._frame_event = self._frame_event, asyncio.Event()
+        event.set()
+
+    async def wait_frame(self, last_seq=0):
+        """
+        Wait (without polling) until a frame newer than `last_seq` is published.
+        Returns (seq, payload) where payload is the encoded websocket message
+        (None if the frame was not rendered); pass seq back on the next call.
+        Returns None once the worker is stopped.
+        Waiting keeps the camera out of idle mode for IDLE_AFTER_SEC (also
+        after the last viewer leaves: a reconnecting client finds it awake).
+        """
+        self._last_read = time.monotonic()
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._frame_event = asyncio.Event()
+        while self._seq == last_seq:
+            if not self.running:
+                return None
+            await self._frame_event.wait()
+        return self._seq, self._latest[1]
+
+    def get_frame(self):
+        """
+        Get the latest (frame, detections, alerts) (non-blocking).
+        The frame array is recycled FRAME_RING_SIZE captures later: copy it to keep it.
+        Reading keeps the camera out of idle mode for IDLE_AFTER_SEC.
+        """
+        self._last_read = time.monotonic()
+        return self._latest[0] if self._latest else None
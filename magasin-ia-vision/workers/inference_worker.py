@@ -0,0 +1,168 @@
+"""
+Shared inference process for the desktop capture workers.
+
+The model is loaded once (one CUDA context, one copy of the weights) and
+the frames of every VideoWorker are batched across cameras into a single
+predict() call (BatchedDetectionScheduler), instead of each capture
+process running its own detector at batch 1.
+"""
+import multiprocessing
+import queue
+import threading
+from functools import partial
+from services.logger_service import logger
+
+# Person detections above this confidence raise an INTRUSION alert
+INTRUSION_CONFIDENCE = 0.6
+# Frames waiting for the inference process; further submits are dropped
+REQUEST_QUEUE_SIZE = 64
+# Reply to every frame when the model could not be loaded: stop submitting
+INFERENCE_UNAVAILABLE = "unavailable"
+
+
+class InferenceClient:
+    """
+    One camera's handle on the InferenceWorker (picklable: it is handed to
+    the capture process). At most one frame in flight at a time.
+    """
+    def __init__(self, camera_id, requests, results):
+        self.camera_id = camera_id
+        self._requests = requests
+        self._results = results
+
+    def submit(self, frame, with_detections=True):
+        """
+        Queue a frame for inference; its result is read with poll().
+        Without `with_detections` (nothing displayed) only the alerts are
+        computed, detections and labels come back empty.
+        Returns False (frame dropped) when the request queue is full.
+        """
+        try:
+            self._requests.put_nowait(("frame", self.camera_id, (frame, with_detections)))
+            return True
+        except queue.Full:
+            return False
+
+    def poll(self):
+        """
+        (detections, labels, alerts) of the last submitted frame, None if not
+        ready, INFERENCE_UNAVAILABLE if the inference process has no model.
+        """
+        try:
+            return self._results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._requests.put(("unregister", self.camera_id, None))
+
+
+class InferenceWorker(multiprocessing.Process):
+    """
+    Detector process shared by all cameras.
+    Requests come in on a single multi-producer queue; results go back on
+    one small queue per camera (manager queues, so cameras can be connected
+    after the process started).
+    """
+    def __init__(self, model_path=None):
+        super().__init__(daemon=True)
+        self.model_path = model_path
+        self.requests = multiprocessing.Queue(maxsize=REQUEST_QUEUE_SIZE)
+        self._manager = None
+
+    def connect(self, camera_id):
+        """Register a camera and return its InferenceClient (call from the parent)"""
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+        results = self._manager.Queue(maxsize=2)
+        self.requests.put(("register", camera_id, results))
+        return InferenceClient(camera_id, self.requests, results)
+
+    def stop(self):
+        self.requests.put(None)
+        self.join(timeout=2.0)
+        if self.is_alive():
+            self.terminate()
+        if self._manager is not None:
+            self._manager.shutdown()
+
+    def run(self):
+        # Imported here: only the inference process loads torch/ultralytics
+        from ai.detector import ObjectDetector, BatchedDetectionScheduler, configure_torch_threads
+        configure_torch_threads()
+        scheduler = None
+        try:
+            detector = ObjectDetector(self.model_path)
+            scheduler = BatchedDetectionScheduler(detector)
+            logger.info("Inference process ready")
+        except Exception as e:
+            # Keep serving the queue (it would fill up otherwise): every frame
+            # is answered INFERENCE_UNAVAILABLE and the cameras stop submitting
+            logger.error(f"Failed to load AI model in inference process, cameras run without inference: {e}")
+
+        results = {}  # {camera_id: result queue}
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            kind, camera_id, payload = request
+            if kind == "frame":
+                result_queue = results.get(camera_id)
+                if result_queue is not None and scheduler is None:
+                    try:
+                        result_queue.put_nowait(INFERENCE_UNAVAILABLE)
+                    except queue.Full:
+                        pass
+                elif result_queue is not None:
+                    frame, with_detections = payload
+                    scheduler.submit(frame, camera_id).add_done_callback(
+                        partial(self._reply, result_queue, detector.model.names, with_detections))
+            elif kind == "register":
+                results[camera_id] = payload
+                if scheduler is not None:
+                    scheduler.register()
+            elif kind == "unregister" and results.pop(camera_id, None) is not None:
+                if scheduler is not None:
+                    scheduler.unregister()
+
+        if scheduler is not None:
+            scheduler.shutdown()
+        logger.info("Inference process stopped.")
+
+    @staticmethod
+    def _reply(result_queue, names, with_detections, future):
+        """Send (detections, labels, alerts) back to the camera (scheduler thread)"""
+        try:
+            results = future.result()
+            detections, labels, alerts = [], [], []
+            if results:
+                # One device -> host transfer; [..., conf, cls] (+ track id column when tracked)
+                data = results[0].boxes.data.cpu().numpy()
+                cls_ids = data[:, -1].astype(int)
+                if with_detections:
+                    detections = data.tolist()
+                    labels = [names[cls_id] for cls_id in cls_ids.tolist()]
+                # Alert Logic (Simple Demo: Detect Person), vectorized
+                n_persons = int(((cls_ids == 0) & (data[:, -2] > INTRUSION_CONFIDENCE)).sum())  # cls 0 = Person
+                if n_persons:
+                    alerts.append({"type": "INTRUSION", "message": f"{n_persons} personne(s) détectée(s) dans la zone !"})
+            result_queue.put_nowait((detections, labels, alerts))
+        except queue.Full:
+            pass  # camera gone or not reading: it resubmits a frame anyway
+        except Exception as e:
+            logger.error(f"Inference error: {e}")
+
+
+# Shared inference process of the desktop app, started on first use
+_inference_worker = None
+_inference_worker_lock = threading.Lock()
+
+def get_inference_worker(model_path=None) -> InferenceWorker:
+    global _inference_worker
+    if _inference_worker is None:
+        with _inference_worker_lock:
+            if _inference_worker is None:
+                worker = InferenceWorker(model_path)
+                worker.start()
+                _inference_worker = worker
+    return _inference_worker
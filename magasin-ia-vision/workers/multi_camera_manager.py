@@ -5,13 +5,17 @@ Manages multiple camera streams simultaneously with zone-based configuration.
 Supports up to 50 cameras with individual ROI (Region of Interest) settings.
 """
 
-import asyncio
 import logging
 import json
-from typing import Dict, List, Optional
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
 from dataclasses import dataclass
-import cv2
-from workers.async_video_worker import AsyncVideoWorker
+
+if TYPE_CHECKING:
+    # Imported when the first camera is added: importing the manager does not
+    # pull in OpenCV/torch (AsyncVideoWorker -> detector)
+    from workers.async_video_worker import AsyncVideoWorker
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +30,7 @@ class CameraConfig:
     roi_coords: Optional[List[List[int]]] = None  # [[x1,y1], [x2,y2], ...]
     fps: int = 15
     enabled: bool = True
+    buffered: bool = False  # True: keep the capture backend's frame queue (adds latency)
 
 
 @dataclass
@@ -50,9 +55,13 @@ class MultiCameraManager:
     """
     
     def __init__(self):
-        self.cameras: Dict[str, AsyncVideoWorker] = {}
+        self.cameras: Dict[str, "AsyncVideoWorker"] = {}
         self.zones: Dict[str, Zone] = {}
         self.camera_configs: Dict[str, CameraConfig] = {}
+        # zone_id -> ids of the cameras watching it (orphan zone check)
+        self._zone_to_cameras: Dict[str, Set[str]] = defaultdict(set)
+        # Static part of each camera's get_status() entry, built on add_camera
+        self._status_entries: Dict[str, Dict] = {}
         self.running = False
         
         # Global AI state to sync new cameras
@@ -109,18 +118,29 @@ class MultiCameraManager:
                 logger.warning(f"Camera {config.camera_id} already exists")
                 return False
             
+            from workers.async_video_worker import AsyncVideoWorker
+            
             # Create video worker for this camera with global settings
             worker = AsyncVideoWorker(
                 source=config.source, 
                 camera_id=config.camera_id,
                 model_id=self.current_model,
                 tracker_id=self.current_tracker,
-                segmentation_id=self.current_segmenter
+                segmentation_id=self.current_segmenter,
+                buffered=config.buffered,
+                fps=config.fps
             )
             worker.start()
             
             self.cameras[config.camera_id] = worker
             self.camera_configs[config.camera_id] = config
+            self._zone_to_cameras[config.zone_id].add(config.camera_id)
+            self._status_entries[config.camera_id] = {
+                "id": config.camera_id,
+                "zone": config.zone_name,
+                "source": config.source,
+                "enabled": config.enabled
+            }
             
             # Create or update zone
             zone = Zone(
@@ -156,19 +176,21 @@ class MultiCameraManager:
             # Stop the worker
             worker = self.cameras[camera_id]
             worker.stop()
+            # Free its pipeline and its slot in the shared batch scheduler
+            from ai.vision_pipeline import release_vision_pipeline
+            release_vision_pipeline(camera_id)
             
             # Remove from dictionaries
             del self.cameras[camera_id]
-            del self.camera_configs[camera_id]
+            config = self.camera_configs.pop(camera_id)
+            self._status_entries.pop(camera_id, None)
             
             # Remove zone if no other cameras use it
-            config = self.camera_configs.get(camera_id)
-            if config and config.zone_id in self.zones:
-                # Check if other cameras use this zone
-                other_cameras = [c for c in self.camera_configs.values() 
-                               if c.zone_id == config.zone_id and c.camera_id != camera_id]
-                if not other_cameras:
-                    del self.zones[config.zone_id]
+            zone_cameras = self._zone_to_cameras[config.zone_id]
+            zone_cameras.discard(camera_id)
+            if not zone_cameras:
+                del self._zone_to_cameras[config.zone_id]
+                self.zones.pop(config.zone_id, None)
             
             logger.info(f"Camera {camera_id} removed")
             return True
@@ -177,18 +199,18 @@ class MultiCameraManager:
             logger.error(f"Failed to remove camera {camera_id}: {e}")
             return False
     
-    def get_camera(self, camera_id: str) -> Optional[AsyncVideoWorker]:
+    def get_camera(self, camera_id: str) -> Optional["AsyncVideoWorker"]:
         """Get a specific camera worker"""
         return self.cameras.get(camera_id)
     
-    def get_zone_camera(self, zone_id: str) -> Optional[AsyncVideoWorker]:
+    def get_zone_camera(self, zone_id: str) -> Optional["AsyncVideoWorker"]:
         """Get the camera associated with a zone"""
         zone = self.zones.get(zone_id)
         if zone:
             return self.cameras.get(zone.camera_id)
         return None
     
-    def get_all_cameras(self) -> Dict[str, AsyncVideoWorker]:
+    def get_all_cameras(self) -> Dict[str, "AsyncVideoWorker"]:
         """Get all active cameras"""
         return self.cameras
     
@@ -241,18 +263,27 @@ class MultiCameraManager:
     def stop_all(self):
         """Stop all camera workers"""
         logger.info("Stopping all cameras...")
-        for camera_id, worker in self.cameras.items():
-            try:
-                worker.stop()
-                logger.info(f"Stopped camera {camera_id}")
-            except Exception as e:
-                logger.error(f"Error stopping camera {camera_id}: {e}")
+        # Each stop() waits up to 2 s for its capture thread: wait for all at once
+        if self.cameras:
+            with ThreadPoolExecutor(max_workers=min(16, len(self.cameras))) as executor:
+                list(executor.map(self._stop_worker, self.cameras.items()))
         
         self.cameras.clear()
         self.zones.clear()
         self.camera_configs.clear()
+        self._zone_to_cameras.clear()
+        self._status_entries.clear()
         logger.info("All cameras stopped")
     
+    @staticmethod
+    def _stop_worker(item):
+        camera_id, worker = item
+        try:
+            worker.stop()
+            logger.info(f"Stopped camera {camera_id}")
+        except Exception as e:
+            logger.error(f"Error stopping camera {camera_id}: {e}")
+    
     def get_status(self) -> Dict:
         """
         Get overall system status.
@@ -260,39 +291,40 @@ class MultiCameraManager:
         Returns:
             Dictionary with status information
         """
+        # Only the running flags are read per call (one pass, counted on the way)
+        cameras = {}
+        active = 0
+        for camera_id, entry in self._status_entries.items():
+            worker = self.cameras.get(camera_id)
+            running = worker.running if worker is not None else False
+            active += running
+            cameras[camera_id] = {**entry, "running": running}
         return {
             "total_cameras": len(self.cameras),
-            "active_cameras": self.get_active_camera_count(),
+            "active_cameras": active,
             "total_zones": self.get_zone_count(),
-            "cameras": {
-                camera_id: {
-                    "id": camera_id,
-                    "zone": config.zone_name,
-                    "source": config.source,
-                    "enabled": config.enabled,
-                    "running": self.cameras[camera_id].running if camera_id in self.cameras else False
-                }
-                for camera_id, config in self.camera_configs.items()
-            }
+            "cameras": cameras
         }
 
+    # Broadcasts: each worker applies the switch on its own capture thread,
+    # so the weights of all cameras load concurrently and the caller doesn't wait
     def update_all_workers_model(self, model_id: str):
         """Update detection model for all active cameras"""
         self.current_model = model_id
         for worker in self.cameras.values():
-            worker.switch_model(model_id)
+            worker.request_switch("model", model_id)
 
     def update_all_workers_tracker(self, tracker_id: str):
         """Update tracker for all active cameras"""
         self.current_tracker = tracker_id
         for worker in self.cameras.values():
-            worker.switch_tracker(tracker_id)
+            worker.request_switch("tracker", tracker_id)
 
     def update_all_workers_segmenter(self, model_id: str):
         """Update segmenter for all active cameras"""
         self.current_segmenter = model_id
         for worker in self.cameras.values():
-            worker.switch_segmenter(model_id)
+            worker.request_switch("segmenter", model_id)
 
 
 # Singleton instance
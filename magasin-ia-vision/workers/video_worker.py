@@ -1,105 +1,221 @@
 import multiprocessing
 import time
 import cv2
+import numpy as np
 import queue
+from multiprocessing import shared_memory
 from video.stream_handler import StreamHandler
-from ai.detector import ObjectDetector
+from workers.inference_worker import INFERENCE_UNAVAILABLE
 from services.logger_service import logger
 
 class VideoWorker(multiprocessing.Process):
     """
-    Background process for Video Acquisition + AI Inference.
-    Sends processed frames (and metadata) back to the main process via a Queue.
+    Background process for Video Acquisition.
+    Inference runs in the shared InferenceWorker (one model, frames of all
+    cameras batched): this process only captures, submits a frame through
+    `inference` (an InferenceClient) and draws the returned detections.
+    Frames are written display-ready (RGB, already scaled to `display_size`)
+    into a small ring of shared memory slots; only (slot, w, h) and the
+    metadata go through the result Queue, the pixels are never pickled.
     """
-    def __init__(self, source, result_queue, model_path=None):
+    RESULT_TIMEOUT_SEC = 2.0  # a frame without result after this is given up (resubmit)
+    STALE_REPORT_SEC = 60.0  # period of the skipped stale frames log
+    FRAME_SLOTS = 3  # the GUI reads the newest slot while the next ones are written
+    FRAME_SLOT_BYTES = 3840 * 2160 * 3  # largest display frame (pages are only used as written)
+
+    def __init__(self, source, result_queue, inference, fps_limit=30):
         super().__init__()
         self.source = source
+        self.fps_limit = fps_limit  # capture + display pace
         self.result_queue = result_queue
-        self.model_path = model_path
+        self.inference = inference
+        # Cleared by stop(): a shared flag read each frame (set here, so a
+        # stop() issued before the process runs is not lost)
         self.running = multiprocessing.Event()
-        self.command_queue = multiprocessing.Queue()
+        self.running.set()
+        # Target display size (w, h) written by the UI, 0 = keep frame size
+        self.display_size = multiprocessing.Array('i', [0, 0], lock=False)
+        # Cleared by the UI while the widget is hidden: skip drawing/conversion
+        self.render = multiprocessing.Value('b', True, lock=False)
+        # Display frame ring shared with the GUI process (released by release_frames())
+        self._frame_slots = [
+            shared_memory.SharedMemory(create=True, size=self.FRAME_SLOT_BYTES)
+            for _ in range(self.FRAME_SLOTS)
+        ]
+        self._next_slot = 0
+        # Seqlock per slot: odd while the worker writes it, bumped twice per
+        # frame; the GUI checks it around its copy to detect a torn frame
+        self._slot_seqs = multiprocessing.Array('Q', self.FRAME_SLOTS, lock=False)
+
+    def _to_display(self, frame, detections=(), labels=()):
+        """
+        Resize (aspect ratio kept) to the display size, convert BGR -> RGB,
+        and draw the detections on the result, so the GUI thread only has to
+        wrap the buffer in a QImage.
+        Resizing first means the colour conversion and the drawing only touch
+        displayed pixels; the converted array is a fresh one, so the shared
+        stream frame is never copied nor drawn on.
+        The RGB frame is converted straight into the next shared memory slot.
+        Returns (slot, w, h, seq), None if the frame is larger than a slot.
+        """
+        h, w = frame.shape[:2]
+        scale = 1.0
+        target_w, target_h = self.display_size[0], self.display_size[1]
+        if target_w > 0 and target_h > 0:
+            scale = min(target_w / w, target_h / h)
+            size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            if size != (w, h):
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+                w, h = size
+            else:
+                scale = 1.0
+        if w * h * 3 > self.FRAME_SLOT_BYTES:
+            logger.warning(f"Display frame {w}x{h} too large for the shared frame slots")
+            return None
+        slot = self._next_slot
+        self._next_slot = (slot + 1) % self.FRAME_SLOTS
+        self._slot_seqs[slot] += 1  # odd: being written
+        rgb = np.ndarray((h, w, 3), dtype=np.uint8, buffer=self._frame_slots[slot].buf)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        self._draw(rgb, detections, labels, scale)
+        self._slot_seqs[slot] += 1
+        return slot, w, h, self._slot_seqs[slot]
+
+    def frame_bytes(self, slot, w, h, seq):
+        """
+        RGB pixels of a display frame published by the worker (GUI side).
+        None if the worker started overwriting the slot before or during
+        the copy (the frame is skipped, a newer one is already on its way).
+        """
+        if self._slot_seqs[slot] != seq:
+            return None
+        data = bytes(self._frame_slots[slot].buf[:w * h * 3])
+        if self._slot_seqs[slot] != seq:
+            return None
+        return data
+
+    def release_frames(self):
+        """Free the shared frame slots once the worker has exited (GUI side)"""
+        for shm in self._frame_slots:
+            shm.close()
+            shm.unlink()
+        self._frame_slots = []
+
+    def _put_latest(self, item):
+        """
+        Queue `item` after evicting every result the UI has not taken yet:
+        only the newest frame waits in the queue (no growing latency). The
+        alerts of the evicted results are carried over, none is lost.
+        Returns the number of results evicted (> 0: the UI is falling behind).
+        """
+        frame, detections, alerts = item
+        dropped = 0
+        while True:
+            try:
+                _, _, stale_alerts = self.result_queue.get_nowait()
+            except queue.Empty:
+                break
+            dropped += 1
+            alerts = stale_alerts + alerts
+        try:
+            self.result_queue.put_nowait((frame, detections, alerts))
+        except queue.Full:
+            pass
+        return dropped
+
+    @staticmethod
+    def _draw(frame, detections, labels, scale=1.0):
+        """Boxes + labels drawn in place, coordinates scaled to the frame"""
+        for (x1, y1, x2, y2, *rest), label in zip(detections, labels):
+            conf = rest[-2]
+            p1, p2 = (int(x1 * scale), int(y1 * scale)), (int(x2 * scale), int(y2 * scale))
+            cv2.rectangle(frame, p1, p2, (0, 255, 0), 2)
+            cv2.putText(frame, f"{label} {conf:.2f}", (p1[0], max(p1[1] - 5, 12)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1, cv2.LINE_AA)
 
     def run(self):
         """
         Main loop of the worker process.
         """
-        self.running.set()
         logger.info(f"VideoWorker started for source: {self.source}")
         
+        frame_time = 1.0 / self.fps_limit
+        # Older frames (pipeline fell behind, source stalled) are not inferred
+        max_frame_age_ns = int(2 * frame_time * 1e9)
+
         # Initialize components INSIDE the process
-        stream = StreamHandler(self.source)
+        # One process per source: the pid spreads the capture threads over the cores
+        stream = StreamHandler(self.source, source_id=self.pid, target_fps=self.fps_limit)
         stream.start()
         
-        detector = None
-        try:
-            detector = ObjectDetector(self.model_path)
-            logger.info("AI Model loaded in worker process.")
-        except Exception as e:
-            logger.error(f"Failed to load AI model in worker: {e}")
-            # Continue without AI? Or stop?
-            # For now, let's continue but skip inference
-
-        fps_limit = 30
-        frame_time = 1.0 / fps_limit
+        # Frame sent to the shared inference process, waiting for its result
+        pending = None
+        pending_since = 0.0
+        skip_frame = False  # UI behind: infer every other frame only
+        last_frame = None  # last frame taken from the stream (submitted or skipped)
+        inference_available = True  # False once the inference process reports no model
+        stale_frames = 0  # skipped as too old since the last report
+        next_report = time.monotonic() + self.STALE_REPORT_SEC
+        next_deadline = time.monotonic()
 
         while self.running.is_set():
-            start_time = time.time()
-            
-            # Check for commands
-            try:
-                cmd = self.command_queue.get_nowait()
-                if cmd == "STOP":
-                    break
-            except queue.Empty:
-                pass
+            start_time = time.monotonic()  # immune to wall clock (NTP) jumps
+
+            if skip_frame:
+                skip_frame = False
+            elif pending is None or start_time - pending_since > self.RESULT_TIMEOUT_SEC:
+                frame, grab_ns = stream.get_frame()
+                # Same array as last time: no new frame (source down/reconnecting), nothing to infer
+                if frame is not None and frame is not last_frame:
+                    last_frame = frame
+                    if time.monotonic_ns() - grab_ns > max_frame_age_ns:
+                        # Grabbed too long ago: its detections/alerts would be stale
+                        stale_frames += 1
+                    elif not inference_available:
+                        # No model: plain video
+                        display_frame = self._to_display(frame) if self.render.value else None
+                        self._put_latest((display_frame, [], []))
+                    # Boxes are only needed to draw the shown widget; alerts always come back
+                    elif self.inference.submit(frame, with_detections=bool(self.render.value)):
+                        pending, pending_since = frame, start_time
 
-            frame = stream.get_frame()
-            if frame is not None:
-                # Inference
-                detections = []
-                if detector:
-                    # Run tracking directly
-                    try:
-                        results = detector.track(frame, persist=True)
-                        if results:
-                            # Extract plotting or raw data
-                            # For UI display, an annotated frame + raw data list is useful
-                            annotated_frame = results[0].plot()
-                            detections = results[0].boxes.data.tolist()  # [data]
-                            
-                            # Alert Logic (Simple Demo: Detect Person)
-                            alerts = []
-                            for box in results[0].boxes:
-                                cls_id = int(box.cls[0])
-                                if cls_id == 0: # Person
-                                    conf = float(box.conf[0])
-                                    if conf > 0.6:
-                                        alerts.append({"type": "INTRUSION", "message": "Personne détectée dans la zone !"})
-                            
-                            # Send to UI
-                            try:
-                                if self.result_queue.full():
-                                    try:
-                                        self.result_queue.get_nowait() # Drop old frame
-                                    except queue.Empty:
-                                        pass
-                                self.result_queue.put((annotated_frame, detections, alerts), timeout=0.01)
-                            except queue.Full:
-                                pass
-                    except Exception as e:
-                        logger.error(f"Inference error: {e}")
+            result = self.inference.poll() if pending is not None else None
+            if result == INFERENCE_UNAVAILABLE:
+                logger.warning(f"{self.source}: no inference model, showing the video without detection")
+                inference_available = False
+                pending = None
+            elif result is not None:
+                detections, labels, alerts = result
+                # Send to UI (only the newest frame is kept queued);
+                # drawn only while the widget is shown, at display size
+                display_frame = None
+                if self.render.value:
+                    display_frame = self._to_display(pending, detections, labels)
+                # Results left unread: halve the inference rate instead of
+                # computing frames the UI would drop
+                skip_frame = self._put_latest((display_frame, detections, alerts)) > 0
+                pending = None
+            
+            if start_time >= next_report:
+                if stale_frames:
+                    logger.info(f"{self.source}: {stale_frames} stale frame(s) skipped in the last {self.STALE_REPORT_SEC:.0f} s")
+                    stale_frames = 0
+                next_report = start_time + self.STALE_REPORT_SEC
             
-            # FPS Control
-            elapsed = time.time() - start_time
-            if elapsed < frame_time:
-                time.sleep(frame_time - elapsed)
+            # FPS Control: fixed monotonic deadlines (no drift from the loop's
+            # own duration); when late, restart from now rather than bursting
+            next_deadline += frame_time
+            sleep_for = next_deadline - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            else:
+                next_deadline = time.monotonic()
 
         stream.stop()
         logger.info("VideoWorker stopped.")
 
     def stop(self):
         self.running.clear()
-        self.command_queue.put("STOP")
         self.join(timeout=2.0)
         # Force kill if needed?
         if self.is_alive():